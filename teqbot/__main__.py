@@ -1,7 +1,7 @@
 import sys
-from slackclient import SlackClient
 import os
-from teq import TeqBot
+import time
+from control import send_command
 
 NOW_PLAYING   = '00000001'
 STREAM_STATUS = '00000010'
@@ -37,9 +37,32 @@ def usage():
     usage = usage + "\t-s, --status      \t\tCheck the status of the stream\n"
     usage = usage + "\t-l, --lyric       \t\tUpdate Lyrics being output to song logger\n"
     usage = usage + "\t-w, --swear       \t\tSend Swear Logs to slack\n"
+    usage = usage + "\t-u, --update      \t\tPeriodically pull updates to TeqBot\n"
+    usage = usage + "\t-a, --async       \t\tRun tasks in one process instead of spawning new ones\n"
+    usage = usage + "\t-p, --pool        \t\tRun tasks on a pool of pre-forked workers\n"
+    usage = usage + "\t-i, --interval <task>=<ms>\tOverride a task's interval in milliseconds\n"
+    usage = usage + "\t-t, --timeout <task>=<s>\tKill a task after it runs this many seconds\n"
+    usage = usage + "\t--max-tasks <n>    \t\tLimit how many task processes run at once\n"
+    usage = usage + "\t--skip            \t\tSkip tasks still running instead of queueing a rerun\n"
+    usage = usage + "\t--adaptive        \t\tCheck for new songs more often when one is likely\n"
+    usage = usage + "\t--listen          \t\tAnnounce new songs as they start, from the stream's metadata\n"
+    usage = usage + "\t--record-listeners\t\tKeep a history of each mount's listeners\n"
+    usage = usage + "\t--metrics-port <port>\t\tServe Prometheus metrics at localhost:<port>/metrics\n"
+    usage = usage + "\t--textfile <path> \t\tWrite Prometheus metrics to a file every 15 seconds\n"
+    usage = usage + "\t--profile         \t\tProfile every task run (also works with task)\n"
+    usage = usage + "\t--profile-memory  \t\tProfile every task run, tracing memory as well\n"
 
     usage = usage + "Test Commands:\n\n"
     usage = usage + "\tkill          \t\tSend a message to stop the scheduler\n"
+    usage = usage + "\tstatus        \t\tAsk the running scheduler what it is up to\n"
+    usage = usage + "\trun-task <task>\t\tHave the running scheduler run a task now\n"
+    usage = usage + "\treload        \t\tHave the running scheduler reload task code\n"
+    usage = usage + "\tmetrics       \t\tPrint the running scheduler's metrics\n"
+    usage = usage + "\tlisteners [hours]\t\tPrint each mount's listeners over the last day (or hours)\n"
+    usage = usage + "\tplays <from> [to]\t\tPrint the songs played between two times (YYYY-MM-DD HH:MM)\n"
+    usage = usage + "\tbench-startup [ms]\t\tReport import time of each command against a budget\n"
+    usage = usage + "\tbench-status [mounts]\t\tCompare parse time and memory of the status backends\n"
+    usage = usage + "\tbench-probe   \t\tTime how long each kind of stream outage takes to detect\n"
     usage = usage + "\tmessage <text>\t\tSend a test message to #boondoggling channel\n"
 
     return usage + "\n"
@@ -59,7 +82,20 @@ def command_handler(args):
             print( "Sending \'" + msg + "\' to #boondoggling channel..." )
             #print( test_slack_message( msg ) )
     elif "SCHEDULER" in args:
-        #reset stat file
+        # per-task intervals in milliseconds, e.g. -i nowplaying=2500
+        intervals = task_values(args, ("--interval", "-i"))
+        # per-task timeouts in seconds, e.g. -t lyric=60
+        timeouts  = task_values(args, ("--timeout", "-t"))
+        # where to serve metrics, if anywhere
+        port      = number_value(args, "--metrics-port", 65535)
+        # cap on task processes running at once
+        limit     = number_value(args, "--max-tasks")
+        if intervals is None or timeouts is None or port is False or limit is False:
+            print( usage() )
+            return
+
+        teq = get_teq()
+        #reset stored status
         teq.delete_stat_file()
 
         # Set up all events to handle using BITWISE ops
@@ -75,25 +111,174 @@ def command_handler(args):
             event = "{0:b}".format( int( event, 2) | int(SWEAR_LOG, 2) )
         if "--update" in args or "-u" in args:
             event = "{0:b}".format( int( event, 2) | int(UPDATE_REPO, 2) )
-        teq.scheduler(event)
+        # check for new songs more often when one is likely
+        adaptive = "--adaptive" in args
+        # announce new songs from the stream's ICY metadata
+        listen = "--listen" in args
+        # keep a history of each mount's listeners
+        record = "--record-listeners" in args
+
+        # profile every task run
+        teq.profile = profile_mode(args)
+
+        # where else to export metrics, if anywhere
+        textfile = None
+        if "--textfile" in args[:-1]:
+            textfile = args[args.index("--textfile") + 1]
+
+        if "--async" in args or "-a" in args:
+            # run tasks in this process instead of spawning new ones
+            teq.async_scheduler(event, intervals=intervals, adaptive=adaptive,
+                                metrics_port=port, textfile=textfile, listen=listen,
+                                record_listeners=record)
+        elif "--pool" in args or "-p" in args:
+            # hand tasks off to pre-forked workers
+            from pool import WorkerPool
+            teq.scheduler(event, pool=WorkerPool(timeouts=timeouts, profile=teq.profile), intervals=intervals, adaptive=adaptive,
+                          metrics_port=port, textfile=textfile, listen=listen,
+                          record_listeners=record)
+        else:
+            from runner import TaskRunner, MAX_RUNNING, SKIP, COALESCE
+            policy = SKIP if "--skip" in args else COALESCE
+            runner = TaskRunner(limit or MAX_RUNNING, policy, timeouts)
+            teq.scheduler(event, intervals=intervals, runner=runner, adaptive=adaptive,
+                          metrics_port=port, textfile=textfile, listen=listen,
+                          record_listeners=record)
     elif "TASK" in args:
         # ONLY run one individual task ONCE
+        latency = None
+        if os.environ.get('TEQ_DISPATCH_TIME'):
+            # spawned by the scheduler, measure startup cost
+            latency = time.time() - float(os.environ.get('TEQ_DISPATCH_TIME'))
+        teq = get_teq()
+        teq.profile = profile_mode(args)
+        import metrics
+        start  = time.monotonic()
+        name   = None
+        method = None
         if  "--nowplaying" in args or "-n" in args:
-            teq.task_now_playing()
+            name, method = "nowplaying", teq.task_now_playing
         elif "--status" in args or "-s" in args:
-            teq.task_stream_status()
+            name, method = "status", teq.task_stream_status
         elif "--lyric" in args or "-l" in args:
-            teq.task_check_lyrics()
+            name, method = "lyric", teq.task_check_lyrics
         elif "--swear" in args or "-w" in args:
-            teq.task_swear_log()
+            name, method = "swear", teq.task_swear_log
         elif "--update" in args or "-u" in args:
-            teq.task_update_repo()
+            name, method = "update", teq.task_update_repo
+        if name and latency is not None:
+            metrics.record_dispatch(name, latency)
+        error = True
+        try:
+            if method:
+                teq.run_method(name, method)
+            error = False
+        finally:
+            if name:
+                metrics.record_task(name, time.monotonic() - start, error)
+            if os.environ.get('TEQ_METRICS_FILE'):
+                # spawned by the scheduler, hand metrics back to it
+                metrics.write_snapshot(os.environ.get('TEQ_METRICS_FILE'))
     elif "KILL" in args:
         print("Halting Scheduler running on different process...")
-        teq.set_stat_file("Done")
+        control_message("kill")
+    elif "STATUS" in args:
+        control_message("status")
+    elif "RUN-TASK" in args and len(args) > 1:
+        control_message("run-task " + args[1])
+    elif "RELOAD" in args:
+        control_message("reload")
+    elif "METRICS" in args:
+        control_message("metrics")
+    elif "LISTENERS" in args:
+        control_message("listeners " + (args[1] if len(args) > 1 else "24"))
+    elif "PLAYS" in args and len(args) > 1:
+        import playlog
+        try:
+            start = playlog.parse_time(args[1])
+            end   = playlog.parse_time(args[2]) if len(args) > 2 else None
+        except ValueError as e:
+            print(e)
+            print( usage() )
+            return
+        print( playlog.report( playlog.PlayLog().query(start, end) ), end="" )
+    elif "BENCH-STARTUP" in args:
+        from startup import bench_startup, STARTUP_BUDGET
+        if len(args) > 1 and not (args[1].isdigit() and int(args[1]) > 0):
+            print("Expected bench-startup [ms], with ms a whole number above 0")
+            print( usage() )
+            return
+        budget = int(args[1]) if len(args) > 1 else STARTUP_BUDGET
+        ok, msg = bench_startup(budget)
+        print(msg)
+        if not ok:
+            sys.exit(1)
+    elif "BENCH-STATUS" in args:
+        from bench import bench_status, BENCH_MOUNTS
+        if not all( arg.isdigit() and int(arg) > 0 for arg in args[1:] ):
+            print("Expected bench-status [mounts], with each a whole number above 0")
+            print( usage() )
+            return
+        mounts = tuple( int(arg) for arg in args[1:] ) or BENCH_MOUNTS
+        print( bench_status(mounts) )
+    elif "BENCH-PROBE" in args:
+        from bench import bench_probe
+        print( bench_probe() )
+
+def task_values(args, flags):
+    'read every <task>=<n> given after one of flags, None if any is malformed or not positive'
+    values = {}
+    for i, arg in enumerate(args):
+        if arg not in flags:
+            continue
+        name, equals, value = (args[i+1] if i + 1 < len(args) else "").partition("=")
+        if not name or not equals or not value.isdigit() or int(value) <= 0:
+            print("Expected " + arg + " <task>=<n>, with n a whole number above 0")
+            return None
+        values[name] = int(value)
+    return values
+
+def number_value(args, flag, most=None):
+    'read the whole number given after flag, None if flag is missing, False if malformed or out of range'
+    if flag not in args:
+        return None
+    i = args.index(flag)
+    value = args[i+1] if i + 1 < len(args) else ""
+    if not value.isdigit() or int(value) <= 0 or (most and int(value) > most):
+        limit = "from 1 to " + str(most) if most else "above 0"
+        print("Expected " + flag + " <n>, with n a whole number " + limit)
+        return False
+    return int(value)
+
+def get_teq():
+    'build TeqBot the first time a command actually needs it'
+    global teq
+    if teq is None:
+        from teq import TeqBot
+        teq = TeqBot()
+    return teq
+
+def profile_mode(args):
+    'check for the --profile options, returning the profiling mode'
+    if "--profile-memory" in args:
+        from profiling import MEMORY
+        return MEMORY
+    elif "--profile" in args:
+        from profiling import CPU
+        return CPU
+    return None
+
+def control_message(command):
+    'send a command to the running scheduler, print the reply'
+    reply = send_command(command)
+    if reply is None:
+        print("No scheduler is running")
+    else:
+        print(reply)
 
 #simply prints some channel info, then sends message to #boondoggling
 def test_slack_message(message="Hello World!"):
+    teq = get_teq()
     channels = teq.get_channels()
     if channels:
         for channel in channels:
@@ -107,7 +292,7 @@ def test_slack_message(message="Hello World!"):
         return "Unable to authenticate."
 
 # get system arguments
-teq = TeqBot()
+teq = None
 args = sys.argv
 if len(args) > 1:
     command_handler( args[1:] )
@@ -0,0 +1,327 @@
+"""KTEQ-FM TEQBOT STATUS PARSING BENCHMARK.
+
+This module measures how long it takes to read the stream's status out of
+the pages an IceCast server serves, and how much memory doing so takes.
+The original approach (building a full BeautifulSoup tree of the status
+page, then searching it for table cells) is compared against each of the
+status backends in the stream module, including the html backend stopping
+early once it has found a single mount.
+
+Pages are recorded from a simulated IceCast 2.4 server with any number of
+mounts, since the size of the status page grows with every mount. Each
+parse is timed over several runs, and its peak memory use is measured
+with tracemalloc.
+
+This module also measures how long stream.probe() takes to tell whether the
+stream is up, against a simulated server on localhost that is up, has no
+encoders connected, refuses connections, or accepts connections but never
+answers.
+
+Example:
+
+        $ python teqbot bench-status
+
+        $ python teqbot bench-probe
+
+        $ python bench.py 1 3 50
+
+        $ python bench.py --probe
+
+Running this module from command line will benchmark pages with the given
+numbers of mounts, or with each of BENCH_MOUNTS by default. With --probe,
+the time to detect each kind of outage is measured instead.
+
+Attributes:
+    BENCH_MOUNTS (tuple): default numbers of mounts to benchmark
+    BENCH_RUNS (int): parses timed per page, the fastest is reported
+    SONG (str): song playing on every simulated mount
+
+Todo:
+    * Record pages from the station's actual server.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import sys
+import json
+import time
+import socket
+import threading
+import tracemalloc
+import stream
+
+BENCH_MOUNTS = (1, 3, 50)
+BENCH_RUNS   = 20
+
+SONG = "Beat Market by Sun Machine"
+
+def mount_stats(mounts):
+    """Build the stats a simulated server reports for each mount."""
+    bitrates = [192, 96, 128]
+    return [ { "mount"       : "/kteq" + str(i),
+               "name"        : "KTEQ-FM",
+               "description" : "91.3FM, the sound of the South Dakota School of Mines",
+               "bitrate"     : bitrates[i % len(bitrates)],
+               "listeners"   : i % 7,
+               "peak"        : i % 7 + 5,
+               "genre"       : "Alternative",
+               "title"       : SONG }
+             for i in range(mounts) ]
+
+def html_page(mounts):
+    """Record the status.xsl page a server with this many mounts serves."""
+    page = "<!DOCTYPE html>\n<html><head><title>Icecast Streaming Media Server</title></head><body>\n"
+    page += "<h2>Icecast2 Status</h2>\n"
+    for stat in mount_stats(mounts):
+        rows = [ ("Stream Name:", stat["name"]),
+                 ("Stream Description:", stat["description"]),
+                 ("Content Type:", "audio/mpeg"),
+                 ("Stream started:", "Sun, 02 Oct 2016 13:33:53 +0000"),
+                 ("Bitrate:", str(stat["bitrate"])),
+                 ("Current Listeners:", str(stat["listeners"])),
+                 ("Peak Listeners:", str(stat["peak"])),
+                 ("Stream Genre:", stat["genre"]),
+                 ("Stream URL:", '<a href="http://www.kteq.org/" target="_blank">http://www.kteq.org/</a>'),
+                 ("Current Song:", stat["title"]) ]
+        page += '<div class="roundbox">\n<div class="mounthead"><h3 class="mount">Mount Point '
+        page += stat["mount"] + '</h3>\n<div class="right"><ul class="mountlist">'
+        page += '<li><a class="play" href="' + stat["mount"] + '.m3u">M3U</a></li></ul></div></div>\n'
+        page += '<div class="mountcont"><table class="yellowkeys"><tbody>\n'
+        for label, value in rows:
+            page += '<tr><td>' + label + '</td><td class="streamdata">' + value + '</td></tr>\n'
+        page += '</tbody></table></div></div>\n'
+    page += '<div id="footer">Support icecast development at <a href="http://www.icecast.org">www.icecast.org</a></div>\n'
+    page += "</body></html>\n"
+    return page.encode()
+
+def json_page(mounts):
+    """Record the status-json.xsl page for this many mounts."""
+    sources = [ { "listenurl"           : "http://localhost:8000" + stat["mount"],
+                  "server_name"         : stat["name"],
+                  "server_description"  : stat["description"],
+                  "server_type"         : "audio/mpeg",
+                  "stream_start"        : "Sun, 02 Oct 2016 13:33:53 +0000",
+                  "bitrate"             : stat["bitrate"],
+                  "listeners"           : stat["listeners"],
+                  "listener_peak"       : stat["peak"],
+                  "genre"               : stat["genre"],
+                  "title"               : stat["title"] }
+                for stat in mount_stats(mounts) ]
+    stats = { "icestats": { "admin"        : "icemaster@localhost",
+                            "host"         : "localhost",
+                            "server_id"    : "Icecast 2.4.4",
+                            "source"       : sources[0] if len(sources) == 1 else sources } }
+    return json.dumps(stats).encode()
+
+def xml_page(mounts):
+    """Record the admin/stats page for this many mounts."""
+    page = '<?xml version="1.0"?>\n<icestats><admin>icemaster@localhost</admin>'
+    page += '<host>localhost</host><server_id>Icecast 2.4.4</server_id>\n'
+    for stat in mount_stats(mounts):
+        page += '<source mount="' + stat["mount"] + '">'
+        page += '<server_name>' + stat["name"] + '</server_name>'
+        page += '<server_description>' + stat["description"] + '</server_description>'
+        page += '<bitrate>' + str(stat["bitrate"]) + '</bitrate>'
+        page += '<listeners>' + str(stat["listeners"]) + '</listeners>'
+        page += '<listener_peak>' + str(stat["peak"]) + '</listener_peak>'
+        page += '<genre>' + stat["genre"] + '</genre>'
+        page += '<title>' + stat["title"] + '</title></source>\n'
+    page += '</icestats>\n'
+    return page.encode()
+
+def legacy_parse(data):
+    """Read the song the way ping_stream did before status backends."""
+    from bs4 import BeautifulSoup
+    soup  = BeautifulSoup(data, 'html.parser')
+    data  = soup.find_all('td', attrs={"class" : "streamdata" })
+    count = soup.find_all('td')
+    return stream.now_playing(data)
+
+def measure(parse, data, runs=BENCH_RUNS):
+    """Time a parse, and measure its peak memory use.
+
+    Returns:
+        (tuple): tuple containing:
+
+            best (float): fastest parse, in milliseconds.
+            peak (int): peak memory allocated while parsing, in bytes.
+
+    """
+    parse(data)
+    best = None
+    for i in range(runs):
+        start = time.perf_counter()
+        parse(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    parse(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best * 1000, peak
+
+def parsers(mounts):
+    """Each way of reading the status, with the page it reads."""
+    return [ ("beautifulsoup (old)", legacy_parse,                       html_page(mounts)),
+             ("html backend",        stream.HtmlStatus().parse,          html_page(mounts)),
+             ("html, first mount",   stream.HtmlStatus("/kteq0").parse,  html_page(mounts)),
+             ("xml backend",         stream.XmlStatus().parse,           xml_page(mounts)),
+             ("json backend",        stream.JsonStatus().parse,          json_page(mounts)) ]
+
+def bench_status(mounts=BENCH_MOUNTS, runs=BENCH_RUNS):
+    """Benchmark every way of reading the stream's status.
+
+    Args:
+        mounts (tuple): numbers of mounts to simulate.
+        runs (int): parses timed per page.
+
+    Returns:
+        str: report with parse time and peak memory for each page.
+
+    Example:
+
+        >>> import bench
+        >>> print(bench.bench_status())
+        <Prints parse times and allocations for 1, 3 and 50 mounts>
+    """
+    msg = "Status parsing (fastest of " + str(runs) + " runs, peak traced memory):\n"
+    for count in mounts:
+        msg += "    " + str(count) + " mount(s):\n"
+        for name, parse, data in parsers(count):
+            best, peak = measure(parse, data, runs)
+            msg += "        " + "{0:<20}".format(name)
+            msg += "{0:7.1f}KiB page ".format(len(data) / 1024.0)
+            msg += "{0:9.3f}ms ".format(best)
+            msg += "{0:9.1f}KiB".format(peak / 1024.0) + "\n"
+    return msg
+
+def fake_server(mounts):
+    """Serve a simulated IceCast status page on localhost.
+
+    Args:
+        mounts (int): number of mounts up on the server.
+
+    Returns:
+        http.server.HTTPServer: the running server, on a background thread.
+
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json_page(mounts)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer( ("127.0.0.1", 0), Handler )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def outages():
+    """Each kind of stream state to probe, with a url showing it.
+
+    Returns:
+        list: (name, url, cleanup) tuples, where cleanup releases
+            whatever simulates the state.
+
+    """
+    up = fake_server(3)
+    no_encoders = fake_server(0)
+
+    # nothing listening on this port any more
+    closed = socket.socket()
+    closed.bind( ("127.0.0.1", 0) )
+    refused_port = closed.getsockname()[1]
+    closed.close()
+
+    # connections are accepted by the kernel, but never answered
+    hung = socket.socket()
+    hung.bind( ("127.0.0.1", 0) )
+    hung.listen(16)
+
+    def url(port):
+        return "http://127.0.0.1:" + str(port) + "/status.xsl"
+
+    return [ ("up",          url(up.server_port),          up.shutdown),
+             ("no encoders", url(no_encoders.server_port), no_encoders.shutdown),
+             ("refused",     url(refused_port),            lambda: None),
+             ("hung",        url(hung.getsockname()[1]),   hung.close) ]
+
+def bench_probe(timeout=stream.PROBE_TIMEOUT, hedge=stream.PROBE_HEDGE,
+                attempts=stream.PROBE_ATTEMPTS, deadline=stream.PROBE_DEADLINE):
+    """Measure how long stream.probe() takes to detect each kind of outage.
+
+    Args:
+        timeout: (connect, read) timeouts for each check.
+        hedge (float): seconds between starting checks.
+        attempts (int): most checks made.
+        deadline (float): seconds allowed in total.
+
+    Returns:
+        str: report with the time taken and cause found for each state.
+
+    Example:
+
+        >>> import bench
+        >>> print(bench.bench_probe())
+        <Prints time to detect an up stream, no encoders, refused and hung>
+    """
+    causes = { None                   : "up",
+               stream.NO_DATA         : "NO_DATA",
+               stream.CONNECT_REFUSED : "CONNECT_REFUSED",
+               stream.URL_ERROR       : "URL_ERROR" }
+    msg = "Stream probe time to detect (timeout " + str(timeout) + "s, hedge "
+    msg += str(hedge) + "s, " + str(attempts) + " attempts, deadline " + str(deadline) + "s):\n"
+    for name, url, cleanup in outages():
+        reader = stream.StatusReader(["json"], cache=False)
+        start  = time.perf_counter()
+        snap   = stream.probe(url, reader, timeout, hedge, attempts, deadline)
+        elapsed = time.perf_counter() - start
+        cleanup()
+        msg += "    " + "{0:<12}".format(name) + "{0:9.3f}s ".format(elapsed)
+        msg += causes.get(snap.cause, str(snap.cause)) + "\n"
+    msg += "    (before: up to " + str(attempts) + " checks one after another, "
+    msg += str(stream.TIMEOUT_VALUE) + "s timeout each)\n"
+    return msg
+
+def usage():
+    """Print Usage Statement.
+
+    Print the usage statement for running bench.py standalone.
+
+    Returns:
+        msg (str): Usage Statement.
+
+    Example:
+
+        >>> import bench
+        >>> msg = bench.usage()
+        >>> msg
+        '<bench.py usage statement>'
+    """
+    msg = "bench.py usage:\n"
+    msg = msg + "$ python bench.py \"<MOUNTS>(optional)\" ...\n"
+    msg = msg + "$ python bench.py --probe"
+    return msg
+
+
+if __name__ == "__main__":
+    if(sys.argv[1:] == ["--probe"]):
+        print(bench_probe())
+        sys.exit()
+    if(len(sys.argv) > 1 and not all(arg.isdigit() for arg in sys.argv[1:])):
+        print(usage())
+        sys.exit()
+    mounts = tuple( int(arg) for arg in sys.argv[1:] ) or BENCH_MOUNTS
+    print(bench_status(mounts))
@@ -0,0 +1,172 @@
+"""KTEQ-FM ADAPTIVE NOW PLAYING CADENCE.
+
+This module contains the Cadence class, used by TeqBot to decide how long to
+wait between checks of the IceCast server for a new song. Checking at a fixed
+interval means most checks happen in the middle of a song, when nothing is
+going to change, while a song change can still go unnoticed for up to a full
+interval.
+
+The Cadence class keeps a running list of how long songs have lasted, based
+on the song changes TeqBot has already seen. Early in a song, well before a
+change is likely (before the 10th percentile of song lengths), checks are
+spread out, which saves checks compared to the normal interval. Once a change
+is likely, the checks saved so far are spent evenly over the rest of the
+likely window (up to the 75th percentile), on top of the normal interval, so
+a song never gets more checks than the normal interval would have made, and
+changes in the window are found sooner. If the song runs past the window,
+checks go back to the normal interval. No matter what, the wait between
+checks never exceeds the maximum detection latency budget.
+
+Example:
+
+        >>> import cadence
+        >>> c = cadence.Cadence(10000)
+        >>> c.observe("#NowPlaying: Beat Market __by__ Sun Machine")
+        >>> c.next_interval()
+        10000
+
+Attributes:
+    FAST_INTERVAL (int): shortest wait between checks, in milliseconds
+    MAX_LATENCY (int): longest wait between checks, in milliseconds
+    MIN_SAMPLES (int): song lengths needed before adapting the interval
+    HISTORY (int): number of song lengths kept
+    MIN_SONG (int): shortest song length recorded, in seconds
+    MAX_SONG (int): longest song length recorded, in seconds
+
+Todo:
+    * Keep song lengths around between scheduler restarts.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import time
+import collections
+
+FAST_INTERVAL = 2000
+MAX_LATENCY   = 30000
+MIN_SAMPLES   = 5
+HISTORY       = 100
+
+#anything outside of this range is a DJ break or a metadata glitch
+MIN_SONG = 30
+MAX_SONG = 1800
+
+class Cadence:
+    """Adaptive interval for now playing checks.
+
+    Attributes:
+        base (int): normal interval between checks, in milliseconds.
+        fast (int): shortest interval between checks.
+        budget (int): longest allowed interval, in milliseconds.
+        durations (collections.deque): recent song lengths, in seconds.
+        song (str): last song observed.
+        changed (float): time the last song change was observed.
+        checks (int): checks made since the last song change.
+        stats (dict): counters for checks and song changes.
+
+    """
+
+    def __init__(self, base, fast=FAST_INTERVAL, budget=MAX_LATENCY, clock=time.monotonic):
+        """Cadence initialization method.
+
+        Args:
+            base (int): normal interval between checks, in milliseconds.
+            fast (int): shortest interval between checks.
+                Defaults to FAST_INTERVAL.
+            budget (int): maximum detection latency, in milliseconds.
+                Defaults to MAX_LATENCY.
+            clock (function): monotonic clock returning seconds.
+
+        """
+        self.base      = base
+        self.fast      = fast
+        self.budget    = budget
+        self.clock     = clock
+        self.durations = collections.deque(maxlen=HISTORY)
+        self.song      = None
+        self.changed   = None
+        self.checks    = 0
+        self.stats     = { "checks": 0, "changes": 0 }
+
+    def observe(self, song):
+        """Record the song seen by the latest now playing check.
+
+        Args:
+            song (str): song metadata from the latest check.
+
+        Returns:
+            bool: True if this is a new song.
+
+        """
+        self.stats["checks"] += 1
+        self.checks += 1
+        if not song or song == "None" or song == self.song:
+            return False
+
+        now = self.clock()
+        if self.changed is not None:
+            # only know how long a song lasted if we saw it start
+            length = now - self.changed
+            if MIN_SONG <= length <= MAX_SONG:
+                self.durations.append(length)
+        if self.song is not None:
+            self.stats["changes"] += 1
+        self.song    = song
+        self.changed = now
+        self.checks  = 0
+        return True
+
+    def quantile(self, q):
+        """Return the q-th quantile of recorded song lengths, in seconds."""
+        ordered = sorted(self.durations)
+        return ordered[ min(len(ordered) - 1, int(q * len(ordered))) ]
+
+    def next_interval(self):
+        """Determine how long to wait before the next check.
+
+        Returns:
+            int: milliseconds until the next now playing check.
+
+        """
+        if len(self.durations) < MIN_SAMPLES or self.changed is None:
+            return min(self.base, self.budget)
+
+        elapsed = self.clock() - self.changed
+        early   = self.quantile(0.1)
+        late    = self.quantile(0.75)
+
+        if elapsed < early:
+            # mid song, wait until a change becomes likely
+            wait = int( (early - elapsed) * 1000 )
+            return max(self.fast, min(wait, self.budget))
+        elif elapsed <= late:
+            # spend the checks saved so far (against checking every base
+            # interval) evenly over the rest of the window
+            saved = max(0, int(elapsed * 1000 // self.base) + 1 - self.checks)
+            left  = (late - elapsed) * 1000
+            wait  = left / (saved + left / self.base)
+            return int( max(self.fast, min(wait, self.base, self.budget)) )
+        else:
+            # longer than most songs, DJ is probably talking
+            return min(self.base, self.budget)
+
+    def report(self):
+        """Format the cadence counters.
+
+        Returns:
+            str: check and song change counts, with the song length
+                window used for fast checks.
+
+        """
+        msg = "Now Playing Cadence: checks " + str(self.stats["checks"])
+        msg += " changes " + str(self.stats["changes"])
+        if self.stats["changes"]:
+            msg += " checks per change " + "{0:.1f}".format(self.stats["checks"] / self.stats["changes"])
+        if len(self.durations) >= MIN_SAMPLES:
+            msg += " window " + "{0:.0f}s-{1:.0f}s".format(self.quantile(0.1), self.quantile(0.75))
+        return msg
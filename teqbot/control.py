@@ -0,0 +1,218 @@
+"""KTEQ-FM TEQBOT CONTROL SOCKET.
+
+This module contains the control socket used to talk to a running TeqBot
+scheduler. The scheduler listens on a Unix domain socket, and commands are
+sent to it one line at a time. Each command gets a single reply, answered
+from the scheduler's memory, after which the connection is closed. This
+replaces polling the .teq.stat file every second to find out if the
+scheduler should stop.
+
+The current commands are:
+
+    kill:            stop the scheduler.
+    status:          report what the scheduler is up to.
+    run-task <name>: run a task right away, outside of its schedule.
+    reload:          reload TeqBot's task code.
+    metrics:         task and call metrics, in Prometheus text format.
+    listeners [hours]: each mount's listeners over the last day (or hours).
+
+Example:
+
+        $ python control.py status
+
+Running this module from command line will send the given command to the
+scheduler running in the current directory, and print its reply.
+
+Attributes:
+    SOCKET_PATH (str): default path of the control socket, made absolute
+        when this module is imported. Can be changed with the TEQ_SOCKET
+        environment variable.
+    CLIENT_TIMEOUT (int): seconds a client waits on the scheduler.
+    SERVER_TIMEOUT (float): seconds the scheduler waits on a client to send
+        its command (and take its reply), in total. Kept short, as the
+        scheduler runs nothing else while it waits.
+
+Todo:
+    * Add a command for changing a task's interval.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import os
+import sys
+import time
+import socket
+
+#resolved now, like the state store and play log, so the scheduler and
+#its commands agree on the socket even if the working directory changes
+SOCKET_PATH    = os.path.abspath( os.environ.get('TEQ_SOCKET', '.teq.sock') )
+CLIENT_TIMEOUT = 5
+SERVER_TIMEOUT = 0.25
+
+class ControlServer:
+    """Unix domain socket server for scheduler commands.
+
+    The server never blocks on its own. The scheduler is expected to wait
+    on ControlServer.fileno() alongside whatever else it is waiting on,
+    and call ControlServer.handle() once the socket is readable. This
+    keeps commands running on the scheduler's own thread.
+
+    Attributes:
+        path (str): filesystem path of the socket.
+        handler (function): called with the command string, returns
+            the reply string.
+        sock (socket.socket): listening socket.
+
+    """
+
+    def __init__(self, handler, path=SOCKET_PATH):
+        """ControlServer initialization method.
+
+        Args:
+            handler (function): called with each command, returns reply.
+            path (str): socket path. Defaults to SOCKET_PATH.
+
+        """
+        self.path    = path
+        self.handler = handler
+        self.sock    = None
+
+    def start(self):
+        """Bind and listen on the control socket.
+
+        A socket file left behind by a scheduler that crashed is removed,
+        but a socket that another scheduler is still answering on is not.
+
+        Raises:
+            RuntimeError: if another scheduler owns the socket.
+
+        """
+        if os.path.exists(self.path):
+            if send_command("status", self.path) is not None:
+                raise RuntimeError("scheduler already running on " + self.path)
+            os.remove(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(4)
+        self.sock.setblocking(False)
+
+    def fileno(self):
+        """Return the listening socket's file descriptor."""
+        return self.sock.fileno()
+
+    def handle(self):
+        """Answer every client currently waiting on the socket."""
+        while True:
+            try:
+                conn, addr = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            with conn:
+                conn.setblocking(True)
+                try:
+                    # a client that never sends its command is dropped
+                    # quickly, rather than holding up the scheduler
+                    command = read_line(conn, time.monotonic() + SERVER_TIMEOUT)
+                    try:
+                        reply = self.handler(command)
+                    except Exception as e:
+                        reply = "Error: " + repr(e)
+                    conn.settimeout(SERVER_TIMEOUT)
+                    conn.sendall( (reply + "\n").encode() )
+                except (OSError, UnicodeDecodeError):
+                    # client went away (or stalled), nothing to answer
+                    pass
+
+    def stop(self):
+        """Close the socket and remove the socket file."""
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def read_line(conn, deadline):
+    """Read a single newline terminated command from a connection.
+
+    Raises:
+        socket.timeout: if the whole line hasn't arrived by deadline,
+            a time.monotonic() time.
+
+    """
+    data = b""
+    while not data.endswith(b"\n"):
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise socket.timeout("no command from client")
+        conn.settimeout(left)
+        chunk = conn.recv(1024)
+        if not chunk:
+            break
+        data += chunk
+    return data.decode().strip()
+
+def send_command(command, path=SOCKET_PATH):
+    """Send a command to a running scheduler.
+
+    Args:
+        command (str): command to send, such as "kill" or "status".
+        path (str): socket path. Defaults to SOCKET_PATH.
+
+    Returns:
+        str: The scheduler's reply, or None if no scheduler is listening.
+
+    Example:
+
+        >>> import control
+        >>> control.send_command("kill")
+        'Halting Scheduler'
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CLIENT_TIMEOUT)
+            sock.connect(path)
+            sock.sendall( (command + "\n").encode() )
+            reply = b""
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                reply += chunk
+            return reply.decode().rstrip("\n")
+    except (FileNotFoundError, ConnectionRefusedError, socket.timeout):
+        return None
+
+def usage():
+    """Print Usage Statement.
+
+    Print the usage statement for running control.py standalone.
+
+    Returns:
+        msg (str): Usage Statement.
+
+    Example:
+
+        >>> import control
+        >>> msg = control.usage()
+        >>> msg
+        '<control.py usage statement>'
+    """
+    msg = "control.py usage:\n"
+    msg = msg + "$ python control.py <kill|status|reload|metrics|run-task <name>|listeners [hours]>"
+    return msg
+
+
+if __name__ == "__main__":
+    if(len(sys.argv) > 1):
+        reply = send_command(" ".join(sys.argv[1:]))
+        if reply is None:
+            print("No scheduler is running")
+        else:
+            print(reply)
+    else:
+        print(usage())
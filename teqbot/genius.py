@@ -32,11 +32,12 @@ Todo:
 """
 
 import sys
-import requests
 import os
 from bs4 import BeautifulSoup
 from nltk.stem.lancaster import LancasterStemmer
 from difflib import SequenceMatcher
+import httpclient
+import metrics
 
 GENIUS_URL = "https://api.genius.com"
 
@@ -139,7 +140,7 @@ def clean_test_01(lyrics, bad_words=None):
     params = {'q': lyrics}
 
     # GET request, using the lyrics of song
-    response = requests.get(url, params=params)
+    response = httpclient.get(url, params=params)
 
     test = None
     # Determine if song is clean, has swears, or other
@@ -198,6 +199,7 @@ def clean_test_02(lyrics, bad_words):
     return [test, bad_found ]
 
 
+@metrics.timed("genius.get_lyrics")
 def get_lyrics(auth, api_path):
     """Find the Lyrics of a given song.
 
@@ -214,7 +216,7 @@ def get_lyrics(auth, api_path):
     url = GENIUS_URL + api_path
 
     # GET request
-    response = requests.get(url, headers=auth)
+    response = httpclient.get(url, headers=auth)
 
     # Get json version
     json = response.json()
@@ -222,7 +224,7 @@ def get_lyrics(auth, api_path):
 
     # Scrape using soup
     url = "http://genius.com" + path
-    lyric_page = requests.get(url)
+    lyric_page = httpclient.get(url)
     html = BeautifulSoup(lyric_page.text, "html.parser")
 
     # Clean script tags
@@ -327,6 +329,7 @@ def generate_report(song,artist,lyrics,result):
     return msg
 
 
+@metrics.timed("genius.get_api_path")
 def get_api_path(auth, song_title, song_artist):
     """Find a song using Genius API and return an api path to it.
 
@@ -349,7 +352,7 @@ def get_api_path(auth, song_title, song_artist):
 
     # First search: Search by song title
     data = {'q': song_title}
-    response = requests.get(url, data=data, headers=auth)
+    response = httpclient.get(url, data=data, headers=auth)
 
     # Get JSON Data
     json = response.json()
@@ -371,7 +374,7 @@ def get_api_path(auth, song_title, song_artist):
     else:
         # Second search: Reversed, search by artist
         data = {'q': song_artist}
-        response = requests.get(url, data=data, headers=auth)
+        response = httpclient.get(url, data=data, headers=auth)
         json = response.json()
         info = None
 
@@ -0,0 +1,251 @@
+"""KTEQ-FM TEQBOT HTTP CLIENT.
+
+This module contains the HTTP client shared by every module in TeqBot that
+talks to another service over HTTP (IceCast, TuneIn and Genius). Rather than
+opening a new connection (and for https, a new TLS handshake) for every
+request, connections are kept alive and reused between requests to the same
+host. Every request also asks for a gzip compressed response, which cuts the
+size of status pages and lyric pages considerably.
+
+Each host gets its own requests Session, with a connection pool sized by
+that host's keep-alive limit. Only that many idle connections are kept open
+to a host, any more than that are closed once they are finished with, so a
+burst of requests doesn't leave a pile of sockets sitting open.
+
+The number of requests made to each host, and the number of new connections
+they needed, are counted so that connection reuse can be checked on the live
+server, through the scheduler's status and the metrics module.
+
+The client is shared by everything in a process, and the requests library is
+only imported once the first request is made, to keep startup quick.
+
+Example:
+
+        >>> import httpclient
+        >>> page = httpclient.get("http://www.kteq.org/")
+        >>> print(httpclient.report())
+
+        $ python httpclient.py "http://www.kteq.org/" 3
+
+Running this module from command line will request a url several times,
+then report how many connections were needed.
+
+Attributes:
+    TIMEOUT (int): seconds a request waits on the server, unless the
+        caller gives its own timeout
+    POOL_MAXSIZE (int): idle connections kept open to each host
+    HOST_LIMITS (dict): hosts kept to a different number of idle
+        connections than POOL_MAXSIZE
+    ACCEPT_ENCODING (str): compression asked for on every request
+    CLIENT (HttpClient): client shared by this process, or None until
+        the first request
+
+Todo:
+    * Look into HTTP/2 for the Genius API.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import sys
+import threading
+import urllib.parse
+import metrics
+
+TIMEOUT = 60
+
+POOL_MAXSIZE = 2
+
+HOST_LIMITS = { "air.radiotime.com" : 1,
+                "api.genius.com"    : 2,
+                "genius.com"        : 2 }
+
+ACCEPT_ENCODING = "gzip, deflate"
+
+class HttpClient:
+    """Keep-alive HTTP client, with a connection pool per host.
+
+    Attributes:
+        maxsize (int): idle connections kept open to each host.
+        limits (dict): host to idle connections kept open, for hosts
+            that differ from maxsize.
+        timeout (int): default seconds to wait on the server.
+        sessions (dict): "scheme://host:port" to requests.Session.
+        stats (dict): "scheme://host:port" to [requests, connections].
+
+    """
+
+    def __init__(self, maxsize=POOL_MAXSIZE, limits=None, timeout=TIMEOUT):
+        """HttpClient initialization method.
+
+        Args:
+            maxsize (int): idle connections kept open to each host.
+                Defaults to POOL_MAXSIZE.
+            limits (dict): per host limits. Defaults to HOST_LIMITS.
+            timeout (int): default seconds to wait on the server.
+                Defaults to TIMEOUT.
+
+        """
+        self.maxsize  = maxsize
+        self.limits   = HOST_LIMITS if limits is None else limits
+        self.timeout  = timeout
+        self.lock     = threading.Lock()
+        self.sessions = {}
+        self.stats    = {}
+
+    def session(self, origin, host):
+        """Get (or start) the requests.Session for a host."""
+        session = self.sessions.get(origin)
+        if session is not None:
+            return session
+        import requests
+        import requests.adapters
+        with self.lock:
+            if origin not in self.sessions:
+                limit   = self.limits.get(host, self.maxsize)
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=limit)
+                session = requests.Session()
+                session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[origin] = session
+                self.stats[origin]    = [0, 0]
+            return self.sessions[origin]
+
+    def request(self, method, url, **kwargs):
+        """Make an HTTP request, reusing a kept-alive connection if possible.
+
+        Args:
+            method (str): HTTP method, such as "GET".
+            url (str): url to request.
+            **kwargs: passed along to requests.Session.request(), such as
+                headers, params or stream. timeout defaults to the
+                client's timeout.
+
+        Returns:
+            requests.Response: the server's response. Responses made with
+                stream=True should be closed (or used in a with block)
+                so their connection goes back to the pool.
+
+        """
+        parts   = urllib.parse.urlsplit(url)
+        origin  = parts.scheme + "://" + parts.netloc
+        session = self.session(origin, parts.hostname)
+        adapter = session.get_adapter(url)
+        opened  = connections_opened(adapter)
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            return session.request(method, url, **kwargs)
+        finally:
+            # counted even if the request failed, it still used a connection
+            connections = max(0, connections_opened(adapter) - opened)
+            with self.lock:
+                self.stats[origin][0] += 1
+                self.stats[origin][1] += connections
+            metrics.REGISTRY.inc("http_requests_total", "host", parts.netloc)
+            if connections:
+                metrics.REGISTRY.inc("http_connections_total", "host", parts.netloc, connections)
+
+    def get(self, url, **kwargs):
+        """Make an HTTP GET request, see HttpClient.request()."""
+        return self.request("GET", url, **kwargs)
+
+    def report(self):
+        """Format the connection reuse counters for each host.
+
+        Returns:
+            str: requests, new connections and reuse rate per host.
+
+        """
+        msg = "HTTP Connections:\n"
+        with self.lock:
+            for origin, (count, connections) in sorted(self.stats.items()):
+                reused = 100.0 * (count - connections) / count if count else 0.0
+                msg += "    " + origin + " requests " + str(count)
+                msg += " connections " + str(connections)
+                msg += " reused " + "{0:.0f}%".format(reused) + "\n"
+        return msg
+
+    def close(self):
+        """Close every kept-alive connection."""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+
+def connections_opened(adapter):
+    """Count the connections a requests adapter has opened so far."""
+    pools = adapter.poolmanager.pools
+    return sum( pools[key].num_connections for key in pools.keys() )
+
+#client shared by this process
+CLIENT = None
+clientLock = threading.Lock()
+
+def shared():
+    """Get the HttpClient shared by this process, starting it if needed."""
+    global CLIENT
+    if CLIENT is None:
+        with clientLock:
+            if CLIENT is None:
+                CLIENT = HttpClient()
+    return CLIENT
+
+def get(url, **kwargs):
+    """Make an HTTP GET request through the shared client.
+
+    Example:
+
+        >>> import httpclient
+        >>> response = httpclient.get(url, headers=auth)
+        >>> response.json()
+
+    """
+    return shared().get(url, **kwargs)
+
+def report():
+    """Report on the shared client's connections, or '' if it is unused."""
+    return CLIENT.report() if CLIENT else ""
+
+def reset():
+    """Forget the shared client without closing its connections, such as
+    after forking from a process that already has some open. The sockets
+    belong to the parent, closing them here could cut it off mid-request."""
+    global CLIENT, clientLock
+    CLIENT     = None
+    clientLock = threading.Lock()
+
+def usage():
+    """Print Usage Statement.
+
+    Print the usage statement for running httpclient.py standalone.
+
+    Returns:
+        msg (str): Usage Statement.
+
+    Example:
+
+        >>> import httpclient
+        >>> msg = httpclient.usage()
+        >>> msg
+        '<httpclient.py usage statement>'
+    """
+    msg = "httpclient.py usage:\n"
+    msg = msg + "$ python httpclient.py \"<URL>\" \"<REQUESTS>(optional)\""
+    return msg
+
+
+if __name__ == "__main__":
+    if(len(sys.argv) > 1):
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+        for i in range(count):
+            response = get(sys.argv[1])
+            print(response.status_code, len(response.content), "bytes,",
+                  response.headers.get("Content-Encoding", "identity"))
+        print(report())
+    else:
+        print(usage())
@@ -0,0 +1,362 @@
+"""KTEQ-FM TEQBOT LISTENER HISTORY.
+
+This module keeps a history of how many listeners each mount of the stream
+has had. Listener counts are sampled every RESOLUTION seconds, and kept in
+fixed size ring buffers (arrays, rather than lists of python objects), so
+the history takes the same amount of memory no matter how long TeqBot runs.
+
+The history is kept in tiers. The finest tier holds every sample for a day.
+As each minute goes by, its samples are rolled up into the minimum, average
+and maximum listeners for that minute, which are kept for a week. Minutes
+are rolled up into hours the same way, which are kept for a year. A year of
+history takes about 330KB per mount, and can be written to (and read back
+from) a compact binary file.
+
+Looking up a range of time reads from the finest tier that still covers it,
+so "listeners over the last 24 hours" only scans one day of samples.
+
+Example:
+
+        >>> import listeners
+        >>> history = listeners.ListenerHistory()
+        >>> history.record("/kteq", 12)
+        >>> history.summary("/kteq", time.time() - 86400)
+        (12, 12.0, 12)
+        >>> history.save()
+
+        $ python listeners.py .teq.listeners 24
+
+Running this module from command line will report the minimum, average and
+maximum listeners on each mount over the last few hours, from a saved file.
+
+Attributes:
+    RESOLUTION (int): seconds between listener samples
+    TIERS (tuple): (seconds per slot, slots kept) for each tier, finest
+        first. Each tier's slot must be a whole number of the slots in
+        the tier before it.
+    MISSING (int): marks a slot with no samples in it
+    HISTORY_FILE (str): default file the history is saved to
+    SAVE_INTERVAL (int): seconds between saves while sampling
+    MAGIC (bytes): first bytes of a history file
+    VERSION (int): history file format version
+
+Todo:
+    * Graph the history on slack.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import os
+import sys
+import time
+import struct
+import threading
+from array import array
+
+RESOLUTION = 10
+
+#10 seconds for a day, 1 minute for a week, 1 hour for a (leap) year
+TIERS = ( (RESOLUTION, 8640),
+          (60,         10080),
+          (3600,       8784) )
+
+MISSING = 0xFFFFFFFF
+
+HISTORY_FILE = '.teq.listeners'
+
+SAVE_INTERVAL = 300
+
+MAGIC   = b"TEQL"
+VERSION = 1
+
+class Tier:
+    """Ring buffer of listener counts, one slot per span of time.
+
+    Slots are numbered from the epoch (slot = time // seconds), and slot
+    numbers wrap around the arrays, so once the ring is full the oldest
+    slot is overwritten by the newest.
+
+    Attributes:
+        seconds (int): seconds covered by each slot.
+        slots (int): slots kept.
+        low (array): fewest listeners in each slot, MISSING if empty.
+        mean (array): average listeners in each slot.
+        high (array): most listeners in each slot.
+        last (int): newest slot written to, -1 if none yet.
+
+    """
+
+    def __init__(self, seconds, slots):
+        """Tier initialization method.
+
+        Args:
+            seconds (int): seconds covered by each slot.
+            slots (int): slots kept.
+
+        """
+        self.seconds = seconds
+        self.slots   = slots
+        self.low     = array('I', [MISSING]) * slots
+        self.mean    = array('f', [0.0]) * slots
+        self.high    = array('I', [0]) * slots
+        self.last    = -1
+
+    def put(self, slot, low, mean, high):
+        """Write one slot, emptying any slots skipped since the last."""
+        if slot > self.last:
+            if slot - self.last > self.slots:
+                self.low = array('I', [MISSING]) * self.slots
+            else:
+                for skipped in range(self.last + 1, slot):
+                    self.low[skipped % self.slots] = MISSING
+            self.last = slot
+        elif slot <= self.last - self.slots:
+            # older than anything still kept
+            return
+        i = slot % self.slots
+        self.low[i]  = low
+        self.mean[i] = mean
+        self.high[i] = high
+
+    def first(self):
+        """Oldest slot still kept."""
+        return self.last - self.slots + 1
+
+    def rows(self, first, last):
+        """Yield (slot, low, mean, high) for every slot with data in a range."""
+        low, mean, high, slots = self.low, self.mean, self.high, self.slots
+        for slot in range( max(first, self.first()), min(last, self.last) + 1 ):
+            i = slot % slots
+            if low[i] != MISSING:
+                yield slot, low[i], mean[i], high[i]
+
+class ListenerHistory:
+    """Listener history for every mount of the stream.
+
+    Samples can be recorded on one thread while the history is looked
+    up (or saved) on another.
+
+    Attributes:
+        tiers (tuple): (seconds per slot, slots kept) for each tier.
+        mounts (dict): mount point to a list of Tier, finest first.
+
+    """
+
+    def __init__(self, tiers=TIERS):
+        """ListenerHistory initialization method.
+
+        Args:
+            tiers (tuple): (seconds per slot, slots kept) for each tier.
+                Defaults to TIERS.
+
+        """
+        self.tiers  = tuple( tuple(tier) for tier in tiers )
+        self.lock   = threading.Lock()
+        self.mounts = {}
+
+    def record(self, mount, listeners, now=None):
+        """Record a mount's listener count.
+
+        Args:
+            mount (str): mount point, such as '/kteq'.
+            listeners (int): current listeners.
+            now (float): time of the sample. Defaults to now.
+
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            tiers = self.mounts.get(mount)
+            if tiers is None:
+                tiers = self.mounts[mount] = [ Tier(seconds, slots) for seconds, slots in self.tiers ]
+            self.put(tiers, 0, int(now // tiers[0].seconds), listeners, listeners, listeners)
+
+    def put(self, tiers, level, slot, low, mean, high):
+        """Write a slot to a tier, rolling up the slot before it if that
+        one is now finished."""
+        tier = tiers[level]
+        if level + 1 < len(tiers) and tier.last >= 0:
+            ratio    = tiers[level + 1].seconds // tier.seconds
+            finished = tier.last // ratio
+            if slot // ratio > finished:
+                # before putting, as a long gap empties the whole ring
+                self.rollup(tiers, level, finished, ratio)
+        tier.put(slot, low, mean, high)
+
+    def rollup(self, tiers, level, parent, ratio):
+        """Summarize a finished span of one tier into the next tier up."""
+        low   = MISSING
+        high  = 0
+        total = 0.0
+        count = 0
+        for slot, l, m, h in tiers[level].rows(parent * ratio, parent * ratio + ratio - 1):
+            low    = min(low, l)
+            high   = max(high, h)
+            total += m
+            count += 1
+        if count:
+            self.put(tiers, level + 1, parent, low, total / count, high)
+
+    def query(self, mount, start, end=None):
+        """Look up a mount's listeners over a range of time.
+
+        The finest tier that still holds the start of the range is used,
+        so recent ranges come back at 10 second resolution, and older
+        ones at 1 minute or 1 hour resolution.
+
+        Args:
+            mount (str): mount point, such as '/kteq'.
+            start (float): start of the range, as a unix time.
+            end (float): end of the range. Defaults to now.
+
+        Returns:
+            list: (time, low, mean, high) for each slot with data.
+
+        """
+        end = time.time() if end is None else end
+        with self.lock:
+            tiers = self.mounts.get(mount)
+            if not tiers:
+                return []
+            for tier in tiers:
+                if start // tier.seconds >= tier.first():
+                    break
+            return [ (slot * tier.seconds, low, mean, high)
+                     for slot, low, mean, high in tier.rows(int(start // tier.seconds), int(end // tier.seconds)) ]
+
+    def summary(self, mount, start, end=None):
+        """Fewest, average and most listeners on a mount over a range.
+
+        Args:
+            mount (str): mount point, such as '/kteq'.
+            start (float): start of the range, as a unix time.
+            end (float): end of the range. Defaults to now.
+
+        Returns:
+            tuple: (low, mean, high), or None if there is no data.
+
+        """
+        rows = self.query(mount, start, end)
+        if not rows:
+            return None
+        return ( min( row[1] for row in rows ),
+                 sum( row[2] for row in rows ) / len(rows),
+                 max( row[3] for row in rows ) )
+
+    def report(self, hours=24, now=None):
+        """Format each mount's listeners over the last few hours.
+
+        Args:
+            hours (float): hours to report on.
+            now (float): end of the range. Defaults to now.
+
+        Returns:
+            str: fewest, average and most listeners on each mount.
+
+        """
+        now = time.time() if now is None else now
+        msg = "Listeners over the last " + "{0:g}".format(hours) + " hours:\n"
+        with self.lock:
+            mounts = sorted(self.mounts)
+        for mount in mounts:
+            found = self.summary(mount, now - hours * 3600, now)
+            if found:
+                msg += "    " + mount + " min " + str(found[0]) + " avg " + "{0:.1f}".format(found[1])
+                msg += " max " + str(found[2]) + "\n"
+        return msg
+
+    def save(self, filename=HISTORY_FILE):
+        """Write the history to a binary file.
+
+        The file is written next to its final location and then renamed
+        over it, so a crash never leaves a half written history behind.
+
+        Args:
+            filename (str): path to write to. Defaults to HISTORY_FILE.
+
+        """
+        tmp = filename + ".tmp"
+        with self.lock, open(tmp, 'wb') as f:
+            f.write( struct.pack("<4sBBH", MAGIC, VERSION, len(self.tiers), len(self.mounts)) )
+            for seconds, slots in self.tiers:
+                f.write( struct.pack("<II", seconds, slots) )
+            for mount, tiers in sorted(self.mounts.items()):
+                name = mount.encode()
+                f.write( struct.pack("<H", len(name)) + name )
+                for tier in tiers:
+                    f.write( struct.pack("<q", tier.last) )
+                    tier.low.tofile(f)
+                    tier.mean.tofile(f)
+                    tier.high.tofile(f)
+        os.replace(tmp, filename)
+
+    def load(self, filename=HISTORY_FILE):
+        """Read the history back from a file written by ListenerHistory.save().
+
+        A file saved with different tiers (or that can't be read) is
+        ignored, leaving the history empty.
+
+        Args:
+            filename (str): path to read. Defaults to HISTORY_FILE.
+
+        Returns:
+            bool: True if the history was loaded.
+
+        """
+        mounts = {}
+        try:
+            with open(filename, 'rb') as f:
+                magic, version, count, total = struct.unpack("<4sBBH", f.read(8))
+                tiers = tuple( struct.unpack("<II", f.read(8)) for i in range(count) )
+                if magic != MAGIC or version != VERSION or tiers != self.tiers:
+                    return False
+                for i in range(total):
+                    size  = struct.unpack("<H", f.read(2))[0]
+                    mount = f.read(size).decode()
+                    mounts[mount] = []
+                    for seconds, slots in tiers:
+                        tier = Tier(seconds, slots)
+                        tier.last = struct.unpack("<q", f.read(8))[0]
+                        for values in (tier.low, tier.mean, tier.high):
+                            del values[:]
+                            values.fromfile(f, slots)
+                        mounts[mount].append(tier)
+        except (OSError, EOFError, struct.error, UnicodeDecodeError):
+            return False
+        with self.lock:
+            self.mounts = mounts
+        return True
+
+def usage():
+    """Print Usage Statement.
+
+    Print the usage statement for running listeners.py standalone.
+
+    Returns:
+        msg (str): Usage Statement.
+
+    Example:
+
+        >>> import listeners
+        >>> msg = listeners.usage()
+        >>> msg
+        '<listeners.py usage statement>'
+    """
+    msg = "listeners.py usage:\n"
+    msg = msg + "$ python listeners.py \"<HISTORY_FILE>\" \"<HOURS>(optional)\""
+    return msg
+
+
+if __name__ == "__main__":
+    if(len(sys.argv) > 1):
+        history = ListenerHistory()
+        if history.load(sys.argv[1]):
+            print( history.report( float(sys.argv[2]) if len(sys.argv) > 2 else 24 ) )
+        else:
+            print("Unable to read", sys.argv[1])
+    else:
+        print(usage())
@@ -0,0 +1,344 @@
+"""KTEQ-FM TEQBOT METRICS.
+
+This module keeps track of runtime metrics for TeqBot, and exports them in
+the Prometheus text format. Every scheduled task, and every call TeqBot makes
+out to another service (IceCast, slack, TuneIn and Genius), records how many
+times it ran, how many times it failed, and a histogram of how long it took.
+
+Metrics can be read from a local HTTP endpoint at /metrics, and can also be
+written out to a file for the node exporter's textfile collector. Tasks that
+run in other processes (spawned tasks and worker pool processes) hand their
+metrics back to the scheduler as snapshots, which are merged in when the
+metrics are exported.
+
+Example:
+
+        >>> import metrics
+        >>> @metrics.timed("stream.ping_stream")
+        ... def ping_stream(url):
+        ...     pass
+        >>> metrics.serve(9091)
+
+Attributes:
+    BUCKETS (tuple): histogram bucket upper bounds, in seconds
+    PREFIX (str): prefix for every metric name
+    HELP (dict): help text for each metric
+    REGISTRY (Registry): metrics recorded by this process
+
+Todo:
+    * Add gauges for things like listener counts.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PREFIX = "teqbot_"
+
+HELP = { "task_runs_total"       : "Scheduled task runs.",
+         "task_errors_total"     : "Scheduled task runs that failed.",
+         "task_duration_seconds" : "Scheduled task run time.",
+         "task_dispatch_seconds" : "Time from dispatching a task to it starting to run.",
+         "call_total"            : "Outbound calls to other services.",
+         "call_errors_total"     : "Outbound calls that failed.",
+         "call_duration_seconds" : "Outbound call latency.",
+         "status_cache_total"    : "Stream status page reads, by cache result.",
+         "status_parse_seconds"  : "Stream status page parse time.",
+         "status_parse_saved_seconds_total" : "Parse time saved by status cache hits.",
+         "http_requests_total"   : "Outbound HTTP requests, by host.",
+         "http_connections_total" : "New HTTP connections opened, by host.",
+         "icy_connects_total"    : "Connections made to a mount for ICY metadata.",
+         "icy_titles_total"      : "Song title changes heard in ICY metadata.",
+         "stream_flowing_total"  : "Mount throughput checks with audio arriving in real time.",
+         "stream_stalls_total"   : "Mount throughput checks that found the mount stalled.",
+         "snapshot_reads_total"  : "Stream status snapshots handed out, by whether they were read or shared.",
+         "tunein_request_seconds" : "TuneIn AIR API request latency, by HTTP status." }
+
+class Registry:
+    """A set of counters and histograms.
+
+    Counters and histograms are keyed by metric name and a single label,
+    such as ("task_runs_total", "task", "nowplaying").
+
+    Attributes:
+        counters (dict): (name, label, value) to count.
+        histograms (dict): (name, label, value) to [buckets, sum, count],
+            where buckets holds a (non-cumulative) count per bucket in
+            BUCKETS, plus one for anything larger.
+
+    """
+
+    def __init__(self):
+        """Registry initialization method."""
+        self.lock       = threading.Lock()
+        self.counters   = {}
+        self.histograms = {}
+
+    def inc(self, name, label, value, amount=1):
+        """Increment a counter."""
+        key = (name, label, value)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, label, value, seconds):
+        """Record a value in a histogram."""
+        key = (name, label, value)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = [ [0] * (len(BUCKETS) + 1), 0.0, 0 ]
+            hist = self.histograms[key]
+            i = 0
+            while i < len(BUCKETS) and seconds > BUCKETS[i]:
+                i += 1
+            hist[0][i] += 1
+            hist[1]    += seconds
+            hist[2]    += 1
+
+    def reset(self):
+        """Forget every metric, such as after forking from a process
+        that already recorded some. The lock is replaced too, in case
+        another thread was holding it at the time of the fork."""
+        self.lock       = threading.Lock()
+        self.counters   = {}
+        self.histograms = {}
+
+    def snapshot(self):
+        """Return every metric as plain lists, for sending elsewhere.
+
+        Returns:
+            dict: json friendly copy of the registry.
+
+        """
+        with self.lock:
+            return { "counters"   : [ list(key) + [count] for key, count in self.counters.items() ],
+                     "histograms" : [ list(key) + [list(h[0]), h[1], h[2]] for key, h in self.histograms.items() ] }
+
+    def merge(self, snapshot):
+        """Add a snapshot from another registry into this one.
+
+        Args:
+            snapshot (dict): value returned by Registry.snapshot().
+
+        """
+        with self.lock:
+            for name, label, value, count in snapshot["counters"]:
+                key = (name, label, value)
+                self.counters[key] = self.counters.get(key, 0) + count
+            for name, label, value, buckets, total, count in snapshot["histograms"]:
+                key = (name, label, value)
+                if key not in self.histograms:
+                    self.histograms[key] = [ [0] * (len(BUCKETS) + 1), 0.0, 0 ]
+                hist = self.histograms[key]
+                hist[0] = [ a + b for a, b in zip(hist[0], buckets) ]
+                hist[1] += total
+                hist[2] += count
+
+    def render(self):
+        """Format the registry in the Prometheus text format.
+
+        Returns:
+            str: Prometheus text exposition of every metric.
+
+        """
+        lines = []
+        with self.lock:
+            names = sorted( set( key[0] for key in self.counters ) )
+            for name in names:
+                lines.append("# HELP " + PREFIX + name + " " + HELP.get(name, name))
+                lines.append("# TYPE " + PREFIX + name + " counter")
+                for key in sorted(k for k in self.counters if k[0] == name):
+                    lines.append(PREFIX + name + label_text(key[1], key[2]) + " " + str(self.counters[key]))
+
+            names = sorted( set( key[0] for key in self.histograms ) )
+            for name in names:
+                lines.append("# HELP " + PREFIX + name + " " + HELP.get(name, name))
+                lines.append("# TYPE " + PREFIX + name + " histogram")
+                for key in sorted(k for k in self.histograms if k[0] == name):
+                    buckets, total, count = self.histograms[key]
+                    cumulative = 0
+                    for bound, n in zip(BUCKETS + ("+Inf",), buckets):
+                        cumulative += n
+                        le = ',le="' + str(bound) + '"'
+                        lines.append(PREFIX + name + "_bucket" + label_text(key[1], key[2], le) + " " + str(cumulative))
+                    lines.append(PREFIX + name + "_sum" + label_text(key[1], key[2]) + " " + repr(total))
+                    lines.append(PREFIX + name + "_count" + label_text(key[1], key[2]) + " " + str(count))
+        return "\n".join(lines) + "\n"
+
+def label_text(label, value, extra=""):
+    """Format a single label (and any extra labels) for a metric line."""
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return "{" + label + '="' + value + '"' + extra + "}"
+
+#metrics for this process
+REGISTRY = Registry()
+
+def record_task(task, seconds, error=False, registry=REGISTRY):
+    """Record a single run of a scheduled task.
+
+    Args:
+        task (str): task name, such as "nowplaying".
+        seconds (float): how long the task took.
+        error (bool): True if the task failed.
+
+    """
+    registry.inc("task_runs_total", "task", task)
+    if error:
+        registry.inc("task_errors_total", "task", task)
+    registry.observe("task_duration_seconds", "task", task, seconds)
+
+def record_dispatch(task, seconds, registry=REGISTRY):
+    """Record how long a dispatched task took to start running.
+
+    Args:
+        task (str): task name, such as "nowplaying".
+        seconds (float): time from being dispatched to starting.
+
+    """
+    registry.observe("task_dispatch_seconds", "task", task, seconds)
+
+def record_call(call, seconds, error=False, registry=REGISTRY):
+    """Record a single outbound call.
+
+    Args:
+        call (str): call name, such as "stream.ping_stream".
+        seconds (float): how long the call took.
+        error (bool): True if the call failed.
+
+    """
+    registry.inc("call_total", "call", call)
+    if error:
+        registry.inc("call_errors_total", "call", call)
+    registry.observe("call_duration_seconds", "call", call, seconds)
+
+def timed(call, ok=None):
+    """Decorator for recording metrics on an outbound call.
+
+    A call that raises an exception is counted as an error. Functions
+    that report failure through their return value instead can provide
+    an ok function, which is given the return value and returns False
+    if the call failed.
+
+    Args:
+        call (str): call name, such as "stream.ping_stream".
+        ok (function): Optional check of the call's return value.
+
+    Returns:
+        function: decorator for the call.
+
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            error = True
+            try:
+                result = func(*args, **kwargs)
+                error  = ok is not None and not ok(result)
+                return result
+            finally:
+                record_call(call, time.monotonic() - start, error)
+        return wrapper
+    return decorator
+
+def write_snapshot(filename, registry=REGISTRY):
+    """Write this process's metrics to a file, for a parent process."""
+    with open(filename, 'w') as f:
+        json.dump(registry.snapshot(), f)
+
+def read_snapshot(filename):
+    """Read (and remove) a metrics file written by write_snapshot().
+
+    Returns:
+        dict: the snapshot, or None if there isn't a readable one.
+
+    """
+    try:
+        with open(filename) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+    return snapshot
+
+def render(snapshots=()):
+    """Render this process's metrics, along with any extra snapshots.
+
+    Args:
+        snapshots (list): snapshots from other processes to include.
+
+    Returns:
+        str: Prometheus text exposition.
+
+    """
+    if not snapshots:
+        return REGISTRY.render()
+    combined = Registry()
+    combined.merge( REGISTRY.snapshot() )
+    for snapshot in snapshots:
+        combined.merge(snapshot)
+    return combined.render()
+
+def write_textfile(filename, snapshots=()):
+    """Write metrics for the node exporter's textfile collector.
+
+    The file is written next to its final location and then renamed
+    over it, so the collector never reads a half written file.
+
+    Args:
+        filename (str): path of the .prom file.
+        snapshots (list): snapshots from other processes to include.
+
+    """
+    tmp = filename + ".tmp"
+    with open(tmp, 'w') as f:
+        f.write( render(snapshots) )
+    os.replace(tmp, filename)
+
+def serve(port, snapshots=lambda: (), host="127.0.0.1"):
+    """Serve metrics over HTTP at /metrics, on a background thread.
+
+    Args:
+        port (int): port to listen on.
+        snapshots (function): returns snapshots from other processes
+            to include each time the metrics are read.
+        host (str): address to listen on. Defaults to localhost only.
+
+    Returns:
+        http.server.HTTPServer: the running server.
+
+    """
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render( snapshots() ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            # keep scrapes out of TeqBot's output
+            pass
+
+    server = HTTPServer( (host, port), Handler )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
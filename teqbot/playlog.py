@@ -0,0 +1,281 @@
+"""KTEQ-FM TEQBOT PLAY LOG.
+
+This module keeps a log of every song TeqBot has seen played, so that what
+played at a given time (such as for the FCC logs, or when a DJ disputes
+what was on air) can be looked up long after the song is over. Only the
+last song played is kept in TeqBot's state store.
+
+Each play is appended to the log as one line of JSON, so the log can be
+read (or grepped) by hand. Alongside it, a small index file has a fixed
+size (time, offset) entry appended every INDEX_BYTES or so of log, giving
+the time of the play starting at that offset. Appending a play only ever
+writes to the end of the two files, so it takes the same time no matter
+how large the log has grown.
+
+Looking up a range of time bisects the index (memory mapped, so only the
+entries the bisection touches are read) to find where in the log the range
+starts and ends, and only that part of the log, also memory mapped, is
+read. Years of history are looked up in milliseconds.
+
+Example:
+
+        >>> import playlog
+        >>> plays = playlog.PlayLog()
+        >>> plays.append("#NowPlaying: Beat Market __by__ Sun Machine")
+        >>> plays.query(time.time() - 3600)
+        [Play(time=1476390000.0, title='Beat Market', artist='Sun Machine')]
+
+        $ python playlog.py "2016-10-11 14:00" "2016-10-11 16:00"
+
+Running this module from command line will print every song played
+between two times.
+
+Attributes:
+    PLAY_LOG (str): path of the play log. Can be changed with the
+        TEQ_PLAYS environment variable. The index is kept next to it,
+        with INDEX_SUFFIX added.
+    INDEX_SUFFIX (str): added to the play log's path for the index
+    INDEX_BYTES (int): bytes of log between index entries
+    INDEX_ENTRY (struct.Struct): layout of an index entry, the time of
+        a play and its offset in the log
+    TIME_FORMATS (tuple): formats accepted by parse_time()
+
+Todo:
+    * Post a day's play log to slack.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import os
+import sys
+import json
+import time
+import mmap
+import fcntl
+import struct
+from collections import namedtuple
+import songinfo
+
+#resolved now, so the log doesn't move if the working directory does
+PLAY_LOG = os.path.abspath( os.environ.get('TEQ_PLAYS', '.teq.plays') )
+
+INDEX_SUFFIX = '.idx'
+
+INDEX_BYTES = 4096
+
+INDEX_ENTRY = struct.Struct("<dQ")
+
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+#one song played, time is a unix time
+Play = namedtuple("Play", ["time", "title", "artist"])
+
+class PlayLog:
+    """Append-only log of songs played, indexed by time.
+
+    Plays can be appended from any process, one at a time (appends lock
+    the log), and looked up while they are being appended.
+
+    Attributes:
+        path (str): path of the log.
+        index (str): path of the index.
+        every (int): bytes of log between index entries.
+
+    """
+
+    def __init__(self, path=PLAY_LOG, every=INDEX_BYTES):
+        """PlayLog initialization method.
+
+        Args:
+            path (str): path of the log. Defaults to PLAY_LOG.
+            every (int): bytes of log between index entries. Defaults
+                to INDEX_BYTES.
+
+        """
+        self.path  = path
+        self.index = path + INDEX_SUFFIX
+        self.every = every
+
+    def append(self, song, now=None):
+        """Add a play to the end of the log.
+
+        Args:
+            song (songinfo.SongMetadata): song played, or its metadata
+                string.
+            now (float): time the song started. Defaults to now.
+
+        """
+        song = songinfo.as_song(song)
+        now  = time.time() if now is None else now
+        with open(self.path, 'a+b') as log, open(self.index, 'a+b') as index:
+            fcntl.flock(log, fcntl.LOCK_EX)
+            end = log.seek(0, os.SEEK_END)
+            if end:
+                log.seek(end - 1)
+                if log.read(1) != b"\n":
+                    # a crash cut the last play short, leave it on its own line
+                    log.write(b"\n")
+                    end += 1
+            # entries must be in time order to bisect, even if the clock isn't
+            last = self.last_entry(index)
+            if last is not None:
+                now = max(now, last[0])
+            record = { "time"   : now,
+                       "title"  : song.title,
+                       "artist" : song.artist }
+            log.write( (json.dumps(record, separators=(",", ":")) + "\n").encode() )
+            log.flush()
+            if last is None or end - last[1] >= self.every:
+                index.write( INDEX_ENTRY.pack(now, end) )
+                index.flush()
+
+    def last_entry(self, index):
+        """Read the newest (time, offset) entry of an open index, dropping
+        any partly written entry after it. None if the index is empty."""
+        size = index.seek(0, os.SEEK_END)
+        if size % INDEX_ENTRY.size:
+            size -= size % INDEX_ENTRY.size
+            index.truncate(size)
+        if not size:
+            return None
+        index.seek(size - INDEX_ENTRY.size)
+        return INDEX_ENTRY.unpack( index.read(INDEX_ENTRY.size) )
+
+    def span(self, start, end):
+        """Find the part of the log that holds every play in a range.
+
+        Returns:
+            tuple: (first, last) offsets in the log, last is None for
+                the end of the log.
+
+        """
+        try:
+            with open(self.index, 'rb') as index:
+                count = os.fstat(index.fileno()).st_size // INDEX_ENTRY.size
+                if not count:
+                    return 0, None
+                with mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ) as entries:
+                    def entry_time(i):
+                        return INDEX_ENTRY.unpack_from(entries, i * INDEX_ENTRY.size)[0]
+                    # last entry before start, which the range starts after;
+                    # plays at exactly start may follow earlier entries too
+                    lo, hi = 0, count
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        if entry_time(mid) < start:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    first = INDEX_ENTRY.unpack_from(entries, (lo - 1) * INDEX_ENTRY.size)[1] if lo else 0
+                    # first entry after end, which the range ends before
+                    hi = count
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        if entry_time(mid) <= end:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    last = INDEX_ENTRY.unpack_from(entries, lo * INDEX_ENTRY.size)[1] if lo < count else None
+                    return first, last
+        except FileNotFoundError:
+            return 0, None
+
+    def query(self, start, end=None):
+        """Look up every song played over a range of time.
+
+        Args:
+            start (float): start of the range, as a unix time.
+            end (float): end of the range. Defaults to now.
+
+        Returns:
+            list: Play for each song started in the range, oldest first.
+
+        """
+        end = time.time() if end is None else end
+        first, last = self.span(start, end)
+        plays = []
+        try:
+            with open(self.path, 'rb') as log:
+                size = os.fstat(log.fileno()).st_size
+                if first >= size:
+                    return plays
+                with mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    lines = data[first:size if last is None else last].split(b"\n")
+        except FileNotFoundError:
+            return plays
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # empty, or cut short by a crash
+                continue
+            if start <= record["time"] <= end:
+                plays.append( Play(record["time"], record["title"], record["artist"]) )
+        return plays
+
+def parse_time(text):
+    """Read a local time such as '2016-10-11 14:00', or a unix time.
+
+    Returns:
+        float: the unix time.
+
+    Raises:
+        ValueError: if text isn't in any of TIME_FORMATS.
+
+    """
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    for fmt in TIME_FORMATS:
+        try:
+            return time.mktime( time.strptime(text, fmt) )
+        except ValueError:
+            pass
+    raise ValueError("Unknown time " + repr(text) + ", expected YYYY-MM-DD HH:MM")
+
+def report(plays):
+    """Format plays one per line, with their local start time."""
+    msg = ""
+    for play in plays:
+        msg += time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(play.time)) + "  "
+        msg += play.title + (" by " + play.artist if play.artist else "") + "\n"
+    return msg or "Nothing played\n"
+
+def usage():
+    """Print Usage Statement.
+
+    Print the usage statement for running playlog.py standalone.
+
+    Returns:
+        msg (str): Usage Statement.
+
+    Example:
+
+        >>> import playlog
+        >>> msg = playlog.usage()
+        >>> msg
+        '<playlog.py usage statement>'
+    """
+    msg = "playlog.py usage:\n"
+    msg = msg + "$ python playlog.py \"<START_TIME>\" \"<END_TIME>(optional)\""
+    return msg
+
+
+if __name__ == "__main__":
+    if(len(sys.argv) > 1):
+        try:
+            start = parse_time(sys.argv[1])
+            end   = parse_time(sys.argv[2]) if len(sys.argv) > 2 else None
+        except ValueError as e:
+            print(e)
+            print(usage())
+        else:
+            print( report( PlayLog().query(start, end) ), end="" )
+    else:
+        print(usage())
@@ -0,0 +1,312 @@
+"""KTEQ-FM TEQBOT WORKER POOL.
+
+This module contains a small pool of pre-forked worker processes for running
+TeqBot tasks. Spawning a brand new python interpreter for every task means
+that every run pays for interpreter startup, importing every TeqBot module,
+and building a new TeqBot (and SlackClient) before doing any actual work.
+The workers in this pool do all of that once, then wait for task names to
+be sent to them over a pipe. Tasks still run in a separate process from the
+scheduler, so a task that crashes can't take the scheduler down with it.
+
+Example:
+
+        $ python teqbot scheduler --pool -n -s
+
+Running the scheduler with the --pool option will dispatch tasks to this
+pool instead of spawning a new process for each task.
+
+Attributes:
+    POOL_SIZE (int): default number of worker processes in the pool
+    QUEUE_SIZE (int): maximum number of tasks waiting for a free worker
+
+Todo:
+    * Look into sharing a single worker's results with the scheduler.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import time
+import collections
+import multiprocessing
+from multiprocessing.connection import wait
+from runner import TIMEOUTS
+import metrics
+import httpclient
+import state
+
+#default number of workers
+POOL_SIZE  = 2
+
+#tasks waiting on a worker past this point are dropped
+QUEUE_SIZE = 16
+
+def worker(conn, profile=None):
+    """Worker process main loop.
+
+    Imports the TeqBot modules and builds a TeqBot a single time, then
+    runs whatever tasks are sent over the pipe until the pipe is closed
+    or None is received. After each task a result tuple is sent back:
+
+        (name, latency, runtime, error, snapshot)
+
+    where latency is the time the task spent waiting to be picked up,
+    runtime is how long the task took, error is None if the task
+    succeeded, or a string describing the exception otherwise, and
+    snapshot holds every metric the worker has recorded so far.
+
+    Args:
+        conn (multiprocessing.connection.Connection): worker end of pipe.
+        profile (str): profiling mode for every task run, or None.
+
+    """
+    # only paid once per worker instead of once per task
+    import teq
+    bot   = teq.TeqBot()
+    bot.profile = profile
+    # forked from the scheduler, don't report its metrics twice, or
+    # share its kept-alive connections or state database
+    metrics.REGISTRY.reset()
+    httpclient.reset()
+    state.reset()
+    tasks = dict( (name, method) for name, method, interval in bot.scheduled_tasks() )
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if msg is None:
+            break
+        name, sent = msg
+        start   = time.time()
+        latency = start - sent
+        error   = None
+        try:
+            bot.run_method(name, tasks[name])
+        except Exception as e:
+            error = repr(e)
+        # workers exit without running atexit, so write as each task ends
+        state.flush()
+        runtime = time.time() - start
+        metrics.record_task(name, runtime, error is not None)
+        metrics.record_dispatch(name, latency)
+        conn.send( (name, latency, runtime, error, metrics.REGISTRY.snapshot()) )
+
+class WorkerPool:
+    """A bounded pool of pre-forked TeqBot worker processes.
+
+    Attributes:
+        size (int): number of worker processes kept alive.
+        timeouts (dict): seconds each task may run before its worker
+            is killed and respawned.
+        profile (str): profiling mode passed on to workers, or None.
+        workers (list): list of [process, connection, busy task, start]
+            entries.
+        pending (collections.deque): tasks waiting on a free worker.
+        stats (dict): per-task counters, keyed by task name. Each value
+            is a dict with the number of runs, errors, respawns, killed
+            and coalesced runs, along with the total and maximum
+            dispatch latency.
+        snapshots (dict): latest metrics snapshot from each worker,
+            keyed by process id. Snapshots from workers that have
+            since exited are kept, so their counts aren't lost.
+
+    """
+
+    def __init__(self, size=POOL_SIZE, timeouts=None, profile=None):
+        """WorkerPool initialization method.
+
+        Args:
+            size (int): number of worker processes. Defaults to POOL_SIZE.
+            timeouts (dict): per-task timeouts in seconds, overriding
+                the defaults in runner.TIMEOUTS.
+            profile (str): profiling.CPU or profiling.MEMORY to profile
+                every task run. Defaults to None, no profiling.
+
+        """
+        self.size    = size
+        self.timeouts = dict(TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.context = multiprocessing.get_context("fork")
+        self.workers = []
+        self.pending = collections.deque(maxlen=QUEUE_SIZE)
+        self.stats   = {}
+        self.snapshots = {}
+        self.profile = profile
+
+    def start(self):
+        """Fork all of the worker processes."""
+        while len(self.workers) < self.size:
+            self.workers.append( self.spawn_worker() )
+
+    def spawn_worker(self):
+        """Fork a single worker process.
+
+        Returns:
+            list: [process, connection, busy task, start] entry for the
+                worker.
+
+        """
+        parent, child = self.context.Pipe()
+        process = self.context.Process(target=worker, args=(child, self.profile), daemon=True)
+        process.start()
+        child.close()
+        return [process, parent, None, None]
+
+    def submit(self, name):
+        """Queue up a task to be run by the next free worker.
+
+        Only one run of a task is ever in flight at a time. If the task
+        is already running, a single rerun is queued up behind it. If
+        that rerun is already queued, the new run is coalesced into it.
+
+        Args:
+            name (str): task name, as returned by TeqBot.scheduled_tasks().
+
+        """
+        busy    = [ entry[2] for entry in self.workers ]
+        waiting = [ task[0] for task in self.pending ]
+        if name in busy or name in waiting:
+            self.count(name)["coalesced"] += 1
+        if name not in waiting:
+            self.pending.append( (name, time.time()) )
+        self.dispatch()
+
+    def dispatch(self):
+        """Hand queued tasks off to any idle workers."""
+        busy = [ entry[2] for entry in self.workers ]
+        for entry in self.workers:
+            if entry[2] is not None:
+                continue
+            for task in self.pending:
+                # keep runs of the same task from overlapping
+                if task[0] not in busy:
+                    self.pending.remove(task)
+                    entry[1].send(task)
+                    entry[2] = task[0]
+                    entry[3] = time.monotonic()
+                    busy.append(task[0])
+                    break
+
+    def poll(self, timeout=0):
+        """Collect finished task results, respawn dead workers.
+
+        Should be called regularly by the scheduler. Workers that have
+        died are replaced with a fresh worker, and the task they were
+        running at the time is recorded as an error. Workers that have
+        been running a task for longer than its timeout are killed, and
+        then replaced the same way.
+
+        Args:
+            timeout (float): seconds to wait for any results to arrive.
+
+        Returns:
+            list: list of (name, latency, runtime, error) result tuples.
+
+        """
+        results = []
+        for conn in wait(self.connections(), timeout):
+            entry = self.find(conn)
+            try:
+                result = conn.recv()
+            except EOFError:
+                # worker died mid-task, respawn below
+                continue
+            entry[2] = None
+            entry[3] = None
+            self.snapshots[entry[0].pid] = result[4]
+            result = result[:4]
+            self.record(*result)
+            results.append(result)
+
+        now = time.monotonic()
+        for i, entry in enumerate(self.workers):
+            process, conn, busy, start = entry
+            if busy is not None and now - start > self.timeouts.get(busy, max(TIMEOUTS.values())):
+                print("Task", busy, "timed out, killing worker", process.pid)
+                self.count(busy)["killed"] += 1
+                process.kill()
+                process.join()
+            if not process.is_alive():
+                print("Worker", process.pid, "died, respawning...")
+                conn.close()
+                if busy is not None:
+                    self.record(busy, 0.0, 0.0, "worker died")
+                    metrics.record_task(busy, now - start, error=True)
+                    self.count(busy)["respawns"] += 1
+                self.workers[i] = self.spawn_worker()
+
+        self.dispatch()
+        return results
+
+    def metric_snapshots(self):
+        """Return the latest metrics snapshot from every worker."""
+        return list(self.snapshots.values())
+
+    def connections(self):
+        """Return the connections of workers that are running a task."""
+        return [ entry[1] for entry in self.workers if entry[2] is not None ]
+
+    def find(self, conn):
+        """Find the worker entry that owns a connection."""
+        for entry in self.workers:
+            if entry[1] is conn:
+                return entry
+        return None
+
+    def count(self, name):
+        """Get (or create) the counters for a task."""
+        if name not in self.stats:
+            self.stats[name] = { "runs": 0, "errors": 0, "respawns": 0,
+                                 "killed": 0, "coalesced": 0,
+                                 "latency": 0.0, "max latency": 0.0 }
+        return self.stats[name]
+
+    def record(self, name, latency, runtime, error):
+        """Update the counters for a task after it finishes."""
+        stat = self.count(name)
+        stat["runs"]    += 1
+        stat["latency"] += latency
+        stat["max latency"] = max(stat["max latency"], latency)
+        if error is not None:
+            stat["errors"] += 1
+            print("Error in", name, "task:", error)
+
+    def report(self):
+        """Format the per-task dispatch latency counters.
+
+        Returns:
+            str: one line per task with run counts and dispatch latency.
+
+        """
+        msg = "Worker Pool Dispatch Latency:\n"
+        for name, stat in sorted(self.stats.items()):
+            mean = stat["latency"] / stat["runs"] if stat["runs"] else 0.0
+            msg += "    " + name + ": runs " + str(stat["runs"])
+            msg += " errors " + str(stat["errors"])
+            msg += " respawns " + str(stat["respawns"])
+            msg += " killed " + str(stat["killed"])
+            msg += " coalesced " + str(stat["coalesced"])
+            msg += " mean " + "{0:.2f}ms".format(mean * 1000)
+            msg += " max " + "{0:.2f}ms".format(stat["max latency"] * 1000) + "\n"
+        return msg
+
+    def stop(self):
+        """Ask every worker to exit, then wait for them."""
+        for process, conn, busy, start in self.workers:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process, conn, busy, start in self.workers:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self.workers = []
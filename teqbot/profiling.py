@@ -0,0 +1,239 @@
+"""KTEQ-FM TEQBOT TASK PROFILING.
+
+This module contains opt-in profiling for TeqBot tasks. When a task is run
+with profiling turned on, the task is run under cProfile, and optionally
+tracemalloc as well. Every run leaves behind two files in the profile
+directory: a .prof file that can be loaded with pstats (or snakeviz), and a
+.txt summary listing the functions that took the most time, along with the
+lines that allocated the most memory if tracemalloc was used.
+
+This makes it possible to find out what is slowing a task down on the live
+server, such as whether a slow lyric check is spending its time parsing
+with BeautifulSoup, stemming with LancasterStemmer, or listing channels,
+without attaching a debugger.
+
+Only the newest KEEP_RUNS runs are kept in the profile directory, older
+runs are removed as new ones are written.
+
+Example:
+
+        $ python teqbot task --lyric --profile
+
+        $ python teqbot scheduler -n -l --profile-memory
+
+        $ python profiling.py .teq.profile/20170301-120000-001-lyric-1234.prof
+
+Running this module from command line will print the summary of a saved
+.prof file.
+
+Attributes:
+    CPU (str): profile mode for cProfile only
+    MEMORY (str): profile mode for cProfile and tracemalloc
+    PROFILE_DIR (str): directory profiles are written to. Can be changed
+        with the TEQ_PROFILE_DIR environment variable.
+    KEEP_RUNS (int): number of profiled runs kept in the profile directory
+    TOP_N (int): number of functions (and allocations) in each summary
+    TRACE_FRAMES (int): stack frames kept by tracemalloc per allocation
+
+Todo:
+    * Look into profiling the scheduler loop itself.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+
+#profile modes
+CPU    = "cpu"
+MEMORY = "memory"
+
+PROFILE_DIR  = os.environ.get('TEQ_PROFILE_DIR', '.teq.profile')
+KEEP_RUNS    = 50
+TOP_N        = 20
+TRACE_FRAMES = 1
+
+#tracemalloc is process wide, only the first of several overlapping
+#profiled runs starts (and stops) it
+traceLock  = threading.Lock()
+traceUsers = [0]
+
+def run(name, func, mode=CPU, directory=PROFILE_DIR, top=TOP_N):
+    """Run a task under the profiler, saving its profile.
+
+    Exceptions raised by the task are passed along once its profile
+    has been saved, so failed runs get profiled too.
+
+    Note:
+        cProfile only follows the thread it was started on, so tasks
+        running at the same time on other threads don't show up in each
+        other's profiles. tracemalloc can't tell threads apart, so the
+        memory summary of overlapping runs includes both.
+
+    Args:
+        name (str): task name, used in the profile's filename.
+        func (function): the task, called with no arguments.
+        mode (str): CPU, or MEMORY to trace allocations as well.
+            Defaults to CPU.
+        directory (str): where to save the profile.
+            Defaults to PROFILE_DIR.
+        top (int): number of entries in the summary. Defaults to TOP_N.
+
+    Returns:
+        whatever func returns.
+
+    """
+    profiler = cProfile.Profile()
+    memory   = mode == MEMORY
+    if memory:
+        start_tracing()
+        before = tracemalloc.take_snapshot()
+    started = time.time()
+    clock   = time.perf_counter()
+    try:
+        profiler.enable()
+    except ValueError:
+        # another profiler is active (python 3.12+), run without
+        profiler = None
+    try:
+        return func()
+    finally:
+        if profiler:
+            profiler.disable()
+        elapsed = time.perf_counter() - clock
+        allocations = None
+        if memory:
+            allocations = (tracemalloc.take_snapshot(), before, tracemalloc.get_traced_memory()[1])
+            stop_tracing()
+        if profiler:
+            save(name, profiler, started, elapsed, allocations, directory, top)
+
+def start_tracing():
+    """Start tracemalloc, unless another profiled run already has."""
+    with traceLock:
+        if traceUsers[0] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        traceUsers[0] += 1
+
+def stop_tracing():
+    """Stop tracemalloc once the last profiled run using it is done."""
+    with traceLock:
+        traceUsers[0] -= 1
+        if traceUsers[0] == 0:
+            tracemalloc.stop()
+
+def save(name, profiler, started, elapsed, allocations, directory=PROFILE_DIR, top=TOP_N):
+    """Write a run's .prof file and summary, then rotate old runs.
+
+    Args:
+        name (str): task name.
+        profiler (cProfile.Profile): finished profiler.
+        started (float): time.time() the run started.
+        elapsed (float): how long the run took, in seconds.
+        allocations (tuple): (after, before, peak) tracemalloc snapshots
+            and peak traced memory, or None.
+        directory (str): where to save the profile.
+        top (int): number of entries in the summary.
+
+    Returns:
+        str: path of the .prof file.
+
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(started))
+    stamp += "-{0:03d}".format(int(started * 1000) % 1000)
+    base  = os.path.join(directory, stamp + "-" + name + "-" + str(os.getpid()))
+
+    profiler.dump_stats(base + ".prof")
+
+    msg = "Task " + name + " took " + "{0:.1f}ms".format(elapsed * 1000)
+    msg += ", started " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)) + "\n\n"
+    msg += summary(profiler, top)
+    if allocations:
+        msg += "\n" + memory_summary(*allocations, top=top)
+    with open(base + ".txt", 'w') as f:
+        f.write(msg)
+
+    rotate(directory)
+    return base + ".prof"
+
+def summary(stats, top=TOP_N):
+    """Format the functions with the most cumulative time.
+
+    Args:
+        stats: cProfile.Profile, or path of a saved .prof file.
+        top (int): number of functions listed.
+
+    Returns:
+        str: pstats listing of the top functions.
+
+    """
+    out = io.StringIO()
+    pstats.Stats(stats, stream=out).strip_dirs().sort_stats("cumulative").print_stats(top)
+    return out.getvalue().lstrip("\n")
+
+def memory_summary(after, before, peak, top=TOP_N):
+    """Format the lines that allocated the most memory during a run.
+
+    Args:
+        after (tracemalloc.Snapshot): snapshot taken after the run.
+        before (tracemalloc.Snapshot): snapshot taken before the run.
+        peak (int): peak traced memory, in bytes.
+        top (int): number of lines listed.
+
+    Returns:
+        str: one line per allocation site, largest first.
+
+    """
+    msg = "Peak traced memory: " + "{0:.1f}KiB".format(peak / 1024.0) + "\n"
+    msg += "Top allocations:\n"
+    for stat in after.compare_to(before, "lineno")[:top]:
+        msg += "    " + str(stat) + "\n"
+    return msg
+
+def rotate(directory=PROFILE_DIR, keep=KEEP_RUNS):
+    """Remove all but the newest runs from the profile directory."""
+    runs = sorted( f[:-len(".prof")] for f in os.listdir(directory) if f.endswith(".prof") )
+    for base in runs[:-keep] if keep else runs:
+        for ext in (".prof", ".txt"):
+            path = os.path.join(directory, base + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+def usage():
+    """Print Usage Statement.
+
+    Print the usage statement for running profiling.py standalone.
+
+    Returns:
+        msg (str): Usage Statement.
+
+    Example:
+
+        >>> import profiling
+        >>> msg = profiling.usage()
+        >>> msg
+        '<profiling.py usage statement>'
+    """
+    msg = "profiling.py usage:\n"
+    msg = msg + "$ python profiling.py \"<PROF_FILE>\" \"<TOP_N>(optional)\""
+    return msg
+
+
+if __name__ == "__main__":
+    if(len(sys.argv) > 1):
+        top = int(sys.argv[2]) if len(sys.argv) > 2 else TOP_N
+        print(summary(sys.argv[1], top))
+    else:
+        print(usage())
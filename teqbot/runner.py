@@ -0,0 +1,223 @@
+"""KTEQ-FM TEQBOT TASK RUNNER.
+
+This module contains the TaskRunner class, which keeps track of every task
+process spawned by the TeqBot scheduler. Previously each task was spawned
+with subprocess.Popen and forgotten about, meaning a task that hung (such as
+a lyric check stuck waiting on Genius) would keep piling up new copies of
+itself every time it came due, and finished processes were never reaped.
+
+The TaskRunner only ever lets one copy of a task run at a time. If a task
+comes due while its last run is still going, the new run is either skipped
+outright, or coalesced into a single run that starts as soon as the current
+one finishes. A cap can be placed on the total number of task processes
+running at once, and any task running longer than its timeout is killed.
+
+Each spawned task writes its metrics (see the metrics module) to a file
+when it exits, which is merged into the scheduler's metrics when the task
+is reaped. Tasks that never got the chance to write their metrics, such as
+ones that were killed, are recorded as failed runs by the runner instead.
+Among a task's metrics is how long it took to start after being spawned
+(dispatch latency), which the runner also keeps per task for its report.
+
+Example:
+
+        >>> import runner
+        >>> r = runner.TaskRunner()
+        >>> r.run("status", "python3 teqbot task --status")
+        >>> r.reap()
+        >>> print(r.report())
+
+Attributes:
+    SKIP (str): policy for dropping runs that overlap a previous run.
+    COALESCE (str): policy for merging overlapping runs into one rerun.
+    MAX_RUNNING (int): default cap on task processes running at once.
+    KILL_GRACE (int): seconds between terminating and killing a task.
+    TIMEOUTS (dict): default timeout in seconds for each task.
+
+Todo:
+    * Look into reporting why a task had to be killed.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import os
+import time
+import shlex
+import tempfile
+import subprocess
+import metrics
+
+#overlap policies
+SKIP     = "skip"
+COALESCE = "coalesce"
+
+#no more than this many task processes at once
+MAX_RUNNING = 4
+
+#seconds to wait after SIGTERM before sending SIGKILL
+KILL_GRACE = 5
+
+#seconds each task is allowed to run before it is killed
+TIMEOUTS = { "nowplaying" : 60,
+             "status"     : 60,
+             "lyric"      : 120,
+             "swear"      : 30,
+             "update"     : 120 }
+
+class TaskRunner:
+    """Single-flight runner for task processes.
+
+    Attributes:
+        limit (int): maximum number of task processes running at once.
+        policy (str): SKIP or COALESCE, what to do with overlapping runs.
+        timeouts (dict): seconds each task may run before being killed.
+        running (dict): task name to [process, start time, kill time,
+            metrics file].
+        queued (dict): task name to command for coalesced reruns.
+        stats (dict): counters for started, skipped, coalesced, killed
+            and reaped runs.
+        latency (dict): task name to [runs, total, max] dispatch latency,
+            in seconds.
+
+    """
+
+    def __init__(self, limit=MAX_RUNNING, policy=COALESCE, timeouts=None):
+        """TaskRunner initialization method.
+
+        Args:
+            limit (int): cap on running task processes.
+                Defaults to MAX_RUNNING.
+            policy (str): SKIP or COALESCE. Defaults to COALESCE.
+            timeouts (dict): per-task timeouts in seconds, overriding
+                the defaults in TIMEOUTS.
+
+        """
+        self.limit    = limit
+        self.policy   = policy
+        self.timeouts = dict(TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.running  = {}
+        self.queued   = {}
+        self.stats    = { "started": 0, "skipped": 0, "coalesced": 0,
+                          "killed": 0, "reaped": 0 }
+        self.latency  = {}
+
+    def run(self, name, command):
+        """Run a task, unless a previous run of it is still going.
+
+        Args:
+            name (str): task name, used for single-flight tracking.
+            command (str): terminal command for the task.
+
+        Returns:
+            bool: True if the task was started right away.
+
+        """
+        self.reap()
+        if name in self.running or len(self.running) >= self.limit:
+            if self.policy == COALESCE:
+                self.stats["coalesced"] += 1
+                self.queued[name] = command
+            else:
+                self.stats["skipped"] += 1
+            return False
+        self.start(name, command)
+        return True
+
+    def start(self, name, command):
+        """Spawn a task as a new process."""
+        # split args into separate entries in a list
+        args = shlex.split(command)
+        # somewhere for the task to leave its metrics
+        fd, snapshot = tempfile.mkstemp(prefix="teq-metrics-", suffix=".json")
+        os.close(fd)
+        # let the task report how long it took to get going
+        env  = dict(os.environ, TEQ_DISPATCH_TIME=str(time.time()), TEQ_METRICS_FILE=snapshot)
+        # spawn new process
+        self.running[name] = [subprocess.Popen(args, env=env), time.monotonic(), None, snapshot]
+        self.stats["started"] += 1
+
+    def reap(self):
+        """Reap finished tasks, kill overdue ones, start queued reruns.
+
+        Should be called regularly by the scheduler, so that finished
+        task processes don't linger as zombies.
+
+        """
+        now = time.monotonic()
+        for name, entry in list(self.running.items()):
+            process, start, killed, snapshot = entry
+            if process.poll() is not None:
+                # finished, and now reaped
+                del self.running[name]
+                self.stats["reaped"] += 1
+                self.collect(name, now - start, snapshot)
+            elif killed is not None:
+                if now - killed > KILL_GRACE:
+                    process.kill()
+            elif now - start > self.timeouts.get(name, max(TIMEOUTS.values())):
+                print("Task", name, "timed out, killing process", process.pid)
+                process.terminate()
+                entry[2] = now
+                self.stats["killed"] += 1
+
+        for name in list(self.queued):
+            if name not in self.running and len(self.running) < self.limit:
+                self.start(name, self.queued.pop(name))
+
+    def collect(self, name, runtime, snapshot):
+        """Merge a finished task's metrics into the scheduler's."""
+        data = metrics.read_snapshot(snapshot)
+        if data is None:
+            # task died before it could say how it went
+            metrics.record_task(name, runtime, error=True)
+        else:
+            metrics.REGISTRY.merge(data)
+            for key, label, value, buckets, total, count in data["histograms"]:
+                if key == "task_dispatch_seconds" and count:
+                    stat = self.latency.setdefault(value, [0, 0.0, 0.0])
+                    stat[0] += count
+                    stat[1] += total
+                    stat[2]  = max(stat[2], total / count)
+
+    def report(self):
+        """Format the runner's backpressure counters.
+
+        Returns:
+            str: counts of started, skipped, coalesced, killed and
+                reaped task runs, then one line per task with its
+                dispatch latency.
+
+        """
+        msg = "Task Runner:"
+        for key in ("started", "skipped", "coalesced", "killed", "reaped"):
+            msg += " " + key + " " + str(self.stats[key])
+        msg += " running " + str(len(self.running))
+        if self.latency:
+            msg += "\nTask Dispatch Latency:"
+        for name, (runs, total, most) in sorted(self.latency.items()):
+            msg += "\n    " + name + ": runs " + str(runs)
+            msg += " mean " + "{0:.2f}ms".format(total / runs * 1000)
+            msg += " max " + "{0:.2f}ms".format(most * 1000)
+        return msg
+
+    def stop(self):
+        """Terminate every running task and reap it."""
+        self.queued = {}
+        for name, (process, start, killed, snapshot) in self.running.items():
+            if process.poll() is None:
+                process.terminate()
+        for name, (process, start, killed, snapshot) in self.running.items():
+            try:
+                process.wait(KILL_GRACE)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            self.collect(name, time.monotonic() - start, snapshot)
+        self.running = {}
@@ -0,0 +1,174 @@
+"""KTEQ-FM TEQBOT SCHEDULE.
+
+This module contains the Schedule class, a small deadline based scheduler
+used by TeqBot for triggering tasks. Every task is kept in a heap keyed on
+the time (from time.monotonic()) that the task is next due. Rather than
+waking up every second and counting ticks, the scheduler sleeps until the
+earliest deadline in the heap, runs every task that is due, and pushes each
+one back onto the heap one interval after the deadline it was due at. This
+keeps tasks from drifting by however long the loop itself takes to run, and
+lets tasks run on any interval, down to the millisecond. A task's callback
+can also return a number of milliseconds to wait before its next run, for
+tasks whose interval changes over time.
+
+Every time a task runs, the scheduler records how late it started compared
+to its deadline (scheduling lag). Deadlines that were missed entirely, such
+as when the machine is suspended, are skipped rather than run back to back.
+A task that raises an error is reported and counted, and runs again at its
+next deadline, without stopping the other tasks.
+
+Example:
+
+        >>> import schedule
+        >>> s = schedule.Schedule()
+        >>> s.add("hello", 1500, lambda: print("hello"))
+        >>> s.run()
+
+Todo:
+    * Allow tasks to be removed from a running schedule.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import time
+import heapq
+
+class Schedule:
+    """Deadline heap scheduler for periodic tasks.
+
+    Attributes:
+        heap (list): heap of [deadline, sequence, name] entries.
+        tasks (dict): task name to [interval, callback] mapping. Intervals
+            are stored in seconds.
+        stats (dict): per-task scheduling lag and error counters, keyed by
+            task name.
+        running (bool): False once Schedule.stop() has been called.
+
+    """
+
+    def __init__(self, clock=time.monotonic):
+        """Schedule initialization method.
+
+        Args:
+            clock (function): monotonic clock returning seconds.
+                Defaults to time.monotonic.
+
+        """
+        self.clock    = clock
+        self.heap     = []
+        self.tasks    = {}
+        self.stats    = {}
+        self.sequence = 0
+        self.running  = False
+
+    def add(self, name, interval, callback, delay=0):
+        """Add a periodic task to the schedule.
+
+        Args:
+            name (str): unique name for the task.
+            interval (int): milliseconds between runs of the task.
+            callback (function): called with no arguments when task is due.
+                If it returns a number, that many milliseconds are waited
+                before the next run instead of the usual interval.
+            delay (int): milliseconds to wait before the first run.
+                Defaults to 0, meaning the task runs right away.
+
+        """
+        self.tasks[name] = [interval / 1000.0, callback]
+        self.stats[name] = { "runs": 0, "missed": 0, "errors": 0,
+                             "lag": 0.0, "max lag": 0.0 }
+        self.push(self.clock() + delay / 1000.0, name)
+
+    def push(self, deadline, name):
+        """Push a task deadline onto the heap."""
+        self.sequence += 1
+        heapq.heappush(self.heap, [deadline, self.sequence, name])
+
+    def next_deadline(self):
+        """Return the earliest deadline in the schedule, or None."""
+        if self.heap:
+            return self.heap[0][0]
+        return None
+
+    def run_due(self):
+        """Run every task whose deadline has passed.
+
+        Returns:
+            int: number of tasks that were run.
+
+        """
+        count = 0
+        while self.running and self.heap and self.heap[0][0] <= self.clock():
+            deadline, seq, name = heapq.heappop(self.heap)
+            if name not in self.tasks:
+                continue
+            interval, callback = self.tasks[name]
+
+            now  = self.clock()
+            lag  = now - deadline
+            stat = self.stats[name]
+            stat["runs"] += 1
+            stat["lag"]  += lag
+            stat["max lag"] = max(stat["max lag"], lag)
+
+            # next deadline is based on this deadline, not on now,
+            # skipping over any deadlines that were missed entirely
+            try:
+                result = callback()
+                if result is not None:
+                    interval = result / 1000.0
+            except Exception as e:
+                stat["errors"] += 1
+                print("Error in", name, "task:", repr(e))
+            missed = int(lag // interval) if interval > 0 else 0
+            stat["missed"] += missed
+            self.push(deadline + interval * (missed + 1), name)
+            count += 1
+        return count
+
+    def run(self, wait=time.sleep):
+        """Run tasks as they come due until Schedule.stop() is called.
+
+        Args:
+            wait (function): called with the number of seconds until the
+                next deadline. Defaults to time.sleep, but anything that
+                blocks for at most that long will do, such as
+                pool.WorkerPool.poll.
+
+        """
+        self.running = True
+        while self.running:
+            self.run_due()
+            deadline = self.next_deadline()
+            if not self.running or deadline is None:
+                break
+            delay = deadline - self.clock()
+            if delay > 0:
+                wait(delay)
+
+    def stop(self):
+        """Stop the schedule after the current task finishes."""
+        self.running = False
+
+    def report(self):
+        """Format the per-task scheduling lag counters.
+
+        Returns:
+            str: one line per task with run and error counts and
+                scheduling lag.
+
+        """
+        msg = "Scheduling Lag:\n"
+        for name, stat in sorted(self.stats.items()):
+            mean = stat["lag"] / stat["runs"] if stat["runs"] else 0.0
+            msg += "    " + name + ": runs " + str(stat["runs"])
+            msg += " missed " + str(stat["missed"])
+            msg += " errors " + str(stat["errors"])
+            msg += " mean " + "{0:.2f}ms".format(mean * 1000)
+            msg += " max " + "{0:.2f}ms".format(stat["max lag"] * 1000) + "\n"
+        return msg
@@ -44,7 +44,7 @@ Todo:
 
 import os
 import sys
-from slackclient import SlackClient
+import metrics
 
 def get_channels(client):
     """Return a full list of channels, with all accompanying info
@@ -157,6 +157,7 @@ def get_channel_info(client, channel_id):
         return channel_info['channel']
     return None
 
+@metrics.timed("slack.send_message", ok=lambda result: result[0])
 def send_message(client, channel_id, message, username="TEQ-BOT", emoji=":robot_face:"):
     """Send a slack message to a specific channel.
 
@@ -237,6 +238,7 @@ def usage():
 
 if __name__ == "__main__":
     if(len(sys.argv) > 1):
+        from slackclient import SlackClient
         client = SlackClient( sys.argv[1] )
         channel_list = get_channels(client)
         if channel_list:
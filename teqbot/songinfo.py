@@ -0,0 +1,185 @@
+"""KTEQ-FM TEQBOT SONG METADATA.
+
+This module contains SongMetadata, the song information TeqBot passes
+around once a song has been read from the stream (or the song logger).
+Song metadata arrives as a single string, such as
+
+    #NowPlaying: Beat Market __by__ Sun Machine
+
+where the song logger puts "__by__" between the song name and the artist
+so that the two can be told apart. Rather than every consumer splitting
+that string up again on every check, it is parsed once into a SongMetadata,
+which already holds what each consumer needs: the text posted to slack, the
+fields sent to TuneIn, and the song searched for on Genius.
+
+Parsing is cached, so the same string seen on every check is only parsed
+the first time.
+
+Two songs are the same song if they only differ in case or whitespace, so a
+DJ fixing the capitalization of a song's name doesn't announce it twice.
+
+Example:
+
+        >>> import songinfo
+        >>> song = songinfo.parse("#NowPlaying: Beat Market __by__ Sun Machine")
+        >>> song.title, song.artist
+        ('Beat Market', 'Sun Machine')
+        >>> song.slack
+        '#NowPlaying: Beat Market by Sun Machine'
+        >>> song == songinfo.parse("#NowPlaying: beat market  __by__ SUN MACHINE")
+        True
+
+        $ python songinfo.py "#NowPlaying: Beat Market __by__ Sun Machine"
+
+Running this module from command line will parse the given metadata and
+print each of its renderings.
+
+Attributes:
+    PREFIX (str): tag in front of song metadata read from the stream
+    SEPARATOR (str): separator the song logger puts between song name
+        and artist
+    CACHE_SIZE (int): number of parsed songs kept
+
+Todo:
+    * Strip featured artists from the Genius query.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import sys
+import functools
+
+PREFIX = "#NowPlaying: "
+
+SEPARATOR = "__by__"
+
+CACHE_SIZE = 64
+
+class SongMetadata:
+    """A song's name and artist, parsed once.
+
+    SongMetadata can't be changed once made, and can be used as a dict
+    key or set member.
+
+    Attributes:
+        title (str): song name, with runs of whitespace collapsed.
+        artist (str): artist name, or '' if unknown.
+        key (tuple): case folded (title, artist), for comparing songs.
+        text (str): the metadata string, as the song logger writes it.
+        slack (str): text posted to #nowplaying.
+        tunein (tuple): (name, value) query parameters for TuneIn.
+        genius (str): song name searched for on Genius.
+
+    """
+
+    __slots__ = ("title", "artist", "key", "text", "slack", "tunein", "genius")
+
+    def __init__(self, title, artist=""):
+        """SongMetadata initialization method.
+
+        Args:
+            title (str): song name.
+            artist (str): artist name, if known.
+
+        """
+        title  = " ".join( (title or "").split() )
+        artist = " ".join( (artist or "").split() )
+        fields = { "title"  : title,
+                   "artist" : artist,
+                   "key"    : (title.casefold(), artist.casefold()),
+                   "text"   : PREFIX + title + (" " + SEPARATOR + " " + artist if artist else ""),
+                   "slack"  : PREFIX + title + (" by " + artist if artist else ""),
+                   "tunein" : (("title", title), ("artist", artist)) if artist else (("title", title),),
+                   "genius" : title }
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SongMetadata can't be changed")
+
+    def __delattr__(self, name):
+        raise AttributeError("SongMetadata can't be changed")
+
+    def __eq__(self, other):
+        # compared by key, so a reloaded songinfo module still matches
+        key = getattr(other, "key", None)
+        if not isinstance(key, tuple):
+            return NotImplemented
+        return self.key == key
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __bool__(self):
+        return bool(self.title or self.artist)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return "SongMetadata(" + repr(self.title) + ", " + repr(self.artist) + ")"
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse(metadata):
+    """Parse a song metadata string.
+
+    The '#NowPlaying: ' tag is dropped if present, and the rest is split
+    at the first SEPARATOR into song name and artist.
+
+    Args:
+        metadata (str): Song metadata string, such as
+            '#NowPlaying: Beat Market __by__ Sun Machine'.
+
+    Returns:
+        SongMetadata: the parsed song. The same object is returned for
+            the same string, while it stays in the cache.
+
+    """
+    metadata = metadata or ""
+    if metadata.startswith(PREFIX.rstrip()):
+        metadata = metadata[len(PREFIX.rstrip()):].lstrip(": ")
+    title, _, artist = metadata.partition(SEPARATOR)
+    return SongMetadata(title, artist)
+
+def as_song(metadata):
+    """Get a SongMetadata, parsing metadata first if it is a string."""
+    if isinstance(getattr(metadata, "key", None), tuple):
+        return metadata
+    return parse(metadata)
+
+def usage():
+    """Print Usage Statement.
+
+    Print the usage statement for running songinfo.py standalone.
+
+    Returns:
+        msg (str): Usage Statement.
+
+    Example:
+
+        >>> import songinfo
+        >>> msg = songinfo.usage()
+        >>> msg
+        '<songinfo.py usage statement>'
+    """
+    msg = "songinfo.py usage:\n"
+    msg = msg + "$ python songinfo.py \"<SONG_METADATA>\""
+    return msg
+
+
+if __name__ == "__main__":
+    if(len(sys.argv) > 1):
+        song = parse(sys.argv[1])
+        for name in SongMetadata.__slots__:
+            print(name + ":", repr(getattr(song, name)))
+    else:
+        print(usage())
@@ -0,0 +1,156 @@
+"""KTEQ-FM TEQBOT STARTUP BENCHMARK.
+
+This module measures how long it takes a fresh python interpreter to import
+everything a TeqBot command needs. Every task spawned by the scheduler pays
+this cost before doing any real work, so it is worth keeping an eye on.
+
+Each command's imports are timed in a brand new interpreter using python's
+-X importtime option, which reports the time taken to import every single
+module. The slowest modules are listed for each command, along with the
+total, which is checked against a startup budget.
+
+Example:
+
+        $ python teqbot bench-startup
+
+        $ python startup.py 150
+
+Running this module from command line will benchmark every command, using
+the given budget (in milliseconds) if one is provided.
+
+Attributes:
+    STARTUP_BUDGET (int): allowed import time per command, in milliseconds
+    TOP_MODULES (int): number of slowest modules listed per command
+    COMMAND_IMPORTS (dict): modules imported by each TeqBot command
+
+Todo:
+    * Track startup times between runs to catch regressions over time.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import os
+import sys
+import subprocess
+
+STARTUP_BUDGET = 250
+TOP_MODULES    = 5
+
+#what each command ends up importing, see __main__.py and teq.py
+COMMAND_IMPORTS = { "kill"             : ["control"],
+                    "scheduler"        : ["teq", "runner", "state"],
+                    "task --nowplaying": ["teq", "state", "songinfo", "playlog", "stream", "tunein"],
+                    "task --status"    : ["teq", "state", "stream"],
+                    "task --lyric"     : ["teq", "state", "genius"],
+                    "task --swear"     : ["teq"],
+                    "task --update"    : ["teq"] }
+
+def import_times(modules):
+    """Import modules in a fresh interpreter, timing each import.
+
+    Args:
+        modules (list): names of the modules to import.
+
+    Returns:
+        (tuple): tuple containing:
+
+            total (float): total import time, in milliseconds.
+            times (list): (cumulative ms, self ms, module name) tuples,
+                slowest first.
+
+    Raises:
+        RuntimeError: if the modules could not be imported.
+    """
+    here  = os.path.dirname(os.path.abspath(__file__))
+    check = subprocess.run( [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+                            cwd=here, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True )
+    if check.returncode != 0:
+        raise RuntimeError(check.stderr.strip().splitlines()[-1])
+
+    # lines look like: "import time:   self [us] |  cumulative | imported package"
+    times = []
+    total = 0.0
+    for line in check.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times.append( (int(cumulative) / 1000.0, int(own) / 1000.0, name.rstrip()) )
+        if not name.startswith("  "):
+            # only top level imports count towards the total
+            total += int(cumulative) / 1000.0
+    times.sort(reverse=True)
+    return total, times
+
+def bench_startup(budget=STARTUP_BUDGET):
+    """Benchmark the import time of every TeqBot command.
+
+    Args:
+        budget (int): allowed import time per command, in milliseconds.
+            Defaults to STARTUP_BUDGET.
+
+    Returns:
+        (tuple): tuple containing:
+
+            ok (bool): True if every command is within the budget.
+            msg (str): Report listing each command's import time, and
+                its slowest modules.
+
+    Example:
+
+        >>> import startup
+        >>> ok, msg = startup.bench_startup()
+        >>> print(msg)
+        <Prints the import time report for every command>
+    """
+    ok  = True
+    msg = "Startup import time (budget " + str(budget) + "ms):\n"
+    for command, modules in sorted(COMMAND_IMPORTS.items()):
+        try:
+            total, times = import_times(modules)
+        except RuntimeError as e:
+            ok = False
+            msg += "    " + command + ": FAILED (" + str(e) + ")\n"
+            continue
+        verdict = "ok" if total <= budget else "OVER BUDGET"
+        if total > budget:
+            ok = False
+        msg += "    " + command + ": " + "{0:.1f}ms".format(total) + " " + verdict + "\n"
+        for cumulative, own, name in times[:TOP_MODULES]:
+            msg += "        " + "{0:8.1f}ms".format(cumulative)
+            msg += " (self " + "{0:.1f}ms".format(own) + ") " + name.strip() + "\n"
+    return ok, msg
+
+def usage():
+    """Print Usage Statement.
+
+    Print the usage statement for running startup.py standalone.
+
+    Returns:
+        msg (str): Usage Statement.
+
+    Example:
+
+        >>> import startup
+        >>> msg = startup.usage()
+        >>> msg
+        '<startup.py usage statement>'
+    """
+    msg = "startup.py usage:\n"
+    msg = msg + "$ python startup.py \"<BUDGET_MS>(optional)\""
+    return msg
+
+
+if __name__ == "__main__":
+    if(len(sys.argv) > 1 and not sys.argv[1].isdigit()):
+        print(usage())
+        sys.exit()
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else STARTUP_BUDGET
+    ok, msg = bench_startup(budget)
+    print(msg)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,332 @@
+"""KTEQ-FM TEQBOT STATE STORE.
+
+This module contains the state TeqBot keeps between task runs, such as the
+last song played, the last song checked for lyrics, whether the stream is
+down, and the health of each mount. It replaces the .teq.song, .teq.lyric,
+.teq.stat and .teq.mounts files, which were each opened (and rewritten) in
+whatever directory TeqBot happened to be running in, every time they were
+read or written.
+
+State is read into a dict in memory the first time it is needed, and read
+from there afterwards. Values that change are written back to a single
+SQLite database in WAL mode, a moment later and in one transaction, so a
+task that changes several values only writes once, and a value set to what
+it already was is never written at all. SQLite keeps the database intact if
+TeqBot crashes partway through a write, and a database that is damaged some
+other way is set aside and started over.
+
+Tasks often run in their own processes, so before a value is read, the
+store checks whether another process has changed the database since it was
+last read (which SQLite tracks in shared memory, without reading the file).
+
+Example:
+
+        >>> import state
+        >>> store = state.shared()
+        >>> store.set("song", "#NowPlaying: Seven Nation Army by The White Stripes")
+        >>> store.get("song")
+        '#NowPlaying: Seven Nation Army by The White Stripes'
+
+        $ python state.py
+
+Running this module from command line will print everything in the store.
+
+Attributes:
+    STATE_PATH (str): path of the state database. Can be changed with the
+        TEQ_STATE environment variable.
+    FLUSH_DELAY (float): seconds changed values wait before being written,
+        so that changes made close together are written together.
+    BUSY_TIMEOUT (int): seconds to wait on another process writing to the
+        database at the same time.
+    STORE (StateStore): store shared by this process, or None until it is
+        first used.
+
+Todo:
+    * Move the listener history into the store as well.
+
+.. _TeqBot GitHub Repository:
+   https://github.com/kteq-fm/kteq-teqbot
+
+.. _KTEQ-FM Website:
+   http://www.kteq.org/
+
+"""
+
+import os
+import sys
+import json
+import atexit
+import threading
+
+#resolved now, so the store doesn't move if the working directory does
+STATE_PATH = os.path.abspath( os.environ.get('TEQ_STATE', '.teq.db') )
+
+FLUSH_DELAY = 1.0
+
+BUSY_TIMEOUT = 5
+
+class StateStore:
+    """Key/value store, kept in memory and written behind to SQLite.
+
+    Values can be anything json can encode. Every value is kept in memory
+    encoded, so values handed out by StateStore.get() are always copies,
+    and a changed value can be told apart from an unchanged one by its
+    encoding alone.
+
+    Attributes:
+        path (str): path of the database.
+        delay (float): seconds changes wait before being written.
+        data (dict): key to json encoded value.
+        dirty (set): keys changed (or deleted) since the last write.
+        version (int): SQLite data_version when data was last read,
+            or None before the first read.
+
+    """
+
+    def __init__(self, path=STATE_PATH, delay=FLUSH_DELAY):
+        """StateStore initialization method.
+
+        Args:
+            path (str): path of the database. Defaults to STATE_PATH.
+            delay (float): seconds to hold changes before writing them.
+                Defaults to FLUSH_DELAY.
+
+        """
+        self.path    = path
+        self.delay   = delay
+        self.lock    = threading.RLock()
+        self.data    = {}
+        self.dirty   = set()
+        self.version = None
+        self.conn    = None
+        self.timer   = None
+
+    def connect(self):
+        """Open the database, if it isn't already.
+
+        Returns:
+            sqlite3.Connection: connection to the database.
+
+        """
+        if self.conn is not None:
+            return self.conn
+        import sqlite3
+        try:
+            self.conn = self.open()
+        except sqlite3.OperationalError:
+            # locked, or unable to open or read the file, which doesn't
+            # make it damaged. Tried again on the next read or write.
+            self.disconnect()
+            raise
+        except sqlite3.DatabaseError as e:
+            # not a database (or a damaged one), keep it for a look later
+            print("State database unreadable, starting over:", repr(e))
+            self.disconnect()
+            try:
+                os.replace(self.path, self.path + ".corrupt")
+                for extra in ("-wal", "-shm"):
+                    if os.path.exists(self.path + extra):
+                        os.remove(self.path + extra)
+            except OSError as e:
+                raise sqlite3.OperationalError("unable to set aside damaged database: " + repr(e))
+            self.conn = self.open()
+        return self.conn
+
+    def disconnect(self):
+        """Close the database, if it was opened, without writing anything."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def open(self):
+        """Open and check the database, creating it if needed."""
+        import sqlite3
+        self.conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # with WAL, a crash can't corrupt the database at this level
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        if self.conn.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+            raise sqlite3.DatabaseError("quick_check failed")
+        return self.conn
+
+    def refresh(self):
+        """Read the database again if another process has changed it.
+
+        Changes this process hasn't written yet are kept, as they are
+        newer than anything in the database.
+
+        """
+        import sqlite3
+        with self.lock:
+            try:
+                conn    = self.connect()
+                version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if version == self.version:
+                    return
+                data = dict( conn.execute("SELECT key, value FROM state") )
+            except sqlite3.Error as e:
+                print("Unable to read state:", repr(e))
+                return
+            for key in self.dirty:
+                if key in self.data:
+                    data[key] = self.data[key]
+                else:
+                    data.pop(key, None)
+            self.data    = data
+            self.version = version
+
+    def get(self, key, default=None):
+        """Read a value.
+
+        Args:
+            key (str): name of the value, such as "song".
+            default: returned if the value isn't set.
+
+        Returns:
+            a copy of the value, or default.
+
+        """
+        with self.lock:
+            self.refresh()
+            value = self.data.get(key)
+        return default if value is None else json.loads(value)
+
+    def set(self, key, value):
+        """Change a value, writing it out shortly after.
+
+        Nothing is written if the value hasn't changed.
+
+        Args:
+            key (str): name of the value, such as "song".
+            value: anything json can encode.
+
+        """
+        encoded = json.dumps(value, sort_keys=True)
+        with self.lock:
+            self.refresh()
+            if self.data.get(key) == encoded:
+                return
+            self.data[key] = encoded
+            self.changed(key)
+
+    def delete(self, key):
+        """Remove a value, if it is set."""
+        with self.lock:
+            self.refresh()
+            if key not in self.data:
+                return
+            del self.data[key]
+            self.changed(key)
+
+    def changed(self, key):
+        """Mark a key to be written, and make sure a write is coming."""
+        self.dirty.add(key)
+        if self.timer is None:
+            self.timer = threading.Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        """Write every changed value now, in a single transaction.
+
+        If the write fails (such as another process holding the database
+        for longer than BUSY_TIMEOUT), the changes are kept for the next
+        flush.
+
+        """
+        import sqlite3
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+            try:
+                conn = self.connect()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for key in self.dirty:
+                        if key in self.data:
+                            conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                                         (key, self.data[key]))
+                        else:
+                            conn.execute("DELETE FROM state WHERE key = ?", (key,))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                print("Unable to write state:", repr(e))
+                return
+            self.dirty.clear()
+
+    def close(self):
+        """Write any changes, then close the database."""
+        with self.lock:
+            self.flush()
+            self.disconnect()
+            self.version = None
+
+#store shared by this process
+STORE = None
+storeLock = threading.Lock()
+
+def shared():
+    """Get the StateStore shared by this process, starting it if needed.
+
+    Changes still waiting to be written when the process exits are
+    written on the way out.
+
+    """
+    global STORE
+    if STORE is None:
+        with storeLock:
+            if STORE is None:
+                STORE = StateStore()
+                atexit.register(STORE.close)
+    return STORE
+
+def flush():
+    """Write the shared store's changes now, if it has been used."""
+    if STORE is not None:
+        STORE.flush()
+
+def reset():
+    """Forget the shared store without writing or closing it, such as
+    after forking from a process that already has it open. The parent
+    writes its own changes, and SQLite connections can't be shared with
+    a forked child."""
+    global STORE, storeLock
+    STORE     = None
+    storeLock = threading.Lock()
+
+def usage():
+    """Print Usage Statement.
+
+    Print the usage statement for running state.py standalone.
+
+    Returns:
+        msg (str): Usage Statement.
+
+    Example:
+
+        >>> import state
+        >>> msg = state.usage()
+        >>> msg
+        '<state.py usage statement>'
+    """
+    msg = "state.py usage:\n"
+    msg = msg + "$ python state.py \"<STATE_PATH>(optional)\""
+    return msg
+
+
+if __name__ == "__main__":
+    if(len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help")):
+        print(usage())
+    else:
+        store = StateStore( os.path.abspath(sys.argv[1]) if len(sys.argv) > 1 else STATE_PATH )
+        store.refresh()
+        for key in sorted(store.data):
+            print(key + ":", store.data[key])
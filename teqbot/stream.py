@@ -6,19 +6,94 @@ HTTP requests to the IceCast server, then analyzing the html retrieved from
 the site to determine stream status, and report what song is currently being 
 played on the station.
 
+The status of each mount on the server is read through a status backend.
+Newer IceCast servers publish their status as JSON (status-json.xsl), and
+the admin interface publishes it as XML (admin/stats), both of which are
+much cheaper to read than scraping the status page html. Backends are
+tried in order until one works, with the html scraper as the fallback.
+
+A single call to stream.snapshot() reads the stream's status, the current
+song and every mount's listener counts all at once. Requests are made through
+the httpclient module, so the connection to the IceCast server is kept alive
+between checks. stream.probe() checks whether the stream is up within a
+bounded time, starting extra (hedged) checks alongside a slow one rather
+than waiting on each in turn.
+
+Every mount (encoding) is also tracked on its own, across the main server
+and any relays: stream.probe_servers() checks every server at once, and
+stream.mount_health() works out which mounts are up, which have gone
+missing, and whether they all agree on the song playing.
+
+A mount can be listed as up while its encoder is sending nothing, or only a
+trickle. stream.throughput() listens to a mount for a few seconds, counting
+the MP3 frames that arrive (from their headers alone, without decoding any
+audio), and flags the mount as stalled if less audio arrives than plays.
+
+Rather than checking for a new song on a timer, an IcyListener can listen to
+a mount the way a listener's player does, asking for the song title to be
+sent along with the audio (ICY metadata). The title arrives the moment it
+changes, and the audio itself is skipped over without being kept.
+
 Example:
 
         $ python stream.py "<YOUR_STREAM_URL>"
 
+        $ python stream.py "<YOUR_STREAM_URL>" --listen
+
 Running this module from command line, if provided with a valid IceCast stream
 url, will report whether the stream is currently online or not. If the stream 
-is online, the current song will also be reported.
+is online, the current song will also be reported. With --listen, each new
+song is printed as it starts, until interrupted.
 
 Attributes:
     NO_DATA (str): Error Code. No data retrieved from IceCast Server.
     URL_ERROR (str): Error Code. HTTP timeout, or bad internet connection.
+    CONNECT_REFUSED (str): Error Code. Server refused the connection.
+    STALLED (str): Error Code. Mounts are up, but audio isn't arriving
+        as fast as it plays.
     TIMEOUT_VALUE(int): Amount of time in seconds HTTP request will wait 
-        before returning a urllib.error.URLError.
+        before giving up on the server.
+    STATUS_BACKENDS (list): names of the status backends to try, in order.
+        Can be changed with the ICECAST_BACKENDS environment variable,
+        such as ICECAST_BACKENDS=html for servers without status-json.xsl.
+    ADMIN_USER (str): IceCast admin username, for the xml backend.
+    ADMIN_PASSWORD (str): IceCast admin password, for the xml backend.
+        The xml backend is skipped if this isn't set.
+    STREAM_MOUNT (str): mount point to report on, such as '/kteq'. If not
+        set, every mount on the server is reported on.
+    STREAM_RELAYS (list): status urls of relay servers, checked alongside
+        the main server. Set with the STREAM_RELAYS environment variable,
+        separated by commas.
+    STREAM_MOUNTS (list): mount points every server should have up, set
+        with the STREAM_MOUNTS environment variable, separated by commas.
+        Mounts that have been seen up are expected as well. Only
+        STREAM_MOUNT is expected if that is set, as no other mount is
+        read.
+    MOUNT_FORGET (int): seconds a mount that has gone missing is still
+        expected back.
+    THROUGHPUT_SECONDS (float): seconds of each mount measured by
+        stream.throughput(), set with the STREAM_THROUGHPUT_SECONDS
+        environment variable. 0 (the default) turns the throughput check
+        off, as IceCast counts every measurement as a listener, and each
+        one uses the station's upload bandwidth.
+    THROUGHPUT_WARMUP (float): seconds of audio read before measuring,
+        as IceCast sends a burst of buffered audio to new listeners.
+    THROUGHPUT_BUFFER (int): size of the buffer audio is read into.
+    MIN_REALTIME (float): least audio (in seconds) per second measured
+        before a mount counts as stalled.
+    CHUNK_SIZE (int): bytes of the status page read and parsed at a time.
+    PROBE_TIMEOUT (tuple): (connect, read) timeouts in seconds for each
+        check made by stream.probe().
+    PROBE_HEDGE (float): seconds stream.probe() waits on a check before
+        starting another one alongside it.
+    PROBE_ATTEMPTS (int): most checks stream.probe() makes.
+    PROBE_DEADLINE (float): seconds stream.probe() may take in total.
+    SNAPSHOT_FRESHNESS (float): seconds a SnapshotProvider hands out the
+        same snapshot for, set with the STREAM_SNAPSHOT_FRESHNESS
+        environment variable.
+    ICY_BUFFER (int): bytes of audio skipped at a time by an IcyListener.
+    ICY_BLOCK (int): metadata length unit, the length byte before each
+        ICY metadata block counts blocks of this many bytes.
 
 Todo:
     * Look into why false negatives are returned for stream status.
@@ -31,18 +106,141 @@ Todo:
 
 """
 
+import os
+import re
 import sys
-from urllib.request import urlopen
-import urllib.error
-from bs4 import BeautifulSoup
+import json
+import socket
+import time
+import codecs
+import hashlib
+import queue
+import threading
+import collections
+from html.parser import HTMLParser
+import urllib.parse
+import httpclient
+import metrics
+import songinfo
 
 #potential stream errors
-NO_DATA   = "no data read from Icecast Server"
-URL_ERROR = "HTTP Request Timeout"
+NO_DATA         = "no data read from Icecast Server"
+URL_ERROR       = "HTTP Request Timeout"
+CONNECT_REFUSED = "Connection Refused by Icecast Server"
+STALLED         = "Stream stalled, audio not arriving in real time"
 
 #how long to wait for timeout
 TIMEOUT_VALUE = 60
 
+#status backends, cheapest first
+STATUS_BACKENDS = os.environ.get('ICECAST_BACKENDS', 'json,xml,html').split(',')
+ADMIN_USER      = os.environ.get('ICECAST_ADMIN_USER', 'admin')
+ADMIN_PASSWORD  = os.environ.get('ICECAST_ADMIN_PASSWORD')
+STREAM_MOUNT    = os.environ.get('STREAM_MOUNT')
+STREAM_RELAYS   = [ url.strip() for url in os.environ.get('STREAM_RELAYS', '').split(',') if url.strip() ]
+STREAM_MOUNTS   = [ m.strip() for m in os.environ.get('STREAM_MOUNTS', '').split(',') if m.strip() ]
+
+#a missing mount is still expected back for a day
+MOUNT_FORGET = 86400
+
+#stream.throughput() settings
+THROUGHPUT_SECONDS = float( os.environ.get('STREAM_THROUGHPUT_SECONDS', '0') )
+THROUGHPUT_WARMUP  = 1.0
+THROUGHPUT_BUFFER  = 16384
+MIN_REALTIME       = 0.8
+
+#MPEG audio layer III frame headers, by MPEG version bits
+MP3_BITRATES = { 3 : (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+                 2 : (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+                 0 : (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160) }
+MP3_SAMPLE_RATES = { 3 : (44100, 48000, 32000),
+                     2 : (22050, 24000, 16000),
+                     0 : (11025, 12000, 8000) }
+
+#bytes of the status page read at a time
+CHUNK_SIZE = 4096
+
+#stream.probe() settings
+PROBE_TIMEOUT  = (3.05, 10)
+PROBE_HEDGE    = 2.0
+PROBE_ATTEMPTS = 5
+PROBE_DEADLINE = 20.0
+
+#how long one status read is shared between everything asking for one
+SNAPSHOT_FRESHNESS = float( os.environ.get('STREAM_SNAPSHOT_FRESHNESS', '5') )
+
+#ICY metadata
+ICY_BUFFER = 16384
+ICY_BLOCK  = 16
+ICY_FIELD  = re.compile(r"(\w+)='(.*?)';(?=\w+='|$)", re.S)
+
+Mount = collections.namedtuple('Mount', ['name', 'title', 'listeners', 'peak', 'bitrate'])
+Mount.__doc__ = """Status of a single mount (encoding) on the IceCast server.
+
+    Attributes:
+        name (str): mount point, such as '/kteq'.
+        title (str): song currently playing, or '' if unknown.
+        listeners (int): current listeners.
+        peak (int): peak listeners.
+        bitrate (int): bitrate in kbps, or 0 if unknown.
+"""
+
+MountHealth = collections.namedtuple('MountHealth', ['server', 'name', 'up', 'bitrate', 'listeners', 'title', 'agrees'])
+MountHealth.__doc__ = """Health of a single mount on one of the stream's servers.
+
+    Attributes:
+        server (str): status url of the server.
+        name (str): mount point, such as '/kteq'.
+        up (bool): False if the mount is expected, but missing.
+        bitrate (int): bitrate in kbps (when last seen, if down),
+            or 0 if unknown.
+        listeners (int): current listeners.
+        title (str): song playing on the mount, or '' if unknown.
+        agrees (bool): False if the mount is playing a different song
+            than most of the other mounts.
+"""
+
+Throughput = collections.namedtuple('Throughput', ['mount', 'seconds', 'bytes', 'frames', 'audio', 'bitrate', 'stalled'])
+Throughput.__doc__ = """Audio measured arriving on a mount by stream.throughput().
+
+    Attributes:
+        mount (str): mount point, such as '/kteq'.
+        seconds (float): seconds measured, after the warmup.
+        bytes (int): bytes that arrived while measuring.
+        frames (int): MP3 frames that arrived while measuring.
+        audio (float): seconds of audio in those frames.
+        bitrate (int): bitrate the mount advertises in kbps, or 0.
+        stalled (bool): True if audio arrived slower than it plays.
+"""
+
+class Snapshot(collections.namedtuple('Snapshot', ['up', 'song', 'mounts', 'cause'])):
+    """Everything read from the IceCast server by a single check.
+
+    Attributes:
+        up (bool): True if the stream is up.
+        song (str): '#NowPlaying: ' song info if the stream is up.
+        mounts (list): Mount tuples, one per mount on the server.
+        cause (str): NO_DATA, CONNECT_REFUSED or URL_ERROR if the
+            stream is down, otherwise None.
+
+    """
+    __slots__ = ()
+
+    @property
+    def listeners(self):
+        """int: current listeners, summed over every mount."""
+        return sum( m.listeners for m in self.mounts )
+
+    @property
+    def peak(self):
+        """int: peak listeners, summed over every mount."""
+        return sum( m.peak for m in self.mounts )
+
+    @property
+    def message(self):
+        """str: song info if the stream is up, error message otherwise."""
+        return self.song if self.up else prep_message(self.cause)
+
 def prep_message(cause="None"):
     """Prepare an error message to diagnose stream.
 
@@ -53,6 +251,11 @@ def prep_message(cause="None"):
     NO_DATA:   Icecast server is up, but no data is being output
                to it. This usually means that the stream is
                up, but Altacast encoders are not connected.
+    CONNECT_REFUSED: The station computer answered, but nothing is
+               listening on Icecast's port. The computer is on
+               and online, but Icecast isn't running.
+    STALLED:   Icecast is up and lists the mounts, but the encoders
+               are sending little or no audio.
     URL_ERROR: Icecast is either down, or HTTP request simply
                simply timed out. Technically this happens
                purely because the HTTP request times out. 
@@ -90,6 +293,20 @@ def prep_message(cause="None"):
         msg = msg + "most often happens when someone boots up "
         msg = msg + "multiple instances of altacast on the station "
         msg = msg + "computer. I would start with looking at that."
+    elif cause == CONNECT_REFUSED:
+        msg = msg + "Connection Refused by Icecast server. \n"
+        msg = msg + "The station computer is on and online, since it "
+        msg = msg + "answered, but icecast isn't running on it. This "
+        msg = msg + "could be from icecast being closed, crashing, or "
+        msg = msg + "still starting up after a reboot. Start icecast "
+        msg = msg + "back up, then check on AltaCast as well.\n"
+    elif cause == STALLED:
+        msg = msg + "Stream stalled. \n"
+        msg = msg + "Icecast is up and the encoders are connected, "
+        msg = msg + "but audio isn't reaching icecast as fast as it "
+        msg = msg + "plays, so listeners are hearing dead air or "
+        msg = msg + "constant buffering. AltaCast is likely frozen, "
+        msg = msg + "or the station computer's upload is struggling.\n"
     elif cause == URL_ERROR:
         msg = msg + "HTTP Request Timeout. \n"
         msg = msg + "This could mean a multitude of things. "
@@ -206,92 +423,1439 @@ def now_playing(data):
     data = "#NowPlaying: " + data
     return data
 
-def current_listeners(data):
-    """Clean up streamdata html to return listener information.
-
-    Parse through HTML to detemine listener count.
+def current_listeners(snap):
+    """Return listener information from a stream snapshot.
 
     Args:
-        data (bs4.element.ResultSet): HTML segment containing 
-            listener information 
+        snap (Snapshot): stream status, as returned by stream.snapshot().
 
     Returns:
         data (list): A pair of number in a list, corresponding to current 
-            and peak listeners, respectively
+            and peak listeners, respectively, summed over every mount
 
     Example:
 
         >>> import stream
-        >>> from urllib.request import urlopen
-        >>> import urllib.error
-        >>> from bs4 import BeautifulSoup
         >>> url  = <YOUR_STREAM_URL_HERE>
-        >>> page = urlopen( url, timeout=60 )
-        >>> soup = BeautifulSoup(page, 'html.parser')
-        >>> data = soup.findAll('td')
-        >>> msg  = stream.current_listeners(data)
+        >>> msg  = stream.current_listeners( stream.snapshot(url) )
         >>> msg
         [2, 16]
     """
-    # The very last <td> tagged value is the one we want. (contains song)
+    return [snap.listeners, snap.peak]
 
-    current = 0 # current listeners
-    peak    = 0 # peak listeners
-
-    for i in range(0, len(data)):
-        if "Current Listeners:" in data[i].text:
-            # next value corresponds to current listener count
-            # for a particular encoding.
-            current = current + int(data[i+1].text)
-        elif "Peak Listeners:" in data[i].text:
-            # next value corresponds to peak listener count
-            # for a particular encoding.
-            peak = peak + int(data[i+1].text)
-    
-    return [current, peak]
+def mount_listeners(snap):
+    """Return the listeners on each mount from a stream snapshot.
 
-def ping_stream(url,listeners=False,debug=False):
-    """Ping the music stream server for song info, stream status
+    Args:
+        snap (Snapshot): stream status, as returned by stream.snapshot().
+
+    Returns:
+        dict: mount point to current listeners, empty if the stream
+            is down.
+
+    Example:
+
+        >>> import stream
+        >>> stream.mount_listeners( stream.snapshot(url) )
+        {'/kteq': 2, '/kteq64': 0}
+    """
+    return dict( (mount.name, mount.listeners) for mount in snap.mounts )
+
+def to_int(value):
+    """Convert a status value to an int, 0 if it isn't a number."""
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return 0
+
+def page_charset(page):
+    """Find a response's character encoding, utf-8 if it doesn't say."""
+    for param in page.headers.get("Content-Type", "").split(";")[1:]:
+        key, _, value = param.partition("=")
+        value = value.strip(" \"'")
+        if key.strip().lower() == "charset" and value:
+            return value
+    return 'utf-8'
+
+def song_title(title, artist=None):
+    """Combine separate title and artist fields into one song metadata
+    string, split by songinfo.SEPARATOR the way the song logger writes
+    them, so that songinfo.parse() can tell them apart again. (IceCast's
+    own html page shows them as 'artist - title' instead.)"""
+    title = (title or "").strip()
+    if artist and artist.strip():
+        return title + " " + songinfo.SEPARATOR + " " + artist.strip()
+    return title
+
+class StatusBackend:
+    """Base class for reading mount status from an IceCast server.
+
+    Subclasses provide the path of their status page and a parse method
+    turning that page into a list of Mount tuples.
+
+    Attributes:
+        name (str): backend name, as used in STATUS_BACKENDS.
+        path (str): path of the status page on the IceCast server.
+        mount (str): only report on this mount point, or None for
+            every mount on the server.
+
+    """
+    name = None
+    path = None
+
+    #True if pages are parsed as they download, rather than all at once
+    streaming = False
+
+    def __init__(self, mount=None):
+        """StatusBackend initialization method.
+
+        Args:
+            mount (str): Optional mount point to report on.
+                Defaults to None, every mount.
+
+        """
+        self.mount = mount
+
+    def available(self):
+        """Return False if this backend can't be used at all."""
+        return True
+
+    def url(self, stream_url):
+        """Find this backend's status page, given the stream url."""
+        parts = urllib.parse.urlsplit(stream_url)
+        return parts.scheme + "://" + parts.netloc + self.path
+
+    def request(self, stream_url):
+        """Build the HTTP request for this backend's status page.
+
+        Returns:
+            dict: url, headers and any other arguments for httpclient.get().
+
+        """
+        return { "url": self.url(stream_url), "headers": {} }
+
+    def parse_page(self, page):
+        """Parse a status page straight from an open HTTP response."""
+        return self.parse( page.content, page_charset(page) )
+
+    def parse(self, data, charset='utf-8'):
+        """Parse a status page into a list of Mount tuples.
+
+        Args:
+            data (bytes): the status page.
+            charset (str): the page's character encoding.
+
+        Raises:
+            ValueError: if the page isn't what this backend expects.
+
+        """
+        raise NotImplementedError
+
+    def read(self, stream_url, timeout=TIMEOUT_VALUE):
+        """Download and parse this backend's status page."""
+        with httpclient.get( timeout=timeout, stream=self.streaming, **self.request(stream_url) ) as page:
+            page.raise_for_status()
+            return self.only_mount( self.parse_page(page) )
+
+    def only_mount(self, mounts):
+        """Drop every mount but the one asked for, if one was."""
+        if self.mount:
+            return [ m for m in mounts if m.name == self.mount ]
+        return mounts
+
+class JsonStatus(StatusBackend):
+    """Mount status from status-json.xsl (IceCast 2.4 and up)."""
+    name = "json"
+    path = "/status-json.xsl"
+
+    def parse(self, data, charset='utf-8'):
+        try:
+            stats = json.loads( data.decode(charset, 'replace') )["icestats"]
+        except (KeyError, TypeError) as e:
+            raise ValueError("not an IceCast status: " + repr(e))
+        sources = stats.get("source", [])
+        if isinstance(sources, dict):
+            # a single mount isn't wrapped in a list
+            sources = [sources]
+        mounts = []
+        for source in sources:
+            bitrate = to_int( source.get("bitrate") or source.get("ice-bitrate") )
+            if not bitrate:
+                bitrate = to_int( source.get("audio_bitrate") ) // 1000
+            mounts.append( Mount( urllib.parse.urlsplit( source.get("listenurl", "") ).path,
+                                  song_title( source.get("title"), source.get("artist") ),
+                                  to_int( source.get("listeners") ),
+                                  to_int( source.get("listener_peak") ),
+                                  bitrate ) )
+        return mounts
+
+class XmlStatus(StatusBackend):
+    """Mount status from the admin interface's admin/stats XML."""
+    name = "xml"
+    path = "/admin/stats"
+
+    def available(self):
+        return bool(ADMIN_PASSWORD)
+
+    def request(self, stream_url):
+        req = StatusBackend.request(self, stream_url)
+        req["auth"] = (ADMIN_USER, ADMIN_PASSWORD)
+        return req
+
+    def parse(self, data, charset='utf-8'):
+        # the xml declaration gives the encoding
+        import xml.etree.ElementTree as ElementTree
+        try:
+            root = ElementTree.fromstring(data)
+        except ElementTree.ParseError as e:
+            raise ValueError("not an IceCast status: " + repr(e))
+        if root.tag != "icestats":
+            raise ValueError("not an IceCast status: <" + root.tag + ">")
+        mounts = []
+        for source in root.iter("source"):
+            bitrate = to_int( source.findtext("bitrate") or source.findtext("ice-bitrate") )
+            if not bitrate:
+                bitrate = to_int( source.findtext("audio_bitrate") ) // 1000
+            mounts.append( Mount( source.get("mount", ""),
+                                  song_title( source.findtext("title"), source.findtext("artist") ),
+                                  to_int( source.findtext("listeners") ),
+                                  to_int( source.findtext("listener_peak") ),
+                                  bitrate ) )
+        return mounts
+
+class StatusParser(HTMLParser):
+    """Incremental parser for the IceCast status page.
+
+    The page is fed in one chunk at a time, and only the cells TeqBot
+    uses are kept: each mount's heading, and the values following the
+    labels in HtmlStatus.LABELS. Everything else on the page is skipped
+    over as it streams past, so memory use doesn't grow with the size
+    of the page, only with the number of mounts.
+
+    If a mount is asked for, the parser is done as soon as that mount's
+    values have all been read, so the rest of the page never has to be
+    downloaded.
+
+    Attributes:
+        mount (str): mount point wanted, or None for every mount.
+        mounts (list): dict of fields for each mount read so far.
+        done (bool): True once the wanted mount has been read.
+
+    """
 
-    perform an HTTP request to copy all html data from an Icecast
-    Stream. 
-
-    If html data was successfullly retrieved:
-        find all html tags labeled 'td' with attribute 'class=streamdata'
-        if data was found:
-            clean up the data to retrieve song information
-            report that the stream is up, return song information
-        if data was not found:
-            report that the stream is down, return NO_DATA error message
-    If HTTP request times out, resulting in no html data:
-        report that the stream is down, return URL_ERROR error message
-
-    This function uses the BeautifulSoup library for html parsing and
-    urllib library to perform an HTTP request. After a successful HTTP request,
-    the function parses the html retrieved from the stream's site. This 
-    returns all of the html used for the site, which is pruned down to 
-    instances of <td>, or table, tags in the site's html. In particular, this 
-    pruning is done on <td> tags that have been labeled with the class "streamdata".
-    While several of these cells contain other information about the stream, such 
-    as bitrate, number of current listeners, station name, etc., the last cell 
-    contains information about the currently playing song on the station as 
-    long as icecast is pushing out metadata containing such information.
-
-    If the http request fails to return any streamdata at all, this means that 
-    while the Icecast page is up, there are no encoders being broadcasted.
+    #longest label text worth holding on to
+    MAX_LABEL = 32
+
+    def __init__(self, mount=None):
+        """StatusParser initialization method.
+
+        Args:
+            mount (str): Optional mount point to stop at.
+
+        """
+        HTMLParser.__init__(self)
+        self.mount  = mount
+        self.mounts = []
+        self.fields = None
+        self.label  = None
+        self.tag    = None
+        self.text   = []
+        self.size   = 0
+        self.done   = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('h3', 'td'):
+            self.tag  = tag
+            self.text = []
+            self.size = 0
+
+    def handle_data(self, data):
+        if self.tag is None:
+            return
+        if self.label is None and self.size > self.MAX_LABEL:
+            # too long to be a label, and no label is waiting on it
+            return
+        self.text.append(data)
+        self.size += len(data)
+
+    def handle_endtag(self, tag):
+        if tag != self.tag:
+            return
+        self.tag = None
+        text = "".join(self.text).strip()
+        self.text = []
+        if tag == 'h3':
+            if text.startswith("Mount Point"):
+                self.next_mount( text[len("Mount Point"):].strip() )
+        elif self.label:
+            if self.fields is None or self.label in self.fields:
+                # no headings on this page, a repeated label means
+                # the next mount has started
+                self.next_mount("")
+            self.fields[self.label] = text
+            self.label = None
+            if self.mount and self.fields["name"] == self.mount and len(self.fields) > len(HtmlStatus.LABELS):
+                self.done = True
+        elif text in HtmlStatus.LABELS:
+            self.label = HtmlStatus.LABELS[text]
+
+    def next_mount(self, name):
+        """Start collecting fields for the next mount on the page."""
+        if self.mount and self.fields and self.fields["name"] == self.mount:
+            # wanted mount is over, even if it was missing some values
+            self.done = True
+        self.fields = { "name": name }
+        self.mounts.append(self.fields)
+
+    def results(self):
+        """Return the Mount tuples read so far."""
+        return [ Mount( fields["name"], fields.get("title", ""),
+                        to_int( fields.get("listeners") ), to_int( fields.get("peak") ),
+                        to_int( fields.get("bitrate") ) )
+                 for fields in self.mounts if len(fields) > 1 ]
+
+class HtmlStatus(StatusBackend):
+    """Mount status scraped from the status page html.
+
+    This is the original way TeqBot read the stream's status, and works
+    with any IceCast server. The page is parsed a chunk at a time with a
+    StatusParser as it downloads, so the whole page is never held in
+    memory. If only one mount is wanted, the download stops once that
+    mount has been found (at the cost of that connection, which can't be
+    reused with the rest of the page still unread).
+
+    """
+    name = "html"
+
+    streaming = True
+
+    #status page labels, and the Mount fields they fill in
+    LABELS = { "Current Song:"      : "title",
+               "Current Listeners:" : "listeners",
+               "Peak Listeners:"    : "peak",
+               "Bitrate:"           : "bitrate" }
+
+    def url(self, stream_url):
+        # the stream url is the status page
+        return stream_url
+
+    def parse_page(self, page):
+        return self.parse( page.iter_content(CHUNK_SIZE), page_charset(page) )
+
+    def parse(self, data, charset='utf-8'):
+        """Parse the status page, stopping early once the mount is found.
+
+        Args:
+            data: the page as bytes, or an iterable of byte chunks.
+            charset (str): the page's character encoding.
+
+        Returns:
+            list: Mount tuples, one per mount on the page.
+
+        """
+        if isinstance(data, bytes):
+            page = memoryview(data)
+            data = ( page[i:i+CHUNK_SIZE] for i in range(0, len(page), CHUNK_SIZE) )
+        parser  = StatusParser(self.mount)
+        decoder = codecs.getincrementaldecoder(charset)('replace')
+        for chunk in data:
+            parser.feed( decoder.decode(chunk) )
+            if parser.done:
+                break
+        else:
+            parser.feed( decoder.decode(b"", True) )
+            parser.close()
+        return parser.results()
+
+BACKENDS = { "json" : JsonStatus,
+             "xml"  : XmlStatus,
+             "html" : HtmlStatus }
+
+class StatusReader:
+    """Reads mount status through the first status backend that works.
+
+    The backend that worked last time is tried first on the next read,
+    so that a server without status-json.xsl doesn't get asked for it
+    on every check.
+
+    The last page read through each backend is cached, along with the
+    mounts parsed from it. If the server sent an ETag or Last-Modified
+    header, the next request for the page is made conditional, and a 304
+    Not Modified answer reuses the cached mounts. Otherwise the page is
+    hashed, and if it is byte for byte the same as last time, it isn't
+    parsed again. Pages parsed as they download (the html backend) are
+    never held in memory whole to be hashed, so only ETag and
+    Last-Modified can save parsing them. Cache hits, and the parse time they saved, are
+    recorded in the metrics module.
+
+    A reader can be shared by several threads at once, such as the hedged
+    checks of stream.probe(). Its backend, cache and counters are only
+    touched while holding its lock, which is never held across a request.
+
+    Attributes:
+        backends (list): StatusBackend instances, in the order tried.
+        backend (StatusBackend): last backend that worked, or None.
+        cache (dict): backend name to the [etag, last modified, digest,
+            mounts] of the last page read, or None if caching is off.
+        stats (dict): counters for requests, cache hits and parsing.
+        lock (threading.Lock): held while changing any of the above.
+
+    """
+
+    def __init__(self, order=None, mount=None, cache=True):
+        """StatusReader initialization method.
+
+        Args:
+            order (list): backend names to try, in order.
+                Defaults to STATUS_BACKENDS.
+            mount (str): mount point to report on. Defaults to
+                STREAM_MOUNT, and every mount if that isn't set.
+            cache (bool): reuse unchanged pages. Defaults to True.
+
+        """
+        order = order or STATUS_BACKENDS
+        mount = mount or STREAM_MOUNT
+        self.backends = [ BACKENDS[name.strip()](mount) for name in order if name.strip() in BACKENDS ]
+        self.backend  = None
+        self.cache    = {} if cache else None
+        self.stats    = { "requests": 0, "not modified": 0, "unchanged": 0,
+                          "parsed": 0, "parse time": 0.0, "saved time": 0.0 }
+        self.lock     = threading.Lock()
+
+    def read(self, stream_url, timeout=TIMEOUT_VALUE):
+        """Read the status of every mount on the server.
+
+        Backends whose status page is missing (an HTTP error) or doesn't
+        parse are skipped. Any other error, such as a timeout, means the
+        server itself isn't answering, and is raised right away.
+
+        Args:
+            stream_url (str): Online stream url.
+            timeout (int): seconds to wait on the server.
+
+        Returns:
+            list: Mount tuples, one per mount on the server.
+
+        Raises:
+            requests.RequestException: if the server couldn't be reached,
+                or no backend's status page could be read.
+
+        """
+        import requests
+        with self.lock:
+            tried = [self.backend] if self.backend else []
+            tried = tried + [ b for b in self.backends if b is not self.backend ]
+        error = None
+        for backend in tried:
+            if not backend.available():
+                continue
+            try:
+                if self.cache is None:
+                    mounts = backend.read(stream_url, timeout)
+                else:
+                    mounts = self.cached_read(backend, stream_url, timeout)
+            except (requests.HTTPError, ValueError) as e:
+                # server is up, but this status page isn't
+                error = e
+                continue
+            with self.lock:
+                self.backend = backend
+            return mounts
+        if isinstance(error, requests.HTTPError):
+            raise error
+        raise requests.RequestException("no usable status backend: " + repr(error))
+
+    def cached_read(self, backend, stream_url, timeout=TIMEOUT_VALUE):
+        """Read a backend's status page, reusing the last one if unchanged.
+
+        Args:
+            backend (StatusBackend): backend to read through.
+            stream_url (str): Online stream url.
+            timeout (int): seconds to wait on the server.
+
+        Returns:
+            list: Mount tuples, one per mount on the server.
+
+        """
+        with self.lock:
+            entry = self.cache.get(backend.name)
+            self.stats["requests"] += 1
+        request = backend.request(stream_url)
+        if entry and entry[0]:
+            request["headers"]["If-None-Match"] = entry[0]
+        if entry and entry[1]:
+            request["headers"]["If-Modified-Since"] = entry[1]
+
+        with httpclient.get( timeout=timeout, stream=backend.streaming, **request ) as page:
+            if page.status_code == 304 and entry:
+                self.hit(backend, "not modified")
+                return backend.only_mount( entry[3] )
+            page.raise_for_status()
+
+            etag     = page.headers.get("ETag")
+            modified = page.headers.get("Last-Modified")
+            digest   = None
+            if backend.streaming:
+                # parsed as it downloads, so only ETag and Last-Modified
+                # can tell it hasn't changed
+                mounts = self.timed_parse(backend, backend.parse_page, page)
+            else:
+                data   = page.content
+                digest = hashlib.sha1(data).digest()
+                if entry and entry[2] == digest:
+                    self.hit(backend, "unchanged")
+                    mounts = entry[3]
+                else:
+                    charset = page_charset(page)
+                    mounts  = self.timed_parse(backend, lambda data: backend.parse(data, charset), data)
+        with self.lock:
+            self.cache[backend.name] = [etag, modified, digest, mounts]
+        return backend.only_mount(mounts)
+
+    def timed_parse(self, backend, parse, data):
+        """Parse a status page, recording how long it took."""
+        start  = time.perf_counter()
+        mounts = parse(data)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.stats["parsed"]     += 1
+            self.stats["parse time"] += elapsed
+        metrics.REGISTRY.inc("status_cache_total", "result", "miss")
+        metrics.REGISTRY.observe("status_parse_seconds", "backend", backend.name, elapsed)
+        return mounts
+
+    def hit(self, backend, result):
+        """Record a cache hit, and the parse time it saved."""
+        with self.lock:
+            self.stats[result] += 1
+            saved = self.stats["parse time"] / self.stats["parsed"] if self.stats["parsed"] else 0.0
+            self.stats["saved time"] += saved
+        metrics.REGISTRY.inc("status_cache_total", "result", result.replace(" ", "_"))
+        metrics.REGISTRY.inc("status_parse_saved_seconds_total", "backend", backend.name, saved)
+
+    def report(self):
+        """Format the status cache counters.
+
+        Returns:
+            str: request count, cache hit rate and parse time saved.
+
+        """
+        hits = self.stats["not modified"] + self.stats["unchanged"]
+        rate = 100.0 * hits / self.stats["requests"] if self.stats["requests"] else 0.0
+        msg  = "Status Cache: requests " + str(self.stats["requests"])
+        msg += " not modified " + str(self.stats["not modified"])
+        msg += " unchanged " + str(self.stats["unchanged"])
+        msg += " hit rate " + "{0:.0f}%".format(rate)
+        msg += " parse time " + "{0:.1f}ms".format(self.stats["parse time"] * 1000)
+        msg += " saved " + "{0:.1f}ms".format(self.stats["saved time"] * 1000)
+        return msg
+
+@metrics.timed("stream.snapshot", ok=lambda result: result.up)
+def snapshot(url, reader=None, timeout=TIMEOUT_VALUE):
+    """Check the music stream server for song info, stream status and listeners
+
+    Read the status of every mount on an Icecast Stream, with a single
+    request and a single parse.
+
+    If mount status was successfullly retrieved:
+        if any mounts are up:
+            the stream is up, song information is taken from the mounts
+        if no mounts are up:
+            the stream is down, with NO_DATA as the cause
+    If the server refuses the connection:
+        the stream is down, with CONNECT_REFUSED as the cause
+    If HTTP request times out, resulting in no status:
+        the stream is down, with URL_ERROR as the cause
+
+    The status is read by a StatusReader, which asks the server for its
+    JSON or XML status when it can, and scrapes the status page html
+    otherwise. Each mount corresponds to one encoding of the stream. The
+    song is taken from the last mount that has one, as all encodings
+    should be playing the same thing, and listener counts are summed over
+    every mount.
+
+    If the server reports no mounts at all, this means that while the 
+    Icecast page is up, there are no encoders being broadcasted.
 
     If the http request fails after the timeout threshold, this means that the 
     Icecast page is possibly down.
 
     Args:
         url (str): Online stream url.
+        reader (StatusReader): Optional reader to use, so that the
+            backend that worked is remembered between calls.
+        timeout: seconds to wait on the server, or a (connect, read)
+            tuple. Defaults to TIMEOUT_VALUE.
+
+    Returns:
+        Snapshot: the stream's status, song and listener counts.
+
+    Example:
+
+        >>> import stream
+        >>> url  = <YOUR_STREAM_URL_HERE>
+        >>> snap = stream.snapshot(url)
+        >>> snap.song, snap.listeners, snap.peak
+        ('#NowPlaying: I Think I Smell a Rat by The White Stripes', 2, 16)
+    """
+    import requests
+    reader = reader or StatusReader()
+    try:
+        # Try to access the server for 60 seconds
+        mounts = reader.read(url, timeout)
+    except (requests.RequestException, socket.timeout) as e:
+        # refused, or http request timed out after 60 seconds
+        # IceCast Server not set up, Altacast might also be down.
+        return Snapshot(False, None, [], failure_cause(e))
+
+    if len(mounts) > 0:
+        # Stream is up, and retrieved current song data
+        titles = [ m.title for m in mounts if m.title ]
+        return Snapshot(True, "#NowPlaying: " + (titles[-1] if titles else ""), mounts, None)
+    else:
+        # IceCast Server is up, Altacast isn't.
+        return Snapshot(False, None, mounts, NO_DATA)
+
+def failure_cause(error):
+    """Tell a refused connection apart from any other failed request.
+
+    Args:
+        error (Exception): exception raised while reading the status.
+
+    Returns:
+        str: CONNECT_REFUSED if the server refused the connection,
+            otherwise URL_ERROR.
+
+    """
+    # the refusal is wrapped several layers deep by requests and urllib3
+    seen  = set()
+    stack = [error]
+    while stack:
+        e = stack.pop()
+        if e is None or id(e) in seen:
+            continue
+        seen.add(id(e))
+        if isinstance(e, ConnectionRefusedError):
+            return CONNECT_REFUSED
+        stack += [ e.__cause__, e.__context__, getattr(e, "reason", None) ]
+        stack += [ arg for arg in getattr(e, "args", ()) if isinstance(arg, BaseException) ]
+    return URL_ERROR
+
+#how telling each cause is, when every check failed
+CAUSE_RANK = { NO_DATA: 0, CONNECT_REFUSED: 1, URL_ERROR: 2 }
+
+@metrics.timed("stream.probe", ok=lambda result: result.up)
+def probe(url, reader=None, timeout=PROBE_TIMEOUT, hedge=PROBE_HEDGE,
+          attempts=PROBE_ATTEMPTS, deadline=PROBE_DEADLINE):
+    """Check whether the stream is up, within a bounded amount of time.
+
+    A check is started right away. If it hasn't answered within hedge
+    seconds, another check is started alongside it, and so on, up to
+    attempts checks. A check that fails is also followed by another one
+    hedge seconds after the last one started. The first check to find
+    the stream up is returned at once, without waiting on the others.
+
+    If every check fails, or the deadline passes first, the most telling
+    failure is returned: NO_DATA (the server answered) over
+    CONNECT_REFUSED (the computer answered) over URL_ERROR (nothing
+    answered in time).
+
+    Note:
+        Checks still running when probe() returns are left to finish on
+        their own (daemon) threads, each within its own timeout.
+
+    Args:
+        url (str): Online stream url.
+        reader (StatusReader): Optional reader, see stream.snapshot().
+        timeout: (connect, read) timeouts for each check.
+            Defaults to PROBE_TIMEOUT.
+        hedge (float): seconds between starting checks.
+            Defaults to PROBE_HEDGE.
+        attempts (int): most checks made. Defaults to PROBE_ATTEMPTS.
+        deadline (float): seconds allowed in total.
+            Defaults to PROBE_DEADLINE.
+
+    Returns:
+        Snapshot: the stream's status, song and listener counts.
+
+    Raises:
+        Exception: any error from a check other than a network or parse
+            error, as that is a bug rather than the stream being down.
+
+    Example:
+
+        >>> import stream
+        >>> snap = stream.probe(url)
+        >>> snap.up, snap.cause
+        (False, 'Connection Refused by Icecast Server')
+    """
+    results = queue.Queue()
+
+    def check():
+        try:
+            results.put( snapshot(url, reader, timeout) )
+        except (OSError, ValueError):
+            # network or parse errors snapshot() didn't already catch
+            results.put( Snapshot(False, None, [], URL_ERROR) )
+        except Exception as e:
+            # a bug rather than an outage, raised from probe() below
+            results.put(e)
+
+    end      = time.monotonic() + deadline
+    started  = 0
+    failures = []
+    next_try = time.monotonic()
+    while len(failures) < attempts:
+        now = time.monotonic()
+        if now >= end:
+            break
+        if started < attempts and now >= next_try:
+            threading.Thread(target=check, daemon=True).start()
+            started += 1
+            next_try = now + hedge
+        wake = min(next_try, end) if started < attempts else end
+        try:
+            snap = results.get( timeout=max(0.0, wake - time.monotonic()) )
+        except queue.Empty:
+            continue
+        if isinstance(snap, Exception):
+            raise snap
+        if snap.up:
+            return snap
+        failures.append(snap)
+
+    if not failures:
+        # nothing answered before the deadline
+        return Snapshot(False, None, [], URL_ERROR)
+    return min( failures, key=lambda snap: CAUSE_RANK.get(snap.cause, len(CAUSE_RANK)) )
+
+def probe_servers(urls, readers=None, providers=None, **kwargs):
+    """Probe several servers at once, such as the main server and relays.
+
+    Each server is probed on its own thread, so checking more servers
+    takes about as long as checking the slowest one.
+
+    Args:
+        urls (list): status urls of each server.
+        readers (dict): Optional url to StatusReader, see stream.snapshot().
+        providers (dict): Optional url to SnapshotProvider. Servers with
+            a provider are read through it instead of probed directly.
+        **kwargs: passed along to stream.probe().
+
+    Returns:
+        dict: url to Snapshot, in the same order as urls.
+
+    """
+    readers   = readers or {}
+    providers = providers or {}
+    results   = {}
+
+    def check(url):
+        if url in providers:
+            results[url] = providers[url].get()
+        else:
+            results[url] = probe(url, readers.get(url), **kwargs)
+
+    threads = [ threading.Thread(target=check, args=(url,), daemon=True) for url in urls ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return collections.OrderedDict( (url, results[url]) for url in urls )
+
+class SnapshotProvider:
+    """Shares one read of a server's status between everything asking.
+
+    A snapshot is handed out to every caller for freshness seconds after
+    it was read, so that everything looking at the stream within one
+    tick (the now playing check, the status check, listener sampling)
+    sees the same parsed status, without reading it again. Callers that
+    ask while a read is already underway wait on that read, rather than
+    starting their own (single-flight).
+
+    Attributes:
+        url (str): status url of the server.
+        reader (StatusReader): reader used for every read.
+        freshness (float): seconds a snapshot is shared for.
+        fetch (function): reads a snapshot, given url and reader.
+            Defaults to stream.probe().
+        snap (Snapshot): newest snapshot, or None.
+        taken (float): time.monotonic() when snap was read.
+        counts (dict): "fetch", "hit" and "coalesced" to the number of
+            snapshots handed out that way.
+
+    """
+
+    def __init__(self, url, reader=None, freshness=SNAPSHOT_FRESHNESS, fetch=None):
+        """SnapshotProvider initialization method.
+
+        Args:
+            url (str): status url of the server.
+            reader (StatusReader): Optional reader, see stream.snapshot().
+            freshness (float): seconds a snapshot is shared for.
+                Defaults to SNAPSHOT_FRESHNESS.
+            fetch (function): Optional function reading a snapshot,
+                called with url and reader. Defaults to stream.probe().
+
+        """
+        self.url       = url
+        self.reader    = reader or StatusReader()
+        self.freshness = freshness
+        self.fetch     = fetch or probe
+        self.lock      = threading.Lock()
+        self.snap      = None
+        self.taken     = None
+        self.flight    = None
+        self.counts    = { "fetch": 0, "hit": 0, "coalesced": 0 }
+
+    def get(self, freshness=None):
+        """Get the server's status, reading it only if needed.
+
+        Args:
+            freshness (float): Optional seconds a snapshot may be old,
+                instead of the provider's freshness.
+
+        Returns:
+            Snapshot: the server's status.
+
+        """
+        freshness = self.freshness if freshness is None else freshness
+        with self.lock:
+            if self.snap is not None and time.monotonic() - self.taken <= freshness:
+                return self.count("hit", self.snap)
+            flight = self.flight
+            leader = flight is None
+            if leader:
+                # [done event, snapshot, exception]
+                flight = self.flight = [threading.Event(), None, None]
+
+        if not leader:
+            flight[0].wait()
+            if flight[2] is not None:
+                raise flight[2]
+            with self.lock:
+                return self.count("coalesced", flight[1])
+
+        try:
+            flight[1] = self.fetch(self.url, self.reader)
+        except Exception as e:
+            flight[2] = e
+            raise
+        finally:
+            with self.lock:
+                if flight[1] is not None:
+                    self.snap  = flight[1]
+                    self.taken = time.monotonic()
+                self.flight = None
+            flight[0].set()
+        with self.lock:
+            return self.count("fetch", flight[1])
+
+    def put(self, snap):
+        """Share a snapshot read some other way, as if just fetched."""
+        with self.lock:
+            self.snap  = snap
+            self.taken = time.monotonic()
+
+    def count(self, how, snap):
+        """Count a snapshot handed out, then return it."""
+        self.counts[how] += 1
+        metrics.REGISTRY.inc("snapshot_reads_total", "result", how)
+        return snap
+
+    def report(self):
+        """Report how many snapshots were read, and how many were shared."""
+        total  = sum(self.counts.values())
+        shared = 100.0 * (total - self.counts["fetch"]) / total if total else 0.0
+        msg = "Status Snapshots: " + str(total) + " handed out, "
+        msg = msg + str(self.counts["fetch"]) + " read, "
+        msg = msg + str(self.counts["hit"]) + " fresh, "
+        msg = msg + str(self.counts["coalesced"]) + " joined a read in flight ("
+        return msg + "{0:.0f}% shared)".format(shared)
+
+def mount_health(snapshots, seen=None, expected=STREAM_MOUNTS, now=None, forget=MOUNT_FORGET, mount=STREAM_MOUNT):
+    """Work out the health of every mount on every server.
+
+    A mount is expected on a server if it is in expected, or if it has
+    been seen up on that server within the last forget seconds. An
+    expected mount that the server doesn't list is down, which is how
+    IceCast shows an encoder that has disconnected. The song playing on
+    each mount is compared to the song more than half of the mounts are
+    playing, if there is one.
+
+    Servers that are down entirely aren't listed, as stream.probe()
+    already explains why.
+
+    If the snapshots only hold one mount (StatusReader reads only
+    STREAM_MOUNT when it is set), only that mount is expected, since
+    every other mount would look missing.
+
+    Args:
+        snapshots (dict): url to Snapshot, from stream.probe_servers().
+        seen (dict): url to {mount: [time last seen up, bitrate]}, as
+            returned by the previous call. Defaults to nothing seen yet.
+        expected (list): mounts every server should have up.
+            Defaults to STREAM_MOUNTS.
+        now (float): current time.time(). Defaults to now.
+        forget (int): seconds a missing mount stays expected.
+            Defaults to MOUNT_FORGET.
+        mount (str): the only mount the snapshots hold, if they were
+            read for one mount. Defaults to STREAM_MOUNT.
+
+    Returns:
+        (tuple): tuple containing:
+
+            health (list): MountHealth for every mount on every server.
+            seen (dict): updated url to {mount: [time last seen up, bitrate]}.
+
+    Example:
+
+        >>> import stream
+        >>> health, seen = stream.mount_health( stream.probe_servers([url]) )
+        >>> [ m.name for m in health if not m.up ]
+        ['/kteq96']
+    """
+    now    = time.time() if now is None else now
+    seen   = dict( (url, dict(mounts)) for url, mounts in (seen or {}).items() )
+    if mount:
+        expected = [ name for name in expected if name == mount ]
+        # seen before STREAM_MOUNT was set, and never read again
+        for last in seen.values():
+            for name in [ name for name in last if name != mount ]:
+                del last[name]
+    # titles only differing in case or spacing are the same song
+    titles = collections.Counter( songinfo.parse(m.title) for snap in snapshots.values() for m in snap.mounts if m.title )
+    common = None
+    if titles and titles.most_common(1)[0][1] * 2 > sum(titles.values()):
+        # only a clear majority says which mounts are off, not a tie
+        common = titles.most_common(1)[0][0]
+
+    health = []
+    for url, snap in snapshots.items():
+        last = seen.setdefault(url, {})
+        if not snap.up:
+            continue
+        for m in snap.mounts:
+            last[m.name] = [now, m.bitrate]
+            health.append( MountHealth(url, m.name, True, m.bitrate, m.listeners, m.title,
+                                       common is None or songinfo.parse(m.title) == common) )
+        listed = set( m.name for m in snap.mounts )
+        wanted = set(expected) | set( name for name, when in last.items() if now - when[0] < forget )
+        for name in sorted(wanted - listed):
+            bitrate = last[name][1] if name in last else 0
+            health.append( MountHealth(url, name, False, bitrate, 0, "", True) )
+        for name in list(last):
+            if now - last[name][0] >= forget:
+                del last[name]
+    return health, seen
+
+def describe_mount(mount):
+    """Name a mount for an alert, such as '/kteq96 (96kbps) on host:8000'."""
+    msg = mount.name
+    if mount.bitrate:
+        msg += " (" + str(mount.bitrate) + "kbps)"
+    return msg + " on " + urllib.parse.urlsplit(mount.server).netloc
+
+def frame_header(head):
+    """Read an MPEG audio layer III (MP3) frame header.
+
+    Args:
+        head (bytes): the first 4 bytes of a frame.
+
+    Returns:
+        (tuple): tuple containing:
+
+            length (int): bytes in the frame, header included.
+            seconds (float): seconds of audio in the frame.
+
+        or None if head isn't a valid layer III frame header.
+
+    """
+    if head[0] != 0xFF or head[1] & 0xE0 != 0xE0:
+        return None
+    version = (head[1] >> 3) & 3
+    layer   = (head[1] >> 1) & 3
+    index   = head[2] >> 4
+    rate    = (head[2] >> 2) & 3
+    padding = (head[2] >> 1) & 1
+    if version == 1 or layer != 1 or index in (0, 15) or rate == 3:
+        return None
+    kbps        = MP3_BITRATES[version][index]
+    sample_rate = MP3_SAMPLE_RATES[version][rate]
+    samples     = 1152 if version == 3 else 576
+    return samples // 8 * kbps * 1000 // sample_rate + padding, samples / sample_rate
+
+class FrameCounter:
+    """Counts MP3 frames in a stream of bytes, without decoding them.
+
+    Only each frame's 4 byte header is looked at, the rest of the frame
+    is skipped over. Bytes that don't line up with a frame (such as a
+    stream joined partway through a frame) are skipped one at a time
+    until a valid header is found.
+
+    Attributes:
+        frames (int): frames counted.
+        audio (float): seconds of audio in the frames counted.
+        lost (int): bytes skipped looking for a frame header.
+
+    """
+
+    def __init__(self):
+        """FrameCounter initialization method."""
+        self.frames = 0
+        self.audio  = 0.0
+        self.lost   = 0
+        self.skip   = 0
+        self.head   = bytearray()
+
+    def feed(self, data):
+        """Count the frames in the next piece of the stream.
+
+        Args:
+            data (memoryview): the next bytes of the stream.
+
+        """
+        pos = 0
+        end = len(data)
+        while pos < end:
+            if self.skip:
+                step       = min(self.skip, end - pos)
+                self.skip -= step
+                pos       += step
+                continue
+            if not self.head:
+                # jump straight to the next possible frame sync
+                sync = bytes(data[pos:]).find(b"\xff")
+                if sync < 0:
+                    self.lost += end - pos
+                    return
+                self.lost += sync
+                pos       += sync
+            need = min(4 - len(self.head), end - pos)
+            self.head += data[pos:pos+need]
+            pos       += need
+            if len(self.head) < 4:
+                return
+            frame = frame_header(self.head)
+            if frame is None:
+                # not a header after all, look again from the next byte
+                del self.head[0]
+                self.lost += 1
+                while self.head and self.head[0] != 0xFF:
+                    del self.head[0]
+                    self.lost += 1
+                continue
+            self.frames += 1
+            self.audio  += frame[1]
+            self.skip    = frame[0] - 4
+            self.head    = bytearray()
+
+def throughput(stream_url, mount, bitrate=0, seconds=THROUGHPUT_SECONDS,
+               warmup=THROUGHPUT_WARMUP, buffer=None, timeout=PROBE_TIMEOUT):
+    """Measure how fast audio is arriving on a mount.
+
+    The mount is listened to for warmup + seconds. Whatever arrives
+    during the warmup (IceCast's burst of buffered audio) is skipped,
+    then the MP3 frames arriving over the next seconds are counted with
+    a FrameCounter. If less than MIN_REALTIME seconds of audio arrive per
+    second, the encoder isn't keeping up and the mount is stalled. For
+    mounts that aren't MP3, the byte rate is compared to the advertised
+    bitrate instead.
+
+    Every read goes into the same fixed size buffer, so a measurement
+    costs the same no matter how long it runs.
+
+    Note:
+        The server counts the measurement as a listener while it runs,
+        so listener counts read at the same time are one higher.
+
+    Args:
+        stream_url (str): Online stream url.
+        mount (str): mount point to measure.
+        bitrate (int): advertised bitrate in kbps, if already known.
+            Otherwise the server's icy-br header is used.
+        seconds (float): seconds to measure. Defaults to
+            THROUGHPUT_SECONDS.
+        warmup (float): seconds to skip first. Defaults to
+            THROUGHPUT_WARMUP.
+        buffer (memoryview): Optional buffer to read into, so several
+            measurements can share one.
+        timeout (tuple): (connect, read) seconds to wait on the server
+            to connect, and then to answer. Defaults to PROBE_TIMEOUT,
+            so a hung mount can't outlast the status task.
+
+    Returns:
+        Throughput: what arrived, and whether the mount is stalled.
+
+    Raises:
+        OSError: if the mount couldn't be reached.
+        ValueError: if the mount couldn't be opened.
+
+    Example:
+
+        >>> import stream
+        >>> stream.throughput(url, "/kteq")
+        Throughput(mount='/kteq', seconds=5.0, bytes=80000, frames=191,
+                   audio=4.99, bitrate=128, stalled=False)
+    """
+    import http.client
+    buffer = buffer if buffer is not None else memoryview( bytearray(THROUGHPUT_BUFFER) )
+    parts  = urllib.parse.urlsplit(stream_url)
+    connect, answer = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    if parts.scheme == "https":
+        conn = http.client.HTTPSConnection(parts.netloc, timeout=connect)
+    else:
+        conn = http.client.HTTPConnection(parts.netloc, timeout=connect)
+    counter  = FrameCounter()
+    received = 0
+    try:
+        conn.request("GET", mount)
+        # the connection lets go of its socket once the response is
+        # open (a stream has no length), so keep hold of it here
+        sock     = conn.sock
+        sock.settimeout(answer)
+        response = conn.getresponse()
+        if response.status != 200:
+            raise ValueError("mount " + mount + " answered " + str(response.status))
+        bitrate = bitrate or to_int( (response.getheader("icy-br") or "").split(",")[0] )
+        mp3     = (response.getheader("Content-Type") or "audio/mpeg").startswith("audio/mpeg")
+
+        # a stream isn't chunked, so read whatever has arrived straight
+        # off the socket, rather than waiting for the buffer to fill
+        read = response.readinto if response.chunked else response.fp.readinto1
+
+        measuring = time.monotonic() + warmup
+        end       = measuring + seconds
+        while True:
+            now = time.monotonic()
+            if now >= end:
+                break
+            # never wait past the end of the measurement on a stalled
+            # mount (a socket can't be read again once it has timed out)
+            sock.settimeout( end - now )
+            try:
+                n = read(buffer)
+            except socket.timeout:
+                break
+            if not n:
+                break
+            if time.monotonic() >= measuring:
+                received += n
+                if mp3:
+                    counter.feed( buffer[:n] )
+        response.close()
+    finally:
+        conn.close()
+
+    # audio that never arrived (the server hung up) still counts as missing
+    if mp3:
+        stalled = counter.audio < MIN_REALTIME * seconds
+    else:
+        stalled = bool(bitrate) and received * 8 < MIN_REALTIME * bitrate * 1000 * seconds
+    return Throughput(mount, seconds, received, counter.frames, counter.audio, bitrate, stalled)
+
+def probe_throughput(stream_url, mounts, seconds=THROUGHPUT_SECONDS, timeout=PROBE_TIMEOUT):
+    """Measure the throughput of several mounts at once.
+
+    Each mount is measured on its own thread, so measuring more mounts
+    takes no longer. Mounts that can't be opened are left out, as
+    stream.mount_health() already reports on missing mounts.
+
+    Args:
+        stream_url (str): Online stream url.
+        mounts (list): Mount tuples to measure, such as Snapshot.mounts.
+        seconds (float): seconds to measure each mount.
+        timeout (tuple): (connect, read) seconds to wait on the server.
+
+    Returns:
+        dict: mount point to Throughput.
+
+    """
+    results = {}
+
+    def measure(mount):
+        try:
+            results[mount.name] = throughput(stream_url, mount.name, mount.bitrate, seconds, timeout=timeout)
+        except (OSError, ValueError) as e:
+            print("Unable to measure", mount.name + ":", repr(e))
+
+    threads = [ threading.Thread(target=measure, args=(mount,), daemon=True) for mount in mounts ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def check_throughput(url, snap, seconds=THROUGHPUT_SECONDS):
+    """Check that audio is flowing on every mount of a server that is up.
+
+    The check is off unless STREAM_THROUGHPUT_SECONDS is set, since the
+    server counts each measurement as a listener for its duration.
+
+    If every mount measured is stalled, the stream is as good as down for
+    listeners, so the snapshot is replaced by one that is down with
+    STALLED as the cause. Mounts stalling on their own are left for the
+    caller to report, using the measurements returned.
+
+    Args:
+        url (str): Online stream url.
+        snap (Snapshot): the server's status, from stream.snapshot().
+        seconds (float): seconds to measure each mount.
+
+    Returns:
+        (tuple): tuple containing:
+
+            snap (Snapshot): the snapshot, or a STALLED one.
+            flow (dict): mount point to Throughput.
+
+    """
+    if not snap.up or seconds <= 0:
+        return snap, {}
+    flow = probe_throughput(url, snap.mounts, seconds)
+    for result in flow.values():
+        metrics.REGISTRY.inc("stream_stalls_total" if result.stalled else "stream_flowing_total",
+                             "mount", result.mount)
+    if flow and all( result.stalled for result in flow.values() ):
+        return Snapshot(False, None, snap.mounts, STALLED), flow
+    return snap, flow
+
+def describe_throughput(result):
+    """Describe a mount's throughput, such as '/kteq: 3.1s of audio in 5.0s (128kbps)'."""
+    msg = result.mount + ": " + "{0:.1f}s of audio in {1:.1f}s".format(result.audio, result.seconds)
+    msg = msg + ", " + "{0:.0f}kbps".format( result.bytes * 8 / 1000 / result.seconds if result.seconds else 0 )
+    if result.bitrate:
+        msg = msg + " of " + str(result.bitrate) + "kbps"
+    return msg + (", STALLED" if result.stalled else "")
+
+def parse_icy_metadata(block):
+    """Split an ICY metadata block into its fields.
+
+    Args:
+        block (bytes): metadata block, such as
+            b"StreamTitle='Beat Market by Sun Machine';StreamUrl='';"
+            padded out with null bytes.
+
+    Returns:
+        dict: field name to value, such as {'StreamTitle': '...'}.
+
+    """
+    data = bytes(block).rstrip(b"\0")
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        # older encoders send latin-1
+        text = data.decode('latin-1')
+    return dict( ICY_FIELD.findall(text) )
+
+def listen_mount(url, reader=None, snap=None):
+    """Pick the mount an IcyListener should listen to.
+
+    STREAM_MOUNT if it is set, otherwise the lowest bitrate mount on the
+    server, as the listener downloads the mount's audio for as long as it
+    runs.
+
+    Args:
+        url (str): Online stream url.
+        reader (StatusReader): Optional reader, see stream.snapshot().
+        snap (Snapshot): Optional status already read, instead of
+            reading it again.
+
+    Returns:
+        str: mount point, such as '/kteq'.
+
+    Raises:
+        ValueError: if the server has no mounts up to listen to.
+
+    """
+    if STREAM_MOUNT:
+        return STREAM_MOUNT
+    snap = snap or snapshot(url, reader)
+    if not snap.mounts:
+        raise ValueError("no mounts to listen to: " + str(snap.cause))
+    return min( snap.mounts, key=lambda m: m.bitrate or sys.maxsize ).name
+
+class IcyListener:
+    """Follows the song title a mount sends along with its audio.
+
+    The mount is requested with an Icy-MetaData: 1 header, which asks the
+    server to send a metadata block every icy-metaint bytes of audio. The
+    audio in between is read into the same buffer over and over and then
+    dropped, so listening costs bandwidth, but no memory or copying. Each
+    time the StreamTitle in a metadata block changes, the on_title
+    callback is called with the new song right away.
+
+    Note:
+        The listener shows up as one more listener in the server's
+        listener counts, and keeps a dedicated connection open rather
+        than using the httpclient pool.
+
+    Attributes:
+        url (str): url of the mount being listened to.
+        mount (str): mount point being listened to.
+        title (str): last StreamTitle heard, or None.
+        metaint (int): audio bytes between metadata blocks.
+        titles (int): title changes heard.
+        skipped (int): audio bytes skipped.
+        connected (float): time.monotonic() when connected, or None.
+        changed (float): time.monotonic() of the last title change,
+            or None.
+
+    """
+
+    def __init__(self, stream_url, mount, on_title, timeout=TIMEOUT_VALUE):
+        """IcyListener initialization method.
+
+        Args:
+            stream_url (str): Online stream url.
+            mount (str): mount point to listen to, see listen_mount().
+            on_title (function): called with '#NowPlaying: ' song info
+                every time the title changes.
+            timeout (int): seconds to wait on the server before giving up
+                on the connection. Defaults to TIMEOUT_VALUE.
+
+        """
+        parts = urllib.parse.urlsplit(stream_url)
+        self.url       = parts.scheme + "://" + parts.netloc + mount
+        self.mount     = mount
+        self.on_title  = on_title
+        self.timeout   = timeout
+        self.title     = None
+        self.metaint   = None
+        self.titles    = 0
+        self.skipped   = 0
+        self.connected = None
+        self.changed   = None
+        self.conn      = None
+        # reused for every read, audio is never kept
+        self.buffer    = memoryview( bytearray(ICY_BUFFER) )
+        self.metadata  = memoryview( bytearray(255 * ICY_BLOCK) )
+
+    def connect(self):
+        """Request the mount's audio, with ICY metadata.
+
+        Returns:
+            http.client.HTTPResponse: the audio stream.
+
+        Raises:
+            ValueError: if the server won't send ICY metadata.
+
+        """
+        import http.client
+        parts = urllib.parse.urlsplit(self.url)
+        if parts.scheme == "https":
+            self.conn = http.client.HTTPSConnection(parts.netloc, timeout=self.timeout)
+        else:
+            self.conn = http.client.HTTPConnection(parts.netloc, timeout=self.timeout)
+        self.conn.request("GET", parts.path or "/", headers={ "Icy-MetaData": "1" })
+        response = self.conn.getresponse()
+        if response.status != 200:
+            raise ValueError("mount " + self.mount + " answered " + str(response.status))
+        self.metaint = to_int( response.getheader("icy-metaint") )
+        if not self.metaint:
+            raise ValueError("mount " + self.mount + " doesn't send ICY metadata")
+        self.connected = time.monotonic()
+        metrics.REGISTRY.inc("icy_connects_total", "mount", self.mount)
+        return response
+
+    def listen(self, stop=None):
+        """Listen to the mount until stopped, or the connection drops.
+
+        Args:
+            stop (threading.Event): Optional event to stop listening.
+
+        Raises:
+            EOFError: if the server closed the stream.
+            OSError: if the connection failed, or timed out.
+
+        """
+        response = self.connect()
+        try:
+            while not (stop and stop.is_set()):
+                self.skip(response, self.metaint)
+                self.read_into(response, self.buffer[:1])
+                length = self.buffer[0] * ICY_BLOCK
+                if length:
+                    self.read_into(response, self.metadata[:length])
+                    self.heard( parse_icy_metadata( self.metadata[:length] ) )
+        finally:
+            self.connected = None
+            response.close()
+            self.conn.close()
+
+    def skip(self, response, count):
+        """Read past count bytes of audio, into the reused buffer."""
+        while count:
+            n = response.readinto( self.buffer[:min(count, len(self.buffer))] )
+            if not n:
+                raise EOFError("mount " + self.mount + " closed the stream")
+            count        -= n
+            self.skipped += n
+
+    def read_into(self, response, view):
+        """Fill a buffer from the stream, however many reads it takes."""
+        while len(view):
+            n = response.readinto(view)
+            if not n:
+                raise EOFError("mount " + self.mount + " closed the stream")
+            view = view[n:]
+
+    def heard(self, fields):
+        """Handle a metadata block, calling on_title if the title changed."""
+        title = fields.get("StreamTitle", "").strip()
+        if not title or title == self.title:
+            # blank titles are sent between songs by some encoders
+            return
+        self.title    = title
+        self.titles  += 1
+        self.changed  = time.monotonic()
+        metrics.REGISTRY.inc("icy_titles_total", "mount", self.mount)
+        self.on_title("#NowPlaying: " + title)
+
+    def stop(self):
+        """Cut the connection from another thread, ending listen()."""
+        conn = self.conn
+        if conn and conn.sock:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def report(self):
+        """Format the listener's state.
+
+        Returns:
+            str: mount, connection state, title changes and audio skipped.
+
+        """
+        msg = "ICY Listener: " + self.mount
+        if self.connected is None:
+            msg += " disconnected"
+        else:
+            msg += " connected " + "{0:.0f}s".format(time.monotonic() - self.connected)
+        msg += " titles " + str(self.titles)
+        if self.changed is not None:
+            msg += " last change " + "{0:.0f}s ago".format(time.monotonic() - self.changed)
+        msg += " skipped " + "{0:.1f}MiB".format(self.skipped / 1048576.0)
+        return msg
+
+def ping_stream(url,listeners=False,debug=False,reader=None):
+    """Ping the music stream server for song info, stream status
+
+    A view of stream.snapshot() kept for existing callers, see
+    stream.snapshot() for how the stream is checked.
+
+    Args:
+        url (str): Online stream url.
+        listeners (bool): Return listener counts instead of song info.
         debug (bool): Optional flag for debugging outputs (unused)
+        reader (StatusReader): Optional reader, see stream.snapshot().
 
     Returns:
             (tuple): tuple containing:
 
                 bool: True if stream is up, False if stream is down.
                 str: Song data if stream is up, Error message if stream is down
+                    (or [current, peak] listeners, if listeners is True)
 
     Example:
 
@@ -301,30 +1865,10 @@ def ping_stream(url,listeners=False,debug=False):
         >>> msg
         (True, '#NowPlaying: I Think I Smell a Rat by The White Stripes')
     """
-    try:
-        # Try to access the page for 60 seconds
-        page = urlopen( url, timeout=TIMEOUT_VALUE )
-        soup = BeautifulSoup(page, 'html.parser')
-
-        # Check to see if "streamdata" exists
-        data = soup.findAll('td', attrs={"class" : "streamdata" })
-
-        # Also get counts
-        count = soup.findAll('td')
-
-        if listeners and len(count) > 0:
-            # Stream is up, let's retrieve listener count
-            return True, current_listeners(count)
-        if len(data) > 0:
-            # Stream is up, and retrieved current song data
-            return True, now_playing(data)
-        else:
-            # IceCast Server is up, Altacast isn't.
-            return False, prep_message(NO_DATA)
-    except urllib.error.URLError:
-        # http request timed out after 60 seconds
-        # IceCast Server not set up, Altacast might also be down.
-        return False, prep_message(URL_ERROR)
+    snap = snapshot(url, reader)
+    if listeners and snap.up:
+        return True, current_listeners(snap)
+    return snap.up, snap.message
 
 def usage():
     """Print Usage Statement.
@@ -339,23 +1883,41 @@ def usage():
         >>> import stream
         >>> msg = stream.usage()
         >>> msg
-        'stream.py usage:\n$ python stream.py "<YOUR_STREAM_URL>"'
+        'stream.py usage:\n$ python stream.py "<YOUR_STREAM_URL>" "--listen"(optional)'
     """
     msg = "stream.py usage:\n"
-    msg = msg + "$ python stream.py \"<YOUR_STREAM_URL>\""
+    msg = msg + "$ python stream.py \"<YOUR_STREAM_URL>\" \"--listen\"(optional)"
     return msg
     
 
 if __name__ == "__main__":
-    if(len(sys.argv) > 1):
-        ping, message = ping_stream(sys.argv[1], False, True)
-        ping, counts = ping_stream(sys.argv[1], True, True)
-        if ping:
+    if(len(sys.argv) > 2 and sys.argv[2] == "--listen"):
+        listener = IcyListener(sys.argv[1], listen_mount(sys.argv[1]), print)
+        print("Listening to", listener.url)
+        try:
+            listener.listen()
+        except KeyboardInterrupt:
+            pass
+        print(listener.report())
+    elif(len(sys.argv) > 1):
+        snap = snapshot(sys.argv[1])
+        if snap.up:
             print("Station is online")
         else:
             print("Station is offline")
-        print(message)
-        print("Current Listeners:", counts[0])
-        print("Peak    Listeners:", counts[1])
+        print(snap.message)
+        for mount in snap.mounts:
+            print("Mount", mount.name, "(" + str(mount.bitrate) + "kbps):",
+                  mount.listeners, "current,", mount.peak, "peak")
+        print("Current Listeners:", snap.listeners)
+        print("Peak    Listeners:", snap.peak)
+        if THROUGHPUT_SECONDS > 0:
+            for result in probe_throughput(sys.argv[1], snap.mounts).values():
+                print( describe_throughput(result) )
+        if STREAM_RELAYS:
+            snaps = probe_servers( [sys.argv[1]] + STREAM_RELAYS )
+            for mount in mount_health(snaps)[0]:
+                print( describe_mount(mount) + ":",
+                       ("up" if mount.up else "DOWN") + ("" if mount.agrees else ", different song") )
     else:
         print(usage())
\ No newline at end of file
@@ -31,9 +31,14 @@ Attributes:
     ROBOT_EMOJI (str): robot face emoji
     SKULL_EMOJI (str): skull emoji
     MUSIC_EMOJI (str): musical note emoji
+    RELOAD_MODULES (list): modules reloaded after an update, in order
+    UPDATE_TIMEOUT (int): seconds allowed for pulling and checking updates
+    METRICS_INTERVAL (int): milliseconds between metrics textfile writes
+    LISTEN_RETRY (int): seconds before reconnecting a dropped ICY listener,
+        doubled on each failure up to LISTEN_RETRY_MAX
+    LISTEN_RETRY_MAX (int): longest wait between ICY listener reconnects
 
 Todo:
-    * Create the update task for automatically updating scheduler
     * Create other additional tasks as they are needed
 
 .. _TeqBot GitHub Repository:
@@ -44,16 +49,20 @@ Todo:
 
 """
 
-from slackclient import SlackClient
 import os
 import time
 import slack
-import stream
-import tunein
-import genius
 import log
+import schedule
+import metrics
+import songinfo
+from runner import TaskRunner
+from cadence import Cadence
+import sys
 import shlex
+import importlib
 import subprocess
+import threading
 
 #standard frequency (in seconds)
 STANDARD_FREQUENCY = 5
@@ -72,6 +81,24 @@ ROBOT_EMOJI = ':robot_face:'
 SKULL_EMOJI = ':skull:'
 MUSIC_EMOJI = ':musical_note:'
 
+#modules swapped out by an update, dependencies first. metrics is left
+#out so that counts recorded before the update are kept, httpclient so
+#that its kept-alive connections are too, and state so that changes
+#waiting to be written aren't lost
+RELOAD_MODULES = [ "log", "slack", "songinfo", "playlog", "stream", "tunein",
+                   "genius", "listeners", "schedule", "cadence", "runner", "pool",
+                   "control", "profiling", "teq" ]
+
+#how long git pull and the import check may take
+UPDATE_TIMEOUT = 120
+
+#how often the metrics textfile is rewritten
+METRICS_INTERVAL = 15000
+
+#how long to wait before reconnecting the ICY listener (in seconds)
+LISTEN_RETRY     = 5
+LISTEN_RETRY_MAX = 120
+
 class TeqBot:
     """TeqBot, the class for handling stream monitoring tasks
 
@@ -81,7 +108,8 @@ class TeqBot:
 
     Attributes:
         slack (slackclient._client.SlackClient):
-            slackclient object used to perform slack API calls
+            slackclient object used to perform slack API calls,
+            created the first time it is needed
         stream (str): URL of IceCast Stream
         python (str): Path to Python3 executable for task spawning
         tuneInStationID (str): TuneIn Station ID value
@@ -92,6 +120,13 @@ class TeqBot:
         channel (str): Current Channel ID TeqBot is pointing to for posting
         message (str): Current prepared message for TeqBot to sent on slack
         lastSong (str): Last song played on IceCast stream
+        profile (str): profiling.CPU or profiling.MEMORY to profile
+            every task run, or None
+        listener (stream.IcyListener): ICY metadata listener announcing
+            new songs, if the scheduler was started with listen=True
+        listenerHistory (listeners.ListenerHistory): each mount's
+            listeners over time, if the scheduler was started with
+            record_listeners=True
 
     """
 
@@ -111,7 +146,7 @@ class TeqBot:
         default emoji is the robot face.
 
         """
-        self.slack  = SlackClient( os.environ.get('SLACK_TOKEN') )
+        self.slackClient = None
         self.stream = os.environ.get('STREAM_URL')
         self.python = os.environ.get('PYTHONPATH')
         self.tuneinStationID  = os.environ.get('TUNEIN_STATION_ID')
@@ -125,8 +160,57 @@ class TeqBot:
         self.message = ""
         self.lastSong = ""
         self.lastSwear = None
+        # tasks share the slack fields above when run in-process
+        self.slackLock = threading.Lock()
+        self.pool = None
+        self.runner = None
+        self.cadence = None
+        self.schedule = None
+        self.control = None
+        self.done = None
+        self.started = None
+        self.streamDown = None
+        self.loop = None
+        self.wakeup = None
+        self.deadlines = {}
+        self.updating = False
+        self.pendingUpdate = None
+        self.lastReload = None
+        self.metricsServer = None
+        self.textfile = None
+        self.profile = None
+        self.statusReader = None
+        self.snapshotProvider = None
+        self.relayReaders = {}
+        self.tuneinClient = None
+        self.listener = None
+        self.listenerThread = None
+        self.listenerStop = None
+        self.listenerHistory = None
+        self.historyThread = None
+        self.historyStop = None
+
+    @property
+    def state(self):
+        """state.StateStore: state kept between task runs, such as the
+        last song played, shared by everything in this process."""
+        import state
+        return state.shared()
+
+    @property
+    def slack(self):
+        """slackclient._client.SlackClient: slack API client.
+
+        The SlackClient is only created (and the slackclient library only
+        imported) the first time TeqBot actually talks to slack.
 
-    def scheduler(self, event='11111111', frequency=STANDARD_FREQUENCY):
+        """
+        if self.slackClient is None:
+            from slackclient import SlackClient
+            self.slackClient = SlackClient( os.environ.get('SLACK_TOKEN') )
+        return self.slackClient
+
+    def scheduler(self, event='11111111', frequency=STANDARD_FREQUENCY, pool=None, intervals=None, runner=None, adaptive=False, metrics_port=None, textfile=None, listen=False, record_listeners=False):
         """Scheduler for spawning TeqBot tasks at predetermined intervals.
 
         This method will first determine which tasks will be called by
@@ -135,19 +219,25 @@ class TeqBot:
         task will be spawned when the scheduler triggers events.
 
         The scheduler then goes into a potentially infinite loop. Each
-        task has a 'clock' that monitors how many seconds have elapsed
-        since the task was last spawned. Once a clock has hit the value
-        equivalent to the task's frequency, the task will be executed.
-        These tasks are spawned as new processes, which helps prevent
-        the entire scheduler from crashing if one particular process
-        encounters a runtime error for whatever reason.
-
-        After updating the clock on each cycle, the scheduler checks on
-        TeqBot's stat file. If this stat file reads 'Done', the scheduler
-        will terminate operations. This offers TeqBot a graceful way to
-        cease operations without killing the scheduler's process. The stat
-        file can be updated using the TeqBot.set_stat_file() method. Ending
-        the scheduler will delete the TeqBot stat file.
+        task is kept in a schedule.Schedule heap, keyed on the next time
+        the task is due. The scheduler sleeps until the earliest deadline,
+        spawns every task that is due, and then reschedules each task one
+        interval after the deadline it was due at, so that tasks don't
+        drift over time. These tasks are spawned as new processes, which
+        helps prevent the entire scheduler from crashing if one particular
+        process encounters a runtime error for whatever reason. Spawned
+        tasks are handled by a runner.TaskRunner, which only lets one copy
+        of each task run at a time, kills tasks that hang, and reaps
+        finished task processes once a second.
+
+        While waiting on the next deadline, the scheduler also listens on
+        its control socket (see the control module). Sending the 'kill'
+        command offers TeqBot a graceful way to cease operations without
+        killing the scheduler's process. Other commands can report on the
+        scheduler's status, run a task right away, or reload task code.
+        Ending the scheduler will delete the TeqBot stat, and print
+        how late each task was started compared to when it was due
+        (scheduling lag).
 
         Args:
             event (str): events string. Later converted to binary for bitwise
@@ -158,76 +248,622 @@ class TeqBot:
                 the base frequency for the tasks is once every minute.
                 Defaults to STANDARD_FREQUENCY, a value at the top of
                 teq.py that can be modified. This value should be 60 normally.
+            pool (pool.WorkerPool): Optional pool of pre-forked workers.
+                If provided, tasks are handed off to the pool instead of
+                being spawned as new processes.
+            intervals (dict): Optional per-task intervals in milliseconds,
+                keyed by task name. Overrides the intervals derived from
+                frequency for those tasks.
+            runner (runner.TaskRunner): Optional runner for spawned tasks,
+                for setting the overlap policy, concurrency cap and task
+                timeouts. Defaults to a runner.TaskRunner with default
+                settings. Ignored if a pool is provided.
+            adaptive (bool): If True, the now playing task's interval is
+                adjusted after every run with a cadence.Cadence, checking
+                more often when a song change is likely, and less often
+                in the middle of a song.
+            metrics_port (int): Optional port to serve task and call
+                metrics on, at http://localhost:<port>/metrics.
+            textfile (str): Optional path to write metrics to every
+                METRICS_INTERVAL milliseconds, for the node exporter's
+                textfile collector.
+            listen (bool): If True, new songs are announced as soon as
+                they start, by listening to the stream's ICY metadata on
+                a background thread (see TeqBot.start_listener()), rather
+                than checking for them on a timer.
+            record_listeners (bool): If True, each mount's listeners are
+                recorded every few seconds on a background thread (see
+                TeqBot.start_listener_history()).
 
         """
-        # reset some flags
-        nowPlayingClock   = 0
-        streamStatusClock = 0
-        updateRepoClock   = 0
-        checkLyricsClock  = 0
-        swearLogClock     = 0
+        # only the scheduler needs these
+        import socket
+        import multiprocessing.connection
+        from control import ControlServer
 
         self.set_last_played("None")
-        self.set_stat_file("Running")
+        self.set_stream_down(False)
         self.get_last_played()
 
-        # determine which tasks will be called
-        nowPlaying   = int( "{0:b}".format( int( event, 2) & int(NOW_PLAYING,   2) ) )
-        streamStatus = int( "{0:b}".format( int( event, 2) & int(STREAM_STATUS, 2) ) )
-        updateRepo   = int( "{0:b}".format( int( event, 2) & int(UPDATE_REPO,   2) ) )
+        self.pool = pool
+        if self.pool:
+            self.pool.start()
+        else:
+            self.runner = runner or TaskRunner()
 
-        # New tasks in dev
-        checkLyrics   = int( "{0:b}".format( int( event, 2) & int(CHECK_LYRICS, 2) ) )
-        swearLog      = int( "{0:b}".format( int( event, 2) & int(SWEAR_LOG,    2) ) )
+        # determine which tasks will be called
+        tasks = schedule.Schedule()
+        for name, method, interval in self.scheduled_tasks(event, frequency):
+            if intervals and name in intervals:
+                interval = intervals[name]
+            # callbacks look up methods on every call, so that they
+            # pick up new code after TeqBot.hand_over()
+            if listen and name == "nowplaying":
+                self.start_listener()
+            elif adaptive and name == "nowplaying":
+                self.cadence = Cadence(interval)
+                tasks.add(name, interval, lambda: self.dispatch_now_playing())
+            elif name == "update":
+                tasks.add(name, interval, lambda: self.start_update())
+            else:
+                tasks.add(name, interval, lambda name=name: self.dispatch_task(name))
+
+        if self.runner:
+            tasks.add("reap", 1000, lambda: self.runner.reap(), 1000)
+        if record_listeners:
+            self.start_listener_history()
+
+        self.start_metrics(metrics_port, textfile)
+        if self.textfile:
+            tasks.add("metrics", METRICS_INTERVAL, lambda: self.write_metrics(), METRICS_INTERVAL)
+
+        self.schedule = tasks
+        self.started  = time.monotonic()
+        self.control  = ControlServer(lambda command: self.control_command(command))
+        self.control.start()
+        self.wakeup   = socket.socketpair()
+
+        def wait(delay):
+            # wake up early for control commands, worker results
+            # and finished updates
+            waiting = [self.control, self.wakeup[0]]
+            if self.pool:
+                waiting += self.pool.connections()
+            ready = multiprocessing.connection.wait(waiting, delay)
+            if self.control in ready:
+                self.control.handle()
+            if self.wakeup[0] in ready:
+                self.wakeup[0].recv(64)
+                self.finish_update()
+            if self.pool:
+                self.pool.poll(0)
 
         print("running Scheduler")
-        while True:
-            #trigger events
-            if nowPlaying and nowPlayingClock % (frequency * 2) == 0:
-                # only check nowplaying at 1/2 frequeny
-                print("Handling NowPlaying Status...")
-                self.spawn_task(self.python + " teqbot task --nowplaying")
-                nowPlayingClock = 1
-            if streamStatus and streamStatusClock % (frequency * 20) == 0:
-                # only check status at 1/20th frequency
-                print("Handling Stream Status...")
-                self.spawn_task(self.python + " teqbot task --status")
-                streamStatusClock = 1
-            if checkLyrics and checkLyricsClock % frequency == 0:
-                # update repo at normal frequency
-                print("Checking Lyrics...")
-                self.spawn_task(self.python + " teqbot task --lyric")
-                checkLyricsClock = 1
-            if swearLog and swearLogClock % frequency == 0:
-                # update repo at normal frequency
-                print("Checking Swear Log...")
-                self.spawn_task(self.python + " teqbot task --swear")
-                swearLogClock = 1
-            if updateRepo and updateRepoClock % (frequency * 1200) == 0:
-                # update repo at 1/1200th frequency
-                print("Updating TeqBot...")
-                self.spawn_task(self.python + " teqbot task --update")
-                updateRepoClock = 1
-            time.sleep(1)
-            nowPlayingClock   += 1
-            streamStatusClock += 1
-            updateRepoClock   += 1
-            checkLyricsClock  += 1
-            swearLogClock     += 1
-            print("n:", nowPlayingClock,
-                  "s:", streamStatusClock,
-                  "l:", checkLyricsClock,
-                  "w:", swearLogClock,
-                  "u:", updateRepoClock)
-
-            # break out of the scheduler if stat file contains "Done"
-            if self.check_stat_file("Done"):
-                self.delete_stat_file()
-                break
+        try:
+            tasks.run(wait)
+        finally:
+            self.control.stop()
+            self.stop_listener()
+            self.stop_listener_history()
+            self.delete_stat_file()
+            for end in self.wakeup:
+                end.close()
 
         # end of loop
+        print(tasks.report())
+        if self.cadence:
+            print(self.cadence.report())
+        if self.pool:
+            print(self.pool.report())
+            self.pool.stop()
+        if self.runner:
+            print(self.runner.report())
+            self.runner.stop()
+        self.stop_metrics()
+        print("Finished Scheduler")
+
+    def scheduled_tasks(self, event='11111111', frequency=STANDARD_FREQUENCY):
+        """Determine which tasks are scheduled, and how often they run.
+
+        Decodes the event bitstring the same way TeqBot.scheduler() does,
+        pairing each enabled task with the TeqBot method that performs it
+        and the interval (in milliseconds) between runs.
+
+        Args:
+            event (str): events bitstring, see TeqBot.scheduler().
+            frequency (int): base frequency for tasks, in seconds.
+
+        Returns:
+            list: list of (name, method, interval) tuples, one for each
+                task enabled in the event bitstring.
+
+        """
+        # nowplaying at 1/2 frequency, status at 1/20th frequency,
+        # lyric and swear at normal frequency, update at 1/1200th frequency
+        table = [ ("nowplaying", NOW_PLAYING,   self.task_now_playing,   frequency * 2000),
+                  ("status",     STREAM_STATUS, self.task_stream_status, frequency * 20000),
+                  ("lyric",      CHECK_LYRICS,  self.task_check_lyrics,  frequency * 1000),
+                  ("swear",      SWEAR_LOG,     self.task_swear_log,     frequency * 1000),
+                  ("update",     UPDATE_REPO,   self.task_update_repo,   frequency * 1200000) ]
+        tasks = []
+        for name, bit, method, interval in table:
+            if int(event, 2) & int(bit, 2):
+                tasks.append( (name, method, interval) )
+        return tasks
+
+    def async_scheduler(self, event='11111111', frequency=STANDARD_FREQUENCY, intervals=None, adaptive=False, metrics_port=None, textfile=None, listen=False, record_listeners=False):
+        """Run TeqBot tasks as coroutines in a single event loop.
+
+        An alternative to TeqBot.scheduler() that does not spawn a new
+        process for each task. Every enabled task gets its own coroutine
+        that runs the task, then sleeps for the task's interval. The
+        task methods themselves are blocking (HTTP requests, slack calls),
+        so they are handed off to the event loop's default executor. This
+        way the interpreter, imports and SlackClient are only set up once
+        for the lifetime of the scheduler.
+
+        A task that raises an exception is reported and rescheduled, so a
+        single bad run can't take the rest of the scheduler down with it.
+
+        The control socket is served from the event loop, so the same
+        commands that work on TeqBot.scheduler() work here as well.
+
+        Args:
+            event (str): events bitstring, see TeqBot.scheduler().
+            frequency (int): base frequency for tasks, in seconds.
+            intervals (dict): per-task intervals in milliseconds,
+                see TeqBot.scheduler().
+            adaptive (bool): adapt the now playing task's interval,
+                see TeqBot.scheduler().
+            metrics_port (int): port to serve metrics on,
+                see TeqBot.scheduler().
+            textfile (str): path to write metrics to,
+                see TeqBot.scheduler().
+            listen (bool): announce new songs from the stream's ICY
+                metadata, see TeqBot.scheduler().
+            record_listeners (bool): record each mount's listeners,
+                see TeqBot.scheduler().
+
+        """
+        # only the async scheduler needs these
+        import asyncio
+        from control import ControlServer
+
+        self.set_last_played("None")
+        self.set_stream_down(False)
+        self.get_last_played()
+
+        intervals = intervals or {}
+        for name, method, interval in self.scheduled_tasks(event, frequency):
+            if listen and name == "nowplaying":
+                self.start_listener()
+            elif adaptive and name == "nowplaying":
+                self.cadence = Cadence(intervals.get(name, interval))
+        if record_listeners:
+            self.start_listener_history()
+
+        self.start_metrics(metrics_port, textfile)
+
+        print("running Async Scheduler")
+        self.started = time.monotonic()
+        self.control = ControlServer(lambda command: self.control_command(command))
+        self.control.start()
+        try:
+            asyncio.run( self._run_async_scheduler(event, frequency, intervals) )
+        finally:
+            self.control.stop()
+            self.stop_listener()
+            self.stop_listener_history()
+            self.delete_stat_file()
+        if self.cadence:
+            print(self.cadence.report())
+        self.stop_metrics()
         print("Finished Scheduler")
 
+    async def _run_async_scheduler(self, event, frequency, intervals):
+        """Start one coroutine per task, stop them all once done."""
+        import asyncio
+        loops = []
+        for name, method, interval in self.scheduled_tasks(event, frequency):
+            if name == "nowplaying" and self.listenerThread:
+                # announced by the ICY listener instead
+                continue
+            if name == "update":
+                # pull in the background, swap code on the loop
+                method = self.start_update
+            loops.append( asyncio.ensure_future( self._task_loop(name, method, intervals.get(name, interval)) ) )
+        if self.textfile:
+            loops.append( asyncio.ensure_future( self._metrics_loop() ) )
+
+        # wait for a kill command on the control socket
+        loop = asyncio.get_running_loop()
+        self.loop = loop
+        self.done = asyncio.Event()
+        loop.add_reader(self.control.fileno(), lambda: self.control.handle())
+        await self.done.wait()
+        loop.remove_reader(self.control.fileno())
+
+        for task in loops:
+            task.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+
+    async def _task_loop(self, name, method, interval):
+        """Run a single task forever, once every interval milliseconds."""
+        import asyncio
+        interval = interval / 1000.0
+        deadline = time.monotonic()
+        while True:
+            await self._run_once(name, method)
+            wait = interval
+            if self.cadence and name == "nowplaying":
+                wait = self.now_playing_interval() / 1000.0
+            # sleep until the next deadline, skipping any that were missed
+            deadline += wait
+            now = time.monotonic()
+            if deadline < now:
+                deadline += wait * ((now - deadline) // wait + 1)
+            self.deadlines[name] = deadline
+            await asyncio.sleep(deadline - now)
+
+    async def _metrics_loop(self):
+        """Rewrite the metrics textfile every METRICS_INTERVAL."""
+        import asyncio
+        while True:
+            await asyncio.sleep(METRICS_INTERVAL / 1000.0)
+            self.write_metrics()
+
+    async def _run_once(self, name, method):
+        """Run a single task on the executor, reporting any errors."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        # look the method up again, in case of new code
+        method = getattr(self, method.__name__)
+        print("Handling", name, "task...")
+        start = time.monotonic()
+        error = False
+        try:
+            await loop.run_in_executor(None, self.run_method, name, method)
+        except Exception as e:
+            error = True
+            print("Error in", name, "task:", repr(e))
+        metrics.record_task(name, time.monotonic() - start, error)
+
+    def dispatch_task(self, name):
+        """Run a scheduled task outside of the scheduler's process.
+
+        If the scheduler was given a worker pool, the task is sent to
+        the pool. Otherwise, the task is spawned as a brand new process
+        running 'teqbot task --<name>', through the scheduler's task
+        runner if it has one.
+
+        Args:
+            name (str): task name, as returned by TeqBot.scheduled_tasks().
+
+        """
+        command = self.python + " teqbot task --" + name
+        # the task reads state from the database, not from this process
+        self.state.flush()
+        if self.profile:
+            import profiling
+            command += " --profile-memory" if self.profile == profiling.MEMORY else " --profile"
+        if self.pool:
+            self.pool.submit(name)
+        elif self.runner:
+            self.runner.run(name, command)
+        else:
+            self.spawn_task(command)
+
+    def control_command(self, command):
+        """Answer a command sent over the scheduler's control socket.
+
+        Args:
+            command (str): command line sent by a control client.
+
+        Returns:
+            str: reply to send back to the client.
+
+        """
+        args = command.split()
+        if not args:
+            return "Error: no command given"
+        if args[0] == "kill":
+            self.stop_scheduler()
+            return "Halting Scheduler"
+        elif args[0] == "status":
+            return self.status()
+        elif args[0] == "run-task" and len(args) > 1:
+            return self.run_task(args[1])
+        elif args[0] == "reload":
+            return self.reload()
+        elif args[0] == "metrics":
+            return metrics.render( self.metric_snapshots() ).rstrip("\n")
+        elif args[0] == "listeners":
+            return self.listener_report( float(args[1]) if len(args) > 1 else 24 )
+        return "Error: unknown command '" + command + "'"
+
+    def start_metrics(self, port=None, textfile=None):
+        """Start exporting metrics from the scheduler.
+
+        Args:
+            port (int): Optional port to serve metrics on over HTTP.
+            textfile (str): Optional path to write metrics to.
+
+        """
+        self.textfile = textfile
+        if port:
+            self.metricsServer = metrics.serve(port, lambda: self.metric_snapshots())
+            print("Serving metrics on port", port)
+
+    def stop_metrics(self):
+        """Stop the metrics server, and write the textfile one last time."""
+        if self.metricsServer:
+            self.metricsServer.shutdown()
+            self.metricsServer.server_close()
+            self.metricsServer = None
+        self.write_metrics()
+
+    def write_metrics(self):
+        """Write the metrics textfile, if the scheduler was given one."""
+        if self.textfile:
+            try:
+                metrics.write_textfile(self.textfile, self.metric_snapshots())
+            except OSError as e:
+                print("Unable to write metrics:", repr(e))
+
+    def metric_snapshots(self):
+        """Metrics recorded in other processes, such as pool workers."""
+        if self.pool:
+            return self.pool.metric_snapshots()
+        return []
+
+    def stop_scheduler(self):
+        """Stop whichever scheduler is currently running."""
+        if self.done:
+            self.done.set()
+        elif self.schedule:
+            self.schedule.stop()
+
+    def status(self):
+        """Report on the running scheduler.
+
+        Returns:
+            str: uptime, stream status, last song played and the
+                scheduler's counters.
+
+        """
+        if self.pool or self.runner:
+            # tasks run in other processes, only they know for sure
+            self.streamDown = None
+        msg = "Scheduler up for " + "{0:.0f}s".format(time.monotonic() - self.started) + "\n"
+        msg += "Stream: " + ("DOWN" if self.is_stream_down() else "online") + "\n"
+        msg += "Last Song: " + str(self.lastSong) + "\n"
+        if self.lastReload:
+            msg += self.lastReload + "\n"
+        if self.schedule:
+            msg += self.schedule.report()
+        if self.cadence:
+            msg += self.cadence.report() + "\n"
+        if self.statusReader:
+            msg += self.statusReader.report() + "\n"
+        if self.snapshotProvider:
+            msg += self.snapshotProvider.report() + "\n"
+        if self.listener:
+            msg += self.listener.report() + "\n"
+        import httpclient
+        msg += httpclient.report()
+        if self.pool:
+            msg += self.pool.report()
+        if self.runner:
+            msg += self.runner.report() + "\n"
+        return msg.rstrip("\n")
+
+    def run_task(self, name):
+        """Run a task right away, outside of its normal schedule.
+
+        Args:
+            name (str): task name, as returned by TeqBot.scheduled_tasks().
+
+        Returns:
+            str: reply for the control client.
+
+        """
+        tasks = dict( (n, method) for n, method, interval in self.scheduled_tasks() )
+        if name not in tasks:
+            return "Error: unknown task '" + name + "'"
+        if name == "update":
+            return self.start_update()
+        if self.done:
+            import asyncio
+            asyncio.ensure_future( self._run_once(name, tasks[name]) )
+        else:
+            self.dispatch_task(name)
+        return "Started " + name + " task"
+
+    def reload(self):
+        """Hand over to the code currently on disk, without pulling.
+
+        Returns:
+            str: reply for the control client.
+
+        """
+        return self.start_update(pull=False)
+
+    def start_update(self, pull=True):
+        """Start updating TeqBot's code in the background.
+
+        Pulling and checking the new code happens on a separate thread,
+        so the scheduler keeps running tasks on time in the meantime.
+        Once the new code is ready, TeqBot.finish_update() is called on
+        the scheduler's own thread to swap it in.
+
+        Args:
+            pull (bool): pull from git before checking the code.
+                Defaults to True.
+
+        Returns:
+            str: reply for the control client.
+
+        """
+        if self.updating:
+            return "Update already in progress"
+        self.updating = True
+        thread = threading.Thread(target=self._update_worker, args=(pull,), daemon=True)
+        thread.start()
+        return "Update started" if pull else "Reload started"
+
+    def _update_worker(self, pull):
+        """Pull and check new code, then wake up the scheduler."""
+        started = time.monotonic()
+        try:
+            if pull:
+                ready = self.task_update_repo()
+            else:
+                ready = self.verify_code()
+        except Exception as e:
+            print("Error updating TeqBot:", repr(e))
+            ready = False
+        self.pendingUpdate = (ready, started)
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.finish_update)
+        elif self.wakeup:
+            self.wakeup[1].send(b"!")
+
+    def finish_update(self):
+        """Swap in new code once a background update is done."""
+        ready, started = self.pendingUpdate
+        self.pendingUpdate = None
+        self.updating = False
+        if ready:
+            self.hand_over(started)
+        else:
+            print("No new code to hand over to")
+
+    def verify_code(self, path=None):
+        """Check that the TeqBot code on disk imports cleanly.
+
+        The check is done in a separate python process, so that a
+        broken update can't affect the running scheduler.
+
+        Args:
+            path (str): directory holding the code to check. Defaults to
+                the directory TeqBot is running from.
+
+        Returns:
+            bool: True if every TeqBot module imported without error.
+
+        """
+        check = subprocess.run( [sys.executable, "-c", "import " + ", ".join(RELOAD_MODULES)],
+                                cwd=path or os.path.dirname(os.path.abspath(__file__)),
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                universal_newlines=True, timeout=UPDATE_TIMEOUT )
+        if check.returncode != 0:
+            print("New code failed to import:\n" + check.stdout)
+            return False
+        return True
+
+    def hand_over(self, started=None):
+        """Swap the running TeqBot over to freshly loaded code.
+
+        Every module in RELOAD_MODULES is reloaded, and this TeqBot (along
+        with its schedule, cadence, runner and pool) is switched over to
+        the reloaded classes. Since only the classes change, everything
+        TeqBot keeps in memory, like the last song played, whether the
+        stream is down, and any caches, carries over as-is. Tasks that
+        are already scheduled stay scheduled. Worker pool processes are
+        restarted so that they pick up the new code too.
+
+        The time taken, and any tasks that came due while the code was
+        being swapped (and so started late), are reported.
+
+        Note:
+            The scheduler loop that is already running keeps running the
+            old loop code until the scheduler is restarted.
+
+        Args:
+            started (float): time.monotonic() when the update started,
+                for reporting the total update time.
+
+        """
+        start = time.monotonic()
+        for name in RELOAD_MODULES:
+            if name in sys.modules:
+                importlib.reload(sys.modules[name])
+
+        for obj in (self, self.schedule, self.cadence, self.runner, self.pool, self.control, self.listenerHistory):
+            if obj is not None:
+                module = sys.modules.get(type(obj).__module__)
+                obj.__class__ = getattr(module, type(obj).__name__, type(obj))
+
+        # rebuilt from the new stream code on the next check
+        self.statusReader = None
+        self.snapshotProvider = None
+        self.relayReaders = {}
+        self.tuneinClient = None
+
+        if self.pool:
+            self.pool.stop()
+            self.pool.start()
+        end = time.monotonic()
+
+        # tasks that came due while the code was being swapped
+        if self.schedule:
+            deadlines = [ entry[0] for entry in self.schedule.heap ]
+        else:
+            deadlines = list(self.deadlines.values())
+        late = len([ d for d in deadlines if start <= d <= end ])
+
+        msg = "Reloaded TeqBot in " + "{0:.1f}ms".format((end - start) * 1000)
+        if started is not None:
+            msg += " (" + "{0:.1f}s".format(end - started) + " including update)"
+        msg += ", " + str(late) + " task(s) came due during the swap"
+        print(msg)
+        self.lastReload = msg
+
+    def run_method(self, name, method):
+        """Run a task method, under the profiler if profiling is on.
+
+        Args:
+            name (str): task name, as returned by TeqBot.scheduled_tasks().
+            method (function): TeqBot method that performs the task.
+
+        Returns:
+            whatever the task method returns.
+
+        """
+        if self.profile:
+            import profiling
+            return profiling.run(name, method, self.profile)
+        return method()
+
+    def dispatch_now_playing(self):
+        """Run the now playing task, then pick when to run it next.
+
+        Returns:
+            int: milliseconds until the next now playing check.
+
+        """
+        self.dispatch_task("nowplaying")
+        return self.now_playing_interval()
+
+    def now_playing_interval(self):
+        """Determine how long to wait before the next now playing check.
+
+        Feeds the last song played into TeqBot's cadence.Cadence, which
+        keeps track of how long songs tend to last.
+
+        Note:
+            When tasks run as separate processes, the last song played
+            is read after the newest check was only just dispatched,
+            so the cadence sees each song change one check late.
+
+        Returns:
+            int: milliseconds until the next now playing check.
+
+        """
+        self.get_last_played()
+        self.cadence.observe(self.lastSong)
+        return self.cadence.next_interval()
+
     def spawn_task(self, command):
         """Spawn a task as a new process.
 
@@ -245,8 +881,10 @@ class TeqBot:
         """
         # split args into separate entries in a list
         args = shlex.split(command)
+        # let the task report how long it took to get going
+        env  = dict(os.environ, TEQ_DISPATCH_TIME=str(time.time()))
         # spawn new process
-        p    = subprocess.Popen(args)
+        p    = subprocess.Popen(args, env=env)
 
     def task_now_playing(self):
         """Update the current song's information to slack and TuneIn.
@@ -270,30 +908,211 @@ class TeqBot:
 
         """
         self.get_last_played()
-        # compare last song to what is currently playing
+        # compare last song to what is currently playing, the status is
+        # only read once, check_last_played() gets the same snapshot
         print("NOW PLAYING: Comparing", self.lastSong, "|", self.get_now_playing() )
         newsong = self.check_last_played()
         if newsong:
             print("New Song")
-            # update #nowplaying on slack
-            self.teq_message(self.now_playing(self.lastSong), "nowplaying", MUSIC_EMOJI)
-            # post metadata to TuneIn
-            self.tunein(self.lastSong)
+            self.announce_song(self.lastSong)
         else:
             print("Same Song")
 
+    def announce_song(self, song):
+        """Post a new song to the #nowplaying channel and to TuneIn.
+
+        Args:
+            song (str): '#NowPlaying: ' song metadata.
+
+        """
+        # keep it for looking up later, before anything that could fail
+        self.log_play(song)
+        # update #nowplaying on slack
+        self.teq_message(self.now_playing(song), "nowplaying", MUSIC_EMOJI)
+        # post metadata to TuneIn
+        self.tunein(song)
+
+    def log_play(self, song):
+        """Append a new song to the play log (see the playlog module).
+
+        Args:
+            song (str): '#NowPlaying: ' song metadata.
+
+        """
+        import playlog
+        try:
+            playlog.PlayLog().append( songinfo.parse(song) )
+        except OSError as e:
+            # not worth missing the announcement over
+            print("Unable to log play:", repr(e))
+
+    def start_listener(self):
+        """Start announcing new songs from the stream's ICY metadata.
+
+        Instead of checking the status page for a new song every so often,
+        a stream.IcyListener listens to one of the stream's mounts on a
+        background thread, and the song is announced the moment its title
+        changes (see TeqBot.on_stream_title()). If the connection drops,
+        such as while the stream is down, the listener reconnects after
+        LISTEN_RETRY seconds, backing off to LISTEN_RETRY_MAX.
+
+        """
+        self.listenerStop   = threading.Event()
+        self.listenerThread = threading.Thread(target=lambda: self.listen_loop(), daemon=True)
+        self.listenerThread.start()
+        print("Listening for new songs")
+
+    def listen_loop(self):
+        """Keep an ICY listener connected until TeqBot.stop_listener()."""
+        import stream
+        delay = LISTEN_RETRY
+        while not self.listenerStop.is_set():
+            started = time.monotonic()
+            try:
+                mount = stream.listen_mount(self.stream, snap=self.stream_snapshot())
+                self.listener = stream.IcyListener(self.stream, mount, lambda song: self.on_stream_title(song))
+                self.listener.listen(self.listenerStop)
+            except Exception as e:
+                if self.listenerStop.is_set():
+                    break
+                print("ICY listener disconnected:", repr(e))
+            if time.monotonic() - started > LISTEN_RETRY_MAX:
+                # it was connected a good while, not a failing server
+                delay = LISTEN_RETRY
+            self.listenerStop.wait(delay)
+            delay = min(delay * 2, LISTEN_RETRY_MAX)
+
+    def on_stream_title(self, song):
+        """Announce a song heard by the ICY listener, if it is a new one.
+
+        Runs on the listener's thread, and is recorded in the metrics as
+        a run of the now playing task.
+
+        Args:
+            song (str): '#NowPlaying: ' song metadata.
+
+        """
+        start = time.monotonic()
+        error = False
+        try:
+            self.get_last_played()
+            if songinfo.parse(song) != songinfo.parse(self.lastSong):
+                print("New Song:", song)
+                self.set_last_song(song)
+                self.set_last_played(song)
+                self.announce_song(song)
+        except Exception as e:
+            # keep listening, the next song may go through
+            error = True
+            print("Error in nowplaying task:", repr(e))
+        metrics.record_task("nowplaying", time.monotonic() - start, error)
+
+    def stop_listener(self):
+        """Stop the ICY listener, if one is running."""
+        if self.listenerThread is None:
+            return
+        self.listenerStop.set()
+        if self.listener:
+            self.listener.stop()
+        self.listenerThread.join(1)
+        self.listenerThread = None
+
+    def start_listener_history(self):
+        """Start recording each mount's listeners on a background thread.
+
+        Every listeners.RESOLUTION seconds, the stream's status is read
+        and each mount's listener count is added to a
+        listeners.ListenerHistory, which rolls older samples up into
+        minutes and hours. The history is saved to the hidden
+        .teq.listeners file every listeners.SAVE_INTERVAL seconds, and
+        once more when the scheduler stops, and picks up where the last
+        run left off.
+
+        """
+        import listeners
+        self.listenerHistory = listeners.ListenerHistory()
+        if self.listenerHistory.load():
+            print("Loaded listener history for", len(self.listenerHistory.mounts), "mount(s)")
+        self.historyStop   = threading.Event()
+        self.historyThread = threading.Thread(target=lambda: self.listener_history_loop(), daemon=True)
+        self.historyThread.start()
+        print("Recording listeners")
+
+    def listener_history_loop(self):
+        """Record listeners until TeqBot.stop_listener_history()."""
+        import stream
+        import listeners
+        saved = time.monotonic()
+        while not self.historyStop.is_set():
+            start = time.monotonic()
+            try:
+                # shared with any task reading the stream at the same time
+                snap = self.stream_snapshot()
+                for mount, count in stream.mount_listeners(snap).items():
+                    self.listenerHistory.record(mount, count)
+            except Exception as e:
+                print("Unable to record listeners:", repr(e))
+            if start - saved >= listeners.SAVE_INTERVAL:
+                self.save_listener_history()
+                saved = start
+            self.historyStop.wait( max(0, listeners.RESOLUTION - (time.monotonic() - start)) )
+
+    def save_listener_history(self):
+        """Save the listener history to the hidden .teq.listeners file."""
+        try:
+            self.listenerHistory.save()
+        except OSError as e:
+            print("Unable to save listener history:", repr(e))
+
+    def stop_listener_history(self):
+        """Stop recording listeners, saving what has been recorded."""
+        if self.historyThread is None:
+            return
+        self.historyStop.set()
+        self.historyThread.join(1)
+        self.historyThread = None
+        self.save_listener_history()
+
+    def listener_report(self, hours=24):
+        """Report the fewest, average and most listeners on each mount.
+
+        Args:
+            hours (float): hours to report on.
+
+        Returns:
+            str: reply for the control client.
+
+        """
+        if self.listenerHistory is None:
+            return "Error: listeners aren't being recorded, start the scheduler with --record-listeners"
+        start = time.perf_counter()
+        msg   = self.listenerHistory.report(hours)
+        return msg + "Looked up in " + "{0:.1f}ms".format((time.perf_counter() - start) * 1000)
+
     def task_stream_status(self):
         """Check if the stream is online
 
-        The stream is checked using the TeqBot.ping_stream()
-        wrapper method for the stream.ping_stream() method.
+        The stream is checked using the TeqBot.probe_servers()
+        wrapper method for the stream.probe_servers() method, which
+        checks the main server and any relays all at once. Each
+        server gets several overlapping checks with short timeouts,
+        giving up after stream.PROBE_DEADLINE seconds at most.
+
+        If the main server is up and STREAM_THROUGHPUT_SECONDS is set,
+        TeqBot.check_throughput() then listens to each of its mounts for
+        a few seconds, to make sure audio is actually flowing. If every mount is stalled, the
+        stream is treated as down, with stream.STALLED as the cause.
+
+        The online/offline messages below are about the main server.
+        Relays, and every mount on each server, are then checked on
+        their own by TeqBot.check_mounts().
 
         If the stream is online, TeqBot will output a message
         indicating such (this is only on terminal, no actual
         posts are made when the stream is normal.)
 
         If the stream is offline, TeqBot will use the message
-        returned by TeqBot.ping_stream() to diagnose the problem.
+        returned by TeqBot.probe_servers() to diagnose the problem.
         TeqBot will then notify the #engineering channel that
         the stream is down, as well as provide the error message.
         TeqBot will inform the #engineering channel that the stream
@@ -311,17 +1130,16 @@ class TeqBot:
             it is for your stream to be online constantly.
 
         """
-        for i in range(0, 5):
-            online, msg = self.ping_stream()
-            # make 5 attempts to connect.
-            if online:
-                break
+        snaps  = self.probe_servers()
+        snap, flow = self.check_throughput( snaps[self.stream] )
+        online = snap.up
+        msg    = snap.message
         if online:
             # Only do something if the stream HAD been down
             # If this is the case, then let everyone know
             # We are back online
-            if self.check_stat_file("Stream Down"):
-                self.set_stat_file("Running")
+            if self.is_stream_down():
+                self.set_stream_down(False)
                 msg = "The Stream is Back Online!"
                 print(msg)
                 self.teq_message(msg, "engineering", ROBOT_EMOJI )
@@ -331,7 +1149,100 @@ class TeqBot:
             # stream is down, let everyone know
             print(msg)
             self.teq_message(msg, "engineering", SKULL_EMOJI )
-            self.set_stat_file("Stream Down")
+            self.set_stream_down(True)
+        self.check_mounts(snaps, flow)
+
+    def check_mounts(self, snaps, flow=None):
+        """Alert #engineering about single relays or mounts going down.
+
+        Uses stream.mount_health() to find mounts that have gone missing
+        from a server that is otherwise up (such as one encoder out of
+        three disconnecting), and mounts playing a different song than
+        the rest. Relay servers going down entirely are reported here
+        too, the main server is covered by TeqBot.task_stream_status().
+
+        Mounts on the main server that are up, but stalled while the
+        others are not, are reported here as well.
+
+        Each problem is posted once when it starts, and once more when
+        it clears up. What has been posted, and which mounts each server
+        has had up, is kept in the state store between checks.
+
+        Args:
+            snaps (dict): status url to stream.Snapshot, for the main
+                server and each relay.
+            flow (dict): mount point to stream.Throughput, for the main
+                server's mounts, from TeqBot.check_throughput().
+
+        """
+        import stream
+        state  = self.get_mount_state()
+        health, state["seen"] = stream.mount_health(snaps, state["seen"])
+        down     = set(state["down"])
+        disagree = set(state["disagree"])
+        stalled  = set(state["stalled"])
+        flow     = flow or {}
+        # the whole stream stalling is covered by task_stream_status()
+        if flow and all( result.stalled for result in flow.values() ):
+            flow = {}
+
+        for url, snap in snaps.items():
+            if url == self.stream:
+                continue
+            if not snap.up and url not in down:
+                down.add(url)
+                msg = "Relay " + url + " is down!\n" + snap.message
+                self.teq_message(msg, "engineering", SKULL_EMOJI )
+            elif snap.up and url in down:
+                down.discard(url)
+                self.teq_message("Relay " + url + " is Back Online!", "engineering", ROBOT_EMOJI )
+
+        playing = [ m.title for m in health if m.up and m.agrees and m.title ]
+        for mount in health:
+            key = mount.server + mount.name
+            if not mount.up and key not in down:
+                down.add(key)
+                others = len([ m for m in health if m.server == mount.server and m.up ])
+                msg = "ALERT!! MOUNT " + stream.describe_mount(mount) + " IS DOWN!!\n"
+                msg = msg + "The server is still up with " + str(others) + " other mount(s), "
+                msg = msg + "so the encoder for this mount has most likely disconnected. "
+                msg = msg + "Check that encoder in AltaCast."
+                print(msg)
+                self.teq_message(msg, "engineering", SKULL_EMOJI )
+            elif mount.up and key in down:
+                down.discard(key)
+                msg = "Mount " + stream.describe_mount(mount) + " is Back Online!"
+                print(msg)
+                self.teq_message(msg, "engineering", ROBOT_EMOJI )
+            if not mount.agrees and key not in disagree:
+                disagree.add(key)
+                msg = "Mount " + stream.describe_mount(mount) + " is playing '" + mount.title
+                msg = msg + "', while the other mounts are playing '" + (playing[0] if playing else "") + "'."
+                print(msg)
+                self.teq_message(msg, "engineering", SKULL_EMOJI )
+            elif mount.agrees:
+                disagree.discard(key)
+
+        for result in flow.values():
+            key = self.stream + result.mount
+            if result.stalled and key not in stalled:
+                stalled.add(key)
+                msg = "ALERT!! MOUNT " + result.mount + " IS STALLED!!\n"
+                msg = msg + "Only " + stream.describe_throughput(result) + ". "
+                msg = msg + "The other mounts are fine, so this mount's encoder "
+                msg = msg + "has most likely frozen. Check that encoder in AltaCast."
+                print(msg)
+                self.teq_message(msg, "engineering", SKULL_EMOJI )
+            elif not result.stalled and key in stalled:
+                stalled.discard(key)
+                msg = "Mount " + result.mount + " is flowing again."
+                print(msg)
+                self.teq_message(msg, "engineering", ROBOT_EMOJI )
+
+        state["down"]     = sorted(down)
+        state["disagree"] = sorted(disagree)
+        state["stalled"]  = sorted(stalled)
+        self.set_mount_state(state)
 
     def task_check_lyrics(self):
         """Perform a quick auto-check of a song's lyrics
@@ -357,14 +1268,15 @@ class TeqBot:
         last = self.get_last_lyric()
 
         print("LYRIC: Comparing", np, "|", last )
-        if np != last:
+        song = songinfo.parse(np)
+        if song != songinfo.parse(last):
             self.set_last_lyric(np)
-            song, artist = self.split_metadata(np)
             bad_words = self.get_profanity()
             msg = ""
 
             # Perform genius search and compose message(s)
-            msg, clean = genius.run(song,artist,bad_words,self.geniusToken)
+            import genius
+            msg, clean = genius.run(song.genius,song.artist,bad_words,self.geniusToken)
 
             if not clean:
                 # If current song isn't clean, post to slack
@@ -428,29 +1340,62 @@ class TeqBot:
 
 
     def task_update_repo(self):
-        """Update TeqBot's repository (NOT IMPLEMENTED)
+        """Update TeqBot's repository.
 
-        This is a placeholder function for a task with the
-        intention to be a method for updating TeqBot's repo
-        with new updates without having to stop TeqBot from
-        running.
+        Fetches the latest TeqBot code from git, and checks that it
+        imports cleanly using TeqBot.verify_code(), in a temporary
+        worktree of the fetched revision. Only if it does is the running
+        repository fast-forwarded to it, so spawned tasks never import
+        code that hasn't been checked.
 
-        This is still a very far out feature. Sorry.
+        When run from a scheduler, a successful update is then handed
+        over to the running scheduler with TeqBot.hand_over(), without
+        restarting it.
 
-        Notes:
-            * Create a new branch just for teqbot updates
-            * As of right now, if this were implemented,
-                the update task would handle updates
-                related to the stream status task and
-                the now playing task, but would not
-                handle any changes to the teq module,
-                including any bug fixes or updates to
-                the scheduler itself. Keep this in mind.
+        Returns:
+            bool: True if new code was pulled and imports cleanly.
 
         """
+        import tempfile
+        repo = os.path.dirname(os.path.abspath(__file__))
+        git  = ["git", "-C", repo]
+
+        def run(*args):
+            done = subprocess.run( git + list(args),
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   universal_newlines=True, timeout=UPDATE_TIMEOUT )
+            if done.stdout.strip():
+                print(done.stdout.strip())
+            return done
+
+        if run("fetch").returncode != 0:
+            return False
+        old = subprocess.check_output(git + ["rev-parse", "HEAD"], universal_newlines=True).strip()
+        new = subprocess.check_output(git + ["rev-parse", "@{upstream}"], universal_newlines=True).strip()
+        if new == old:
+            return False
+        if run("merge-base", "--is-ancestor", old, new).returncode != 0:
+            print("Can't fast-forward to", new)
+            return False
+
+        # check the fetched code where spawned tasks can't import it
+        prefix   = subprocess.check_output(git + ["rev-parse", "--show-prefix"], universal_newlines=True).strip()
+        worktree = os.path.join( tempfile.mkdtemp(prefix="teqbot-update-"), "teqbot" )
+        try:
+            if run("worktree", "add", "--detach", worktree, new).returncode != 0:
+                return False
+            if not self.verify_code( os.path.join(worktree, prefix) ):
+                print("Not updating to", new)
+                return False
+        finally:
+            import shutil
+            shutil.rmtree( os.path.dirname(worktree), ignore_errors=True )
+            run("worktree", "prune")
 
-        # temporary solution...
-        self.spawn_task("/usr/bin/git pull")
+        if run("merge", "--ff-only", new).returncode != 0:
+            return False
+        print("Updated TeqBot to", new)
+        return True
 
     def teq_message(self, message, channel, emoji):
         """Create a message, set post emoji, then post message to slack.
@@ -472,12 +1417,13 @@ class TeqBot:
 
         """
         'set emoji and prepare a message, send'
-        self.set_emoji(emoji)
-        self.set_message(message)
-        self.set_channel(channel)
-        status, msg = self.send_message()
-        # reset the emoji to the standard robot face
-        self.set_emoji(ROBOT_EMOJI)
+        with self.slackLock:
+            self.set_emoji(emoji)
+            self.set_message(message)
+            self.set_channel(channel)
+            status, msg = self.send_message()
+            # reset the emoji to the standard robot face
+            self.set_emoji(ROBOT_EMOJI)
         if status:
             print("Sent Message:", msg )
         else:
@@ -583,7 +1529,7 @@ class TeqBot:
     def get_now_playing(self):
         """Get the current song being played
 
-        A wrapper for the stream.ping_stream() command for
+        A wrapper for the stream.snapshot() command for
         returning information about the current song being
         played on an IceCast stream server.
 
@@ -594,8 +1540,7 @@ class TeqBot:
             updated on at least a mostly regular basis.
 
         """
-        ping, message = stream.ping_stream(self.stream)
-        return message
+        return self.stream_snapshot().message
 
     def get_profanity(self, filename="profanity.txt"):
         """Get Profanity List.
@@ -610,6 +1555,7 @@ class TeqBot:
             in the directory set with the LOGGERPATH environment variable.
             a different filename can be provided if needed.
         """
+        import genius
         filename = os.path.join(self.logger, filename)
         return genius.load_profanity(filename)
 
@@ -656,7 +1602,7 @@ class TeqBot:
     def ping_stream(self):
         """Check if the stream is online.
 
-        A wrapper for the stream.ping_stream() command for
+        A wrapper for the stream.snapshot() command for
         returning information about whether the stream is
         currently up or not.
 
@@ -669,8 +1615,103 @@ class TeqBot:
                     down, if it is.
 
         """
-        ping, message = stream.ping_stream(self.stream)
-        return ping, message
+        snap = self.stream_snapshot()
+        return snap.up, snap.message
+
+    def servers(self):
+        """Status urls of the main server, followed by any relays."""
+        import stream
+        return [self.stream] + [ url for url in stream.STREAM_RELAYS if url != self.stream ]
+
+    def probe_servers(self):
+        """Check if the main server and every relay are online.
+
+        A wrapper for the stream.probe_servers() command. The main
+        server is read through TeqBot.snapshots(), so a status read by
+        another task moments ago is used rather than read again.
+
+        Returns:
+            dict: status url to stream.Snapshot, main server first.
+
+        """
+        import stream
+        readers = {}
+        for url in self.servers()[1:]:
+            if url not in self.relayReaders:
+                self.relayReaders[url] = stream.StatusReader()
+            readers[url] = self.relayReaders[url]
+        return stream.probe_servers(self.servers(), readers, { self.stream: self.snapshots() })
+
+    def check_throughput(self, snap):
+        """Check that audio is flowing on the main server's mounts.
+
+        A wrapper for the stream.check_throughput() command.
+
+        Args:
+            snap (stream.Snapshot): the main server's status.
+
+        Returns:
+            (tuple): tuple containing:
+
+                snap (stream.Snapshot): the snapshot, or a STALLED one.
+                flow (dict): mount point to stream.Throughput.
+
+        """
+        import stream
+        return stream.check_throughput(self.stream, snap)
+
+    def probe_stream(self):
+        """Check if the stream is online, within a bounded time.
+
+        A wrapper for the stream.probe() command, through
+        TeqBot.snapshots().
+
+        Returns:
+            stream.Snapshot: everything read from the IceCast server.
+
+        """
+        return self.snapshots().get()
+
+    def stream_snapshot(self):
+        """Check the stream's status, song and listeners all at once.
+
+        Read through TeqBot.snapshots(), so every task asking within
+        stream.SNAPSHOT_FRESHNESS seconds gets the same snapshot, and
+        tasks asking at the same time share a single read.
+
+        Returns:
+            stream.Snapshot: everything read from the IceCast server.
+
+        """
+        return self.snapshots().get()
+
+    def snapshots(self):
+        """Get the stream.SnapshotProvider every status read goes through.
+
+        Returns:
+            stream.SnapshotProvider: shares status reads of TeqBot's
+                stream, using TeqBot.status_reader().
+
+        """
+        if self.snapshotProvider is None:
+            import stream
+            self.snapshotProvider = stream.SnapshotProvider(self.stream, self.status_reader())
+        return self.snapshotProvider
+
+    def status_reader(self):
+        """Get the stream.StatusReader used for checking the stream.
+
+        Kept on TeqBot so the status backend that works for this server
+        is remembered between checks.
+
+        Returns:
+            stream.StatusReader: status reader for TeqBot's stream.
+
+        """
+        if self.statusReader is None:
+            import stream
+            self.statusReader = stream.StatusReader()
+        return self.statusReader
 
     def compare_songs(self):
         """Compare current song with last played to see if this is a new song.
@@ -736,155 +1777,153 @@ class TeqBot:
 
 
     def set_last_played(self, song):
-        """Store the metadata for the last song in a teq file
+        """Store the metadata for the last song played.
 
-        This method stores the metadata from a song in a hidden
-        .teq.song file in the directory which the teqbot program
-        was executed.
+        The song is kept in TeqBot's state store (see the state module),
+        and is only written out if it changed.
 
         Args:
-            song (str): Song metadata to be posted in file.
+            song (str): Song metadata to be stored.
 
         """
-        f = open('.teq.song', 'w')
-        f.write(song)
+        self.state.set("song", song)
 
     def get_last_played(self):
-        """Read the teq song file to retrieve last song played.
+        """Read the last song played from the state store.
 
-        This method reads the metadata of a song from a hidden
-        .teq.song file. This metadata is stored in the
-        TeqBot.lastSong variable.
+        This metadata is stored in the TeqBot.lastSong variable.
 
         """
-        if os.path.exists('.teq.song'):
-            f = open('.teq.song', 'r')
-            self.lastSong = f.read()
-        else:
-            self.lastSong = ""
+        self.lastSong = self.state.get("song", "")
 
     def set_last_lyric(self, song):
-        """Store the metadata for the last song lyric in a teq file
+        """Store the metadata for the last song checked for lyrics.
 
-        This method stores the metadata from a song in a hidden
-        .teq.lyric file in the directory which the teqbot program
-        was executed.
-
-        Similar to the .teq.song file, but for updating lyrics.
+        Similar to TeqBot.set_last_played(), but for updating lyrics.
 
         Args:
-            song (str): Song metadata to be posted in file.
+            song (str): Song metadata to be stored.
 
         """
-        f = open('.teq.lyric', 'w')
-        f.write(song)
+        self.state.set("lyric", song)
 
     def get_last_lyric(self):
-        """Read the teq song lyric to retrieve last song played.
+        """Read the last song checked for lyrics from the state store."""
+        return self.state.get("lyric", "")
+
+    def check_last_played(self):
+        """Check the last song played to determine if a new song is being played.
+
+        If a last song has been stored, get the current playing song from
+        the IceCast server. If the songs are not the same, then a new song
+        is being played.
 
-        This method reads the metadata of a song from a hidden
-        .teq.lyric file.
+        Returns:
+            bool: True if new song being played, False otherwise
 
         """
-        if os.path.exists('.teq.lyric'):
-            f = open('.teq.lyric', 'r')
-            return f.read()
-        else:
-            return ""
+        song = self.state.get("song")
+        if song is None:
+            return False
+        check = self.get_now_playing()
+        # the same song, only spaced or capitalized differently, isn't new
+        if song == "None" or songinfo.parse(check) != songinfo.parse(song):
+            # New Song
+            self.set_last_song( check )
+            self.set_last_played( check )
+            return True
+        return False
 
-    def check_last_played(self):
-        """Check the teq song file to determine if a new song is being played.
+    def is_stream_down(self):
+        """Check if the stream was down the last time it was checked.
 
-        If the .teq.song file is present, read the file to determine what song
-        is being played. Next, get the current playing song from the IceCast
-        server. If the songs are not the same, then a new song is being played.
+        The stream status is kept in memory, and only read from the
+        state store the first time it is needed, such as in a freshly
+        spawned task.
 
         Returns:
-            bool: True if new song being played, False otherwise
+            bool: True if the stream was last seen down.
 
         """
-        if os.path.exists('.teq.song'):
-            f = open('.teq.song', 'r')
-            check = self.get_now_playing()
-            song = f.read()
-            if song == "None":
-                self.set_last_song( check )
-                self.set_last_played( check )
-                return True
+        if self.streamDown is None:
+            self.streamDown = self.check_stat_file("Stream Down")
+        return self.streamDown
 
-            elif check != song:
-                # New Song
-                self.set_last_song( check )
-                self.set_last_played( check )
-                return True
+    def set_stream_down(self, down):
+        """Record whether the stream is down.
 
-            else:
-                return False
-        else:
-            return False
+        The status is only stored when it actually changes.
 
-    def set_stat_file(self, status):
-        """Set the value of the teq status file
+        Args:
+            down (bool): True if the stream is down.
+
+        """
+        if down != self.is_stream_down():
+            self.set_stat_file("Stream Down" if down else "Running")
+        self.streamDown = down
 
-        This function writes a value to the hidden .teq.stat
-        file. This status file is monitored by the scheduler.
+    def set_stat_file(self, status):
+        """Set the scheduler's status in the state store.
 
-        The stat file will display the following information:
+        The status will be one of the following:
             Running: schduler is running, stream is online.
             Stream Down: schduler is running, stream is offline.
-            Done: scheduler is done, will close the next time
-                stat file is polled.
 
         Args:
-            status (str): Data to be written to .teq.stat file
+            status (str): scheduler status to store.
 
         """
-        f = open('.teq.stat', 'w')
-        f.write(status)
+        self.state.set("stat", status)
 
     def check_stat_file(self, check):
-        """Check to see if the status file is a current value.
-
-        This function compares the message contained in the
-        .teq.stat file with the check parameter. If the two
-        values are identical, this function returns true. If
-        not, the stat file is not the same as the check parameter.
+        """Check to see if the stored status is a current value.
 
         Args:
-            check (str): Status being checked in the stat file.
+            check (str): Status being checked.
 
         Returns:
-            bool: True if status of stat file is identical to check
-                variable, False otherwise or if stat file isn't present.
+            bool: True if the stored status is identical to check,
+                False otherwise or if no status is stored.
         """
-        if os.path.exists('.teq.stat'):
-            f = open('.teq.stat', 'r')
-            stat = f.read()
-            return check == stat
-        else:
-            return False
+        return check == self.state.get("stat")
+
+    def get_mount_state(self):
+        """Read the mount health kept between checks, from the state store.
+
+        Returns:
+            dict: "seen" (see stream.mount_health()), "down",
+                "disagree" and "stalled" (keys of the problems already
+                posted).
+
+        """
+        state = { "seen": {}, "down": [], "disagree": [], "stalled": [] }
+        state.update( self.state.get("mounts", {}) )
+        return state
+
+    def set_mount_state(self, state):
+        """Store the mount health in the state store.
+
+        Args:
+            state (dict): as returned by TeqBot.get_mount_state().
+
+        """
+        self.state.set("mounts", state)
 
     def delete_stat_file(self):
-        """Delete the status file.
+        """Delete the stored scheduler status.
 
-        This function deletes the .teq.stat file. This occurs
-        when the scheduler closes, as the status file should
-        not be present when TeqBot is not running.
+        This occurs when the scheduler closes, as no status should be
+        stored when TeqBot is not running.
 
-        Note:
-            In rare instances where the .teq.stat file is
-            present after the scheduler completes, the file
-            should be manually removed.
         """
-        if os.path.exists('.teq.stat'):
-            os.remove('.teq.stat')
+        self.state.delete("stat")
 
     def tunein(self, metadata):
         """Post Metadata to TuneIn After Formatting.
 
-        A wrapper for the tunein.post() command for sending
+        A wrapper for TuneInClient.post() for sending
         song metadata to TuneIn. This metadata is formatted
-        in the tunein.post() function to fit TuneIn's API
+        in the tunein module to fit TuneIn's API
         calls for updating metadata on a livestream. This
         allows for the artist and song name to be individually
         recognized by TuneIn when playing a particular song,
@@ -892,12 +1931,23 @@ class TeqBot:
         when streaming a station on TuneIn, both the mobile
         app and the Web application.
 
-        Note:
-            There are a few issues in how tunein.post()
-            is currently working, which are detailed in the
-            tunein module of this project.
+        Returns:
+            bool: True if TuneIn accepted the song.
+
         """
-        tunein.post( self.tuneinStationID, self.tuneinPartnerID, self.tuneinPartnerKey, metadata)
+        return self.tunein_client().post( songinfo.parse(metadata) )
+
+    def tunein_client(self):
+        """Get the tunein.TuneInClient songs are posted to TuneIn with.
+
+        Returns:
+            tunein.TuneInClient: client for TeqBot's TuneIn station.
+
+        """
+        if self.tuneinClient is None:
+            import tunein
+            self.tuneinClient = tunein.TuneInClient(self.tuneinStationID, self.tuneinPartnerID, self.tuneinPartnerKey)
+        return self.tuneinClient
 
     def now_playing(self, metadata):
         """Clean Metadata for posting to slack.
@@ -907,25 +1957,16 @@ class TeqBot:
             can distinguish where the split between artist
             and song are in the metadata. Other streams
             don't seem to particularly care about this
-            distinction.
+            distinction. See songinfo.SongMetadata.
         """
-        return metadata.replace("__by__", "by")
+        return songinfo.parse(metadata).slack
 
     def split_metadata(self, metadata):
         """Clean metadata into song and artist tuple
 
         """
-        # split the metadata at the correct position
-        split  = metadata.split("__by__", 1)
-        song   = split[0].rstrip().lstrip()
-
-        # check if artist and song were split
-        if len(split) > 1:
-            artist = split[1].rstrip().lstrip()
-        else:
-            artist = ""
-
-        return song,artist
+        song = songinfo.parse(metadata)
+        return song.title, song.artist
 
 if __name__ == "__main__":
     teq = TeqBot()
@@ -19,8 +19,26 @@ Running this module from command line, if provided with a valid TuneIn AIR
 API information, a song name, and an artist name, will post an update to
 the TuneIn broadcast with the corresponding song and artist info.
 
+Posts go through a TuneInClient, which reuses a kept-alive connection to
+TuneIn (see the httpclient module), waits at most CONNECT_TIMEOUT to connect
+and READ_TIMEOUT for a reply, and retries a post that fails on TuneIn's end
+(a 5xx reply, or no reply at all) after a short, randomized, growing wait.
+A post isn't retried if the retry could run past POST_DEADLINE seconds, so
+a slow TuneIn can only hold up the now playing task for so long. The partner key
+is never printed, even in errors.
+
+Attributes:
+    AIR_URL (str): TuneIn AIR API url songs are posted to
+    CONNECT_TIMEOUT (float): seconds to wait connecting to TuneIn
+    READ_TIMEOUT (float): seconds to wait for TuneIn to reply
+    RETRIES (int): times a failed post is retried
+    BACKOFF (float): seconds waited (at most) before the first retry,
+        doubling every retry after
+    BACKOFF_MAX (float): most seconds waited before a retry
+    POST_DEADLINE (float): seconds a post (retries included) may take
+
 Todo:
-    * Fix how parseMetadata() works.
+    * Check the status in the body of TuneIn's reply as well.
 
 .. _TeqBot GitHub Repository:
    https://github.com/kteq-fm/kteq-teqbot
@@ -30,16 +48,132 @@ Todo:
 
 """
 
-import requests
 import sys
+import time
+import random
 import urllib.parse
+import httpclient
+import metrics
+import songinfo
+
+AIR_URL = "http://air.radiotime.com/Playing.ashx"
+
+CONNECT_TIMEOUT = 3.05
+
+READ_TIMEOUT = 5
+
+RETRIES = 3
+
+BACKOFF = 0.5
+
+BACKOFF_MAX = 4
+
+POST_DEADLINE = 20
+
+class TuneInClient:
+    """Posts songs to a station through the TuneIn AIR API.
+
+    Attributes:
+        sID (str): TuneIn Station ID
+        pID (str): TuneIn Partner ID
+        pKey (str): TuneIn Partner Key, never printed
+        retries (int): times a failed post is retried.
+        deadline (float): seconds a post (retries included) may take.
+
+    """
+
+    def __init__(self, sID, pID, pKey, retries=RETRIES, deadline=POST_DEADLINE):
+        """TuneInClient initialization method.
+
+        Args:
+            sID (str): TuneIn Station ID
+            pID (str): TuneIn Partner ID
+            pKey (str): TuneIn Partner Key
+            retries (int): times a failed post is retried. Defaults
+                to RETRIES.
+            deadline (float): seconds a post (retries included) may
+                take. Defaults to POST_DEADLINE.
+
+        """
+        self.sID      = sID
+        self.pID      = pID
+        self.pKey     = pKey
+        self.retries  = retries
+        self.deadline = deadline
+
+    @metrics.timed("tunein.post", ok=bool)
+    def post(self, metadata):
+        """Post song information to TuneIn.
+
+        Args:
+            metadata (songinfo.SongMetadata): Song to post, or a song
+                metadata string containing song name and artist name.
+
+        Returns:
+            bool: True if TuneIn accepted the song.
+
+        """
+        song   = songinfo.as_song(metadata)
+        params = ( ("partnerId", self.pID), ("partnerKey", self.pKey), ("id", self.sID) ) + song.tunein
+        print("Posting to TuneIn:", song.slack)
+
+        start = time.monotonic()
+        for attempt in range(self.retries + 1):
+            status = self.request(params)
+            if status is not None and status < 500:
+                break
+            # full jitter, so retries from a restart don't all land together
+            wait = random.uniform(0, min(BACKOFF_MAX, BACKOFF * 2 ** attempt))
+            worst = time.monotonic() - start + wait + CONNECT_TIMEOUT + READ_TIMEOUT
+            if attempt == self.retries or worst > self.deadline:
+                break
+            print("Retrying TuneIn post in", "{0:.2f}s".format(wait))
+            time.sleep(wait)
+
+        if status is None or not 200 <= status < 300:
+            print("TuneIn post failed:", "no reply" if status is None else "HTTP " + str(status))
+            return False
+        return True
+
+    def request(self, params):
+        """Make a single request to the AIR API.
+
+        Every request's time is recorded in the tunein_request_seconds
+        histogram, by its HTTP status ("error" if there was no reply).
+
+        Args:
+            params (tuple): (name, value) query parameters.
+
+        Returns:
+            int: HTTP status of TuneIn's reply, or None if there was none.
+
+        """
+        import requests
+        start  = time.monotonic()
+        status = None
+        try:
+            with httpclient.get(AIR_URL, params=params, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)) as response:
+                status = response.status_code
+        except requests.RequestException as e:
+            # the error repeats the url, partner key and all
+            print("TuneIn request failed:", self.redact(repr(e)))
+        metrics.REGISTRY.observe("tunein_request_seconds", "status",
+                                 "error" if status is None else str(status), time.monotonic() - start)
+        return status
+
+    def redact(self, text):
+        """Hide the partner key anywhere it shows up in text."""
+        for secret in (self.pKey, urllib.parse.quote_plus(self.pKey or "")):
+            if secret:
+                text = text.replace(secret, "<PARTNER_KEY>")
+        return text
 
 def post(sID, pID, pKey, metadata):
     """Post song information to TuneIn.
 
     Perform an HTTP GET request to post song name and artist name for a
     song to TuneIn. This will update this information to all listeners
-    using TuneIn to stream.
+    using TuneIn to stream. See TuneInClient.post().
 
     While a given TuneIn station ID can be easily discovered in the
     station's TuneIn URL, the TuneIn partner ID and partner key must
@@ -50,42 +184,24 @@ def post(sID, pID, pKey, metadata):
         sID (str): TuneIn Station ID
         pID (str): TuneIn Partner ID
         pKey (str): TuneIn Partner Key
-        metadata (str): Song metadata string containing
-            song name and artist name.
+        metadata (songinfo.SongMetadata): Song to post, or a song
+            metadata string containing song name and artist name.
+
+    Returns:
+        bool: True if TuneIn accepted the song.
 
     Example:
 
         >>> import tunein
-        >>> metadata = "Square Peg Round Hole by WakeyWakey"
+        >>> metadata = "Square Peg Round Hole __by__ WakeyWakey"
         >>> sID = "<TUNEIN_STATION_ID>"
         >>> pID = "<PARTNER_ID>"
         >>> pKey = "<PARTNER_KEY>"
         >>> tunein.post(sID, pID, pKey, metadata)
+        True
 
-    Todo:
-        Will need to devise a more sophisticated method of
-        cleaning metadata in the future, as of right now
-        this will screw up on any song with the actual word
-        "by" in either the song name or the artist name.
-        Easiest solution will be to set up the metadata
-        so that the separator is something unique, that
-        won't be entered on the DJ's end when recording
-        songs on the station computer.
     """
-    #split metadata into song and artist info
-    song, artist = parseMetadata(metadata)
-
-    #build the HTTP request
-    msg = "http://air.radiotime.com/Playing.ashx?partnerId=" + pID
-    msg = msg + "&partnerKey=" + pKey
-    msg = msg + "&id=" + sID
-    msg = msg + "&title="  + song
-    if artist:
-        msg = msg + "&artist=" + artist
-
-    #prints the HTTP request to terminal, sends out as HTTP GET request
-    print("Sending HTTP GET REQUEST:", msg)
-    req = requests.get(msg)
+    return TuneInClient(sID, pID, pKey).post(metadata)
 
 def parseMetadata(metadata):
     """Convert metadata string into formatted song and artist strings.
@@ -110,7 +226,7 @@ def parseMetadata(metadata):
     Example:
 
         >>> import tunein
-        >>> metadata = "Square Peg Round Hole by WakeyWakey"
+        >>> metadata = "Square Peg Round Hole __by__ WakeyWakey"
         >>> msg = tunein.parseMetadata(metadata)
         >>> msg
         ('Square+Peg+Round+Hole', 'WakeyWakey')
@@ -126,29 +242,14 @@ def parseMetadata(metadata):
         songs on the station computer.
     """
 
-    # split the metadata at the correct position
-    split  = metadata.split("__by__", 1)
-    song   = split[0].rstrip().lstrip()
-
-    # check if artist and song were split
-    if len(split) > 1:
-        artist = split[1].rstrip().lstrip()
-    else:
-        artist = None
-
-    # get rid of NowPlaying tag, if present
-    fullsong = song.split("#NowPlaying: ", 1)
-    if len(fullsong) > 1:
-        song = fullsong[1]
-    else:
-        song = fullsong[0]
+    # split once, see songinfo.parse()
+    song = songinfo.as_song(metadata)
 
     #clean up the song and artist strings
-    song   = urllib.parse.quote_plus(song)
-    artist = urllib.parse.quote_plus(artist)
+    artist = urllib.parse.quote_plus(song.artist) if song.artist else None
 
     #return song and artist pair
-    return song, artist
+    return urllib.parse.quote_plus(song.title), artist
 
 def usage():
     """Print Usage Statement.
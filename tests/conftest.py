@@ -0,0 +1,5 @@
+import os
+import sys
+
+# TeqBot's modules import each other by name, from inside teqbot/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "teqbot"))
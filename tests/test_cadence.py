@@ -0,0 +1,70 @@
+import random
+import statistics
+
+import pytest
+
+from cadence import Cadence
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def songs(count, low, high, seed=1):
+    rng = random.Random(seed)
+    return [ rng.uniform(low, high) for i in range(count) ]
+
+def changes(lengths):
+    start = 0.0
+    for length in lengths:
+        start += length
+        yield start
+
+def simulate_fixed(lengths, base):
+    """Check every base milliseconds, as the plain scheduler does."""
+    ends    = list(changes(lengths))
+    checks  = int(ends[-1] * 1000 // base) + 1
+    latency = [ (-end * 1000) % base / 1000 for end in ends ]
+    return checks, latency
+
+def simulate_cadence(lengths, base):
+    """Check whenever Cadence.next_interval() says to."""
+    clock  = Clock()
+    c      = Cadence(base, clock=clock)
+    ends   = list(changes(lengths))
+    song   = 0
+    checks = 0
+    latency = []
+    while song < len(ends):
+        checks += 1
+        while song < len(ends) and ends[song] <= clock.now:
+            latency.append(clock.now - ends[song])
+            song += 1
+        c.observe("song " + str(song))
+        clock.now += c.next_interval() / 1000
+    return checks, latency
+
+@pytest.mark.parametrize("low, high", [ (120, 420), (90, 600), (180, 240) ])
+def test_fewer_checks_without_slower_detection(low, high):
+    lengths = songs(400, low, high)
+    fixed_checks, fixed_latency = simulate_fixed(lengths, 10000)
+    checks, latency = simulate_cadence(lengths, 10000)
+    assert checks < fixed_checks
+    assert statistics.median(latency) <= statistics.median(fixed_latency)
+
+def test_base_interval_until_enough_songs():
+    clock = Clock()
+    c = Cadence(10000, clock=clock)
+    c.observe("a")
+    assert c.next_interval() == 10000
+
+def test_never_waits_past_budget():
+    clock = Clock()
+    c = Cadence(10000, budget=30000, clock=clock)
+    for i in range(10):
+        c.observe("song " + str(i))
+        clock.now += 600
+    c.observe("last")
+    assert c.next_interval() == 30000
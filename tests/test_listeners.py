@@ -0,0 +1,48 @@
+from listeners import ListenerHistory
+
+TIERS = ( (10, 6), (60, 5) )
+
+def filled(history, mount="/kteq"):
+    # one sample every 10 seconds for 2 minutes, listeners 1 to 13
+    for i in range(13):
+        history.record(mount, i + 1, now=i * 10)
+    return history
+
+def test_recent_samples_kept_at_full_resolution():
+    history = filled( ListenerHistory(TIERS) )
+    rows = history.query("/kteq", 70, 120)
+    assert [ (time, low, high) for time, low, mean, high in rows ] == [
+        (70, 8, 8), (80, 9, 9), (90, 10, 10), (100, 11, 11), (110, 12, 12), (120, 13, 13) ]
+
+def test_old_samples_rolled_up():
+    history = filled( ListenerHistory(TIERS) )
+    # the first minute has left the 10 second tier, and is one slot now
+    assert history.query("/kteq", 0, 59) == [ (0, 1, 3.5, 6) ]
+    assert history.summary("/kteq", 0, 59) == (1, 3.5, 6)
+
+def test_unknown_mount_is_empty():
+    history = filled( ListenerHistory(TIERS) )
+    assert history.query("/other", 0, 120) == []
+    assert history.summary("/other", 0, 120) is None
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "listeners")
+    history = filled( ListenerHistory(TIERS) )
+    history.record("/kteq-low", 2, now=0)
+    history.save(path)
+
+    loaded = ListenerHistory(TIERS)
+    assert loaded.load(path)
+    for mount in ("/kteq", "/kteq-low"):
+        assert loaded.query(mount, 0, 120) == history.query(mount, 0, 120)
+        assert loaded.query(mount, 0, 59) == history.query(mount, 0, 59)
+
+def test_load_ignores_other_tiers(tmp_path):
+    path = str(tmp_path / "listeners")
+    filled( ListenerHistory(TIERS) ).save(path)
+    other = ListenerHistory( ((10, 6),) )
+    assert not other.load(path)
+    assert other.mounts == {}
+
+def test_load_missing_file(tmp_path):
+    assert not ListenerHistory(TIERS).load( str(tmp_path / "missing") )
@@ -0,0 +1,55 @@
+from playlog import PlayLog
+
+def test_plays_with_the_same_time_are_all_found(tmp_path):
+    plays = PlayLog(str(tmp_path / "plays"), every=1)
+    for i in range(5):
+        plays.append("Song " + str(i) + " __by__ Artist", now=1000.0)
+    found = plays.query(1000.0, 1001.0)
+    assert [ play.title for play in found ] == [ "Song " + str(i) for i in range(5) ]
+
+def filled(tmp_path, every=64):
+    plays = PlayLog(str(tmp_path / "plays"), every=every)
+    # a song every 3 minutes for a day
+    for i in range(480):
+        plays.append("Song " + str(i) + " __by__ Artist " + str(i % 7), now=1000.0 + i * 180)
+    return plays
+
+def test_query_returns_exactly_the_range(tmp_path):
+    plays = filled(tmp_path)
+    found = plays.query(1000.0 + 100 * 180, 1000.0 + 110 * 180)
+    assert [ play.title for play in found ] == [ "Song " + str(i) for i in range(100, 111) ]
+    assert found[0].artist == "Artist 2"
+    assert found[0].time == 1000.0 + 100 * 180
+
+def test_query_between_plays_is_empty(tmp_path):
+    plays = filled(tmp_path)
+    assert plays.query(1001.0, 1179.0) == []
+
+def test_query_outside_the_log(tmp_path):
+    plays = filled(tmp_path)
+    assert plays.query(0.0, 999.0) == []
+    assert plays.query(1000.0 + 480 * 180) == []
+    assert len( plays.query(0.0, 1000.0 + 480 * 180) ) == 480
+
+def test_query_without_index_entries_for_every_play(tmp_path):
+    plays = filled(tmp_path, every=1 << 20)
+    found = plays.query(1000.0 + 479 * 180, 1000.0 + 479 * 180)
+    assert [ play.title for play in found ] == [ "Song 479" ]
+
+def test_missing_log_is_empty(tmp_path):
+    assert PlayLog( str(tmp_path / "missing") ).query(0.0, 1e10) == []
+
+def test_torn_last_line_is_skipped(tmp_path):
+    plays = filled(tmp_path)
+    with open(plays.path, "ab") as log:
+        log.write(b'{"time":')
+    plays.append("After __by__ Crash", now=1000.0 + 480 * 180)
+    found = plays.query(1000.0 + 479 * 180, 1000.0 + 480 * 180)
+    assert [ play.title for play in found ] == [ "Song 479", "After" ]
+
+def test_times_never_go_backwards(tmp_path):
+    plays = PlayLog(str(tmp_path / "plays"), every=1)
+    plays.append("First __by__ A", now=2000.0)
+    plays.append("Clock Went Back __by__ B", now=1500.0)
+    found = plays.query(1000.0, 3000.0)
+    assert [ (play.title, play.time) for play in found ] == [ ("First", 2000.0), ("Clock Went Back", 2000.0) ]
@@ -0,0 +1,94 @@
+from schedule import Schedule
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def run_until(s, clock, seconds):
+    """Run the schedule on the fake clock for a number of seconds."""
+    s.add("stop", seconds * 1000, s.stop, delay=seconds * 1000)
+    s.run(wait=clock.sleep)
+
+def test_tasks_run_in_deadline_order():
+    clock = Clock()
+    s = Schedule(clock=clock)
+    runs = []
+    s.add("slow", 3000, lambda: runs.append(("slow", clock.now)))
+    s.add("fast", 1000, lambda: runs.append(("fast", clock.now)), delay=500)
+    run_until(s, clock, 4)
+    assert runs == [ ("slow", 0.0), ("fast", 0.5), ("fast", 1.5), ("fast", 2.5),
+                     ("slow", 3.0), ("fast", 3.5) ]
+
+def test_deadlines_do_not_drift():
+    clock = Clock()
+    s = Schedule(clock=clock)
+    runs = []
+
+    def slow_task():
+        runs.append(clock.now)
+        # the task itself takes a quarter of its interval
+        clock.now += 0.25
+
+    s.add("task", 1000, slow_task)
+    run_until(s, clock, 3.5)
+    assert runs == [ 0.0, 1.0, 2.0, 3.0 ]
+    assert s.stats["task"]["runs"] == 4
+
+def test_callback_can_change_its_interval():
+    clock = Clock()
+    s = Schedule(clock=clock)
+    runs = []
+
+    def backoff():
+        runs.append(clock.now)
+        return 1000 * len(runs)
+
+    s.add("task", 500, backoff)
+    run_until(s, clock, 7)
+    assert runs == [ 0.0, 1.0, 3.0, 6.0 ]
+
+def test_missed_deadlines_are_skipped():
+    clock = Clock()
+    s = Schedule(clock=clock)
+    runs = []
+
+    def task():
+        runs.append(clock.now)
+        if len(runs) == 1:
+            # as if the machine was suspended for a while
+            clock.now += 3.5
+
+    s.add("task", 1000, task)
+    run_until(s, clock, 6)
+    assert runs == [ 0.0, 3.5, 4.0, 5.0 ]
+    assert s.stats["task"]["missed"] == 2
+    assert s.stats["task"]["max lag"] == 2.5
+
+def test_failing_task_does_not_stop_others():
+    clock = Clock()
+    s = Schedule(clock=clock)
+    runs = []
+
+    def broken():
+        runs.append("broken")
+        raise RuntimeError("boom")
+
+    def counter():
+        runs.append("counter")
+        if runs.count("counter") == 3:
+            s.stop()
+
+    s.add("broken", 1000, broken)
+    s.add("counter", 1000, counter)
+    s.run(wait=clock.sleep)
+    assert runs.count("broken") == 3
+    assert runs.count("counter") == 3
+    assert s.stats["broken"]["errors"] == 3
+    assert s.stats["counter"]["errors"] == 0
+    assert "errors 3" in s.report()
@@ -0,0 +1,47 @@
+import pytest
+
+from songinfo import parse, as_song, SongMetadata
+
+def test_parse_title_and_artist():
+    song = parse("#NowPlaying: Beat Market __by__ Sun Machine")
+    assert song.title == "Beat Market"
+    assert song.artist == "Sun Machine"
+    assert song.slack == "#NowPlaying: Beat Market by Sun Machine"
+    assert song.text == "#NowPlaying: Beat Market __by__ Sun Machine"
+    assert song.tunein == ( ("title", "Beat Market"), ("artist", "Sun Machine") )
+    assert song.genius == "Beat Market"
+
+def test_parse_without_prefix_or_artist():
+    song = parse("Beat Market")
+    assert song.title == "Beat Market"
+    assert song.artist == ""
+    assert song.slack == "#NowPlaying: Beat Market"
+    assert song.tunein == ( ("title", "Beat Market"), )
+
+def test_parse_collapses_whitespace():
+    song = parse("#NowPlaying:   Beat   Market  __by__  Sun\tMachine ")
+    assert (song.title, song.artist) == ("Beat Market", "Sun Machine")
+
+def test_only_first_separator_splits():
+    song = parse("A __by__ B __by__ C")
+    assert (song.title, song.artist) == ("A", "B __by__ C")
+
+def test_empty_metadata():
+    assert not parse("")
+    assert not parse(None)
+
+def test_songs_compare_case_insensitively():
+    assert parse("beat market __by__ SUN MACHINE") == SongMetadata("Beat Market", "Sun Machine")
+    assert len({ parse("Beat Market __by__ Sun Machine"), SongMetadata("BEAT MARKET", "sun machine") }) == 1
+    assert parse("Beat Market __by__ Sun Machine") != parse("Beat Market __by__ Someone Else")
+
+def test_parse_is_cached():
+    text = "#NowPlaying: Cached __by__ Song"
+    assert parse(text) is parse(text)
+    assert as_song(parse(text)) is parse(text)
+    assert as_song(text) is parse(text)
+
+def test_song_metadata_is_immutable():
+    song = parse("Beat Market __by__ Sun Machine")
+    with pytest.raises(AttributeError):
+        song.title = "Something Else"